@@ -1,17 +1,57 @@
 import os
 import uuid
 import re
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
 import urllib.parse 
 import hashlib
 import json
+import logging
+import logging.handlers
 import jwt
-from sqlalchemy import create_engine, text
-from flask import Flask, jsonify, request
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+try:
+    import redis
+except ImportError:  # only needed for SESSION_STORE=redis
+    redis = None
+
+try:
+    import brotli
+except ImportError:  # optional: br content coding
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd content coding
+    zstandard = None
 import base64
+import csv
+import io
+import math
+import random
+import sqlite3
+import tempfile
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pymysql.constants import FIELD_TYPE
 
 app = Flask(__name__)
+# Operational events (circuit changes, log write failures, config imports) go to app.logger
+app.logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:8000")
 CORS(app, supports_credentials=True, origins=[FRONTEND_ORIGIN])
 
@@ -24,7 +64,214 @@ COOKIE_SAMESITE = os.getenv("COOKIE_SAMESITE", "Lax")
 USER_SECRET = "youcanfindit" 
 USERS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "user.config.json")
 USERS_DIR = os.path.join(os.path.dirname(__file__), "users")
-SESSIONS = {}
+
+# Session storage: "memory" (one process), "sqlite" (shared by workers on one host) or "redis"
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", os.path.join(os.path.dirname(__file__), "sessions.sqlite3"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "1024"))
+JWT_CACHE = OrderedDict()
+JWT_CACHE_LOCK = threading.Lock()
+
+# user.config.json parsed once and indexed by username, reloaded when the file changes
+USERS_CACHE = {"loaded": False, "signature": None, "users": [], "byName": {}}
+USERS_CACHE_LOCK = threading.Lock()
+USERS_LOCK_PATH = USERS_CONFIG_PATH + ".lock"
+
+# Per-user db/sql config storage: "json" (users/<name>/*.json) or "sqlite"
+CONFIG_STORE = os.getenv("CONFIG_STORE", "json").lower()
+CONFIG_SQLITE_PATH = os.getenv("CONFIG_SQLITE_PATH", os.path.join(USERS_DIR, "configstore.sqlite3"))
+CONFIG_KINDS = {
+    "db": {"file": "dbconfig.json", "table": "db_configs", "lookup": "database"},
+    "sql": {"file": "sqlconfig.json", "table": "sql_configs", "lookup": "menu_name"},
+}
+
+# Pooled SQLAlchemy engines, shared across requests and keyed by connection identity
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_ENGINE_IDLE_SECONDS = int(os.getenv("DB_ENGINE_IDLE_SECONDS", "600"))
+ENGINES = {}
+ENGINES_LOCK = threading.Lock()
+# When _get_engine last swept ENGINES for idle engines (time.monotonic)
+ENGINE_SWEEP = {"at": 0.0}
+
+# Driver timeouts (0 leaves the PyMySQL default) and per-host circuit breaker
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+DB_READ_TIMEOUT_SECONDS = int(os.getenv("DB_READ_TIMEOUT_SECONDS", "0"))
+DB_WRITE_TIMEOUT_SECONDS = int(os.getenv("DB_WRITE_TIMEOUT_SECONDS", "0"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+HEALTH_STATE_MAX_AGE_SECONDS = int(os.getenv("HEALTH_STATE_MAX_AGE_SECONDS", "30"))
+HOST_HEALTH = {}
+HOST_HEALTH_LOCK = threading.Lock()
+HEALTH_PROBER = {"thread": None}
+# MySQL client errors meaning a new connection could not reach the server. They only count
+# towards the circuit while the pool opens a connection: 2013 (lost connection) is also what a
+# read timeout on a long query raises, and a dropped pooled connection is simply replaced.
+CONNECT_ERROR_CODES = (2002, 2003, 2005, 2006)
+
+# Read-replica routing of read-only statements
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = int(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+REPLICA_LAG_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="replica-lag")
+ROUTE_STATS = {}
+ROUTE_STATS_LOCK = threading.Lock()
+RECENT_WRITES = {}
+RECENT_WRITES_LOCK = threading.Lock()
+
+# Server-side pagination of SELECT results
+MAX_SAFE_INTEGER = 9007199254740991
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+COUNT_CACHE_TTL_SECONDS = int(os.getenv("COUNT_CACHE_TTL_SECONDS", "60"))
+COUNT_CACHE_MAX_ENTRIES = int(os.getenv("COUNT_CACHE_MAX_ENTRIES", "1000"))
+COUNT_CACHE = {}
+COUNT_CACHE_LOCK = threading.Lock()
+RESULT_COLUMNS_CACHE = {}
+RESULT_COLUMNS_CACHE_LOCK = threading.Lock()
+
+# Sort and filter specs pushed down into the wrapped SELECT
+FILTER_OPERATORS = {
+    "eq": "=",
+    "ne": "<>",
+    "lt": "<",
+    "lte": "<=",
+    "gt": ">",
+    "gte": ">=",
+    "contains": "LIKE",
+    "startsWith": "LIKE",
+    "isNull": "IS NULL",
+    "notNull": "IS NOT NULL",
+}
+
+# Result cache for SELECTs; a TTL of 0 disables caching unless a saved query sets cache_ttl
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "0"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE = OrderedDict()
+RESULT_CACHE_LOCK = threading.Lock()
+RESULT_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "bytes": 0}
+
+# Decrypted db configs resolved by (username, database) for saved-query runs
+DB_CREDENTIALS_TTL_SECONDS = int(os.getenv("DB_CREDENTIALS_TTL_SECONDS", "300"))
+DB_CREDENTIALS_CACHE = {}
+DB_CREDENTIALS_CACHE_LOCK = threading.Lock()
+
+# Schema introspection (tables, columns, keys, indexes) per database connection
+SCHEMA_CACHE_TTL_SECONDS = int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", os.getenv("TABLE_META_TTL_SECONDS", "300")))
+SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", "64"))
+SCHEMA_MISS_REFRESH_SECONDS = int(os.getenv("SCHEMA_MISS_REFRESH_SECONDS", "10"))
+SCHEMA_CACHE = OrderedDict()
+SCHEMA_CACHE_LOCK = threading.Lock()
+SCHEMA_LOAD_LOCKS = {}
+SCHEMA_QUERIES = {
+    "tables": (
+        "SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS, TABLE_COMMENT "
+        "FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+    ),
+    "columns": (
+        "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA, "
+        "COLUMN_COMMENT FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+        "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+    ),
+    "indexes": (
+        "SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM INFORMATION_SCHEMA.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+    ),
+}
+
+# Typed named parameters of saved queries
+QUERY_PARAM_TYPES = ("string", "int", "float", "bool", "date", "datetime")
+QUERY_PARAM_NAME = re.compile(r"[A-Za-z][A-Za-z0-9_]*\Z")
+
+# Upper bound on rows per batch edit request
+BATCH_EDIT_MAX_ROWS = int(os.getenv("BATCH_EDIT_MAX_ROWS", "1000"))
+
+# Result-size budgets; users ("limits" in user.config.json) and saved queries may set lower ones
+RESULT_MAX_ROWS = int(os.getenv("RESULT_MAX_ROWS", "100000"))
+RESULT_MAX_BYTES = int(os.getenv("RESULT_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_MAX_FETCH_MS = int(os.getenv("RESULT_MAX_FETCH_MS", "60000"))
+RESULT_FETCH_BATCH_SIZE = int(os.getenv("RESULT_FETCH_BATCH_SIZE", "1000"))
+BUDGET_FIELDS = {"max_rows": "maxRows", "max_bytes": "maxBytes", "max_fetch_ms": "maxFetchMs"}
+
+# Exports: rows per fetchmany batch; XLSX sheets stop at Excel's row limit
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+XLSX_MAX_ROWS = 1048576
+
+# Rows per NDJSON line when streaming results
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Asynchronous query jobs: a bounded worker pool, per-user limits and a size-capped result store
+QUERY_JOB_WORKERS = int(os.getenv("QUERY_JOB_WORKERS", "8"))
+QUERY_JOB_MAX_PER_USER = int(os.getenv("QUERY_JOB_MAX_PER_USER", "2"))
+QUERY_MAX_EXECUTION_TIME_MS = int(os.getenv("QUERY_MAX_EXECUTION_TIME_MS", "300000"))
+QUERY_JOB_RESULT_MAX_BYTES = int(os.getenv("QUERY_JOB_RESULT_MAX_BYTES", str(256 * 1024 * 1024)))
+QUERY_JOB_RESULT_TTL_SECONDS = int(os.getenv("QUERY_JOB_RESULT_TTL_SECONDS", "600"))
+QUERY_JOB_WAIT_MAX_SECONDS = int(os.getenv("QUERY_JOB_WAIT_MAX_SECONDS", "30"))
+QUERY_JOBS = OrderedDict()
+QUERY_JOBS_LOCK = threading.Lock()
+QUERY_JOBS_CHANGED = threading.Condition(QUERY_JOBS_LOCK)
+QUERY_JOB_STATS = {"bytes": 0}
+QUERY_JOB_EXECUTOR = ThreadPoolExecutor(max_workers=QUERY_JOB_WORKERS, thread_name_prefix="query-job")
+QUERY_JOB_ACTIVE = ("queued", "running")
+
+# Dashboards: saved queries fanned out over a pool, up to DASHBOARD_CONNECTIONS_PER_DATABASE
+# connections per database (by default the engine's steady pool size)
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "8"))
+DASHBOARD_CONNECTIONS_PER_DATABASE = max(1, int(os.getenv("DASHBOARD_CONNECTIONS_PER_DATABASE", str(DB_POOL_SIZE))))
+DASHBOARD_MAX_QUERIES = int(os.getenv("DASHBOARD_MAX_QUERIES", "20"))
+DASHBOARD_TIMEOUT_MS = int(os.getenv("DASHBOARD_TIMEOUT_MS", "30000"))
+DASHBOARD_EXECUTOR = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+# Metrics: Prometheus text format at /api/metrics and a Server-Timing header per request
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_HELP = {
+    "sqlapp_stage_duration_seconds": ("histogram", "Time spent per query stage"),
+    "sqlapp_http_request_duration_seconds": ("histogram", "Total request handling time"),
+    "sqlapp_http_requests_total": ("counter", "Requests by endpoint and status code"),
+    "sqlapp_circuit_rejections_total": ("counter", "Connections refused because the host's circuit is open"),
+}
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+# Labels and stage timings of the request or job running on this thread
+METRICS_LOCAL = threading.local()
+
+# Slow-query log: JSON lines in a rotating file, with EXPLAIN FORMAT=JSON for SELECTs
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "1000"))
+SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", os.path.join(os.path.dirname(__file__), "slow_query.log"))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "3"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_EXPLAIN_TTL_SECONDS = int(os.getenv("SLOW_QUERY_EXPLAIN_TTL_SECONDS", "300"))
+SLOW_QUERY_EXPLAIN_CACHE = {}
+SLOW_QUERY_EXPLAIN_CACHE_LOCK = threading.Lock()
+# EXPLAIN and the file write run off the request thread; excess records are dropped
+SLOW_QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query")
+SLOW_QUERY_PENDING = threading.BoundedSemaphore(100)
+SLOW_QUERY_LOGGER = logging.getLogger("sqlapp.slow_query")
+SLOW_QUERY_LOGGER.propagate = False
+SLOW_QUERY_LOGGER.setLevel(logging.INFO)
+
+# Response compression, negotiated from Accept-Encoding
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "text/plain", "text/csv")
+# Server preference when the client accepts several codings with the same quality
+CONTENT_CODINGS = [coding for coding, available in (
+    ("br", brotli is not None),
+    ("zstd", zstandard is not None),
+    ("gzip", True),
+    ("deflate", True),
+) if available]
+# MySQL error codes: statement interrupted by KILL QUERY, and by max_execution_time
+ER_QUERY_INTERRUPTED = 1317
+ER_QUERY_TIMEOUT = 3024
+# Duplicate column name, e.g. SELECT a.id, b.id ... wrapped as a derived table
+ER_DUP_FIELDNAME = 1060
 
 
 def _now():
@@ -44,21 +291,121 @@ def _encode_session(payload):
 
 
 def _decode_session(token):
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    # Verified tokens are cached, so a page load doesn't re-verify the same JWT many times
+    with JWT_CACHE_LOCK:
+        data = JWT_CACHE.get(token)
+        if data is not None:
+            JWT_CACHE.move_to_end(token)
+    if data is not None:
+        if data.get("exp") is not None and data["exp"] <= time.time():
+            with JWT_CACHE_LOCK:
+                JWT_CACHE.pop(token, None)
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        return data
 
+    data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    with JWT_CACHE_LOCK:
+        JWT_CACHE[token] = data
+        while len(JWT_CACHE) > JWT_CACHE_MAX_ENTRIES:
+            JWT_CACHE.popitem(last=False)
+    return data
 
-def _load_users():
+
+def _users_file_signature():
     try:
-        with open(USERS_CONFIG_PATH, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            return data.get("users", [])
+        stat = os.stat(USERS_CONFIG_PATH)
     except FileNotFoundError:
-        return []
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _index_users(users, signature):
+    # Caller must hold USERS_CACHE_LOCK
+    USERS_CACHE["users"] = users
+    USERS_CACHE["byName"] = {user.get("username"): user for user in users}
+    USERS_CACHE["signature"] = signature
+    USERS_CACHE["loaded"] = True
+
+
+def _user_directory():
+    signature = _users_file_signature()
+    with USERS_CACHE_LOCK:
+        if not USERS_CACHE["loaded"] or signature != USERS_CACHE["signature"]:
+            try:
+                with open(USERS_CONFIG_PATH, "r", encoding="utf-8") as file:
+                    users = json.load(file).get("users", [])
+            except FileNotFoundError:
+                users = []
+            _index_users(users, signature)
+        return USERS_CACHE
 
 
-def _save_users(users):
-    with open(USERS_CONFIG_PATH, "w", encoding="utf-8") as file:
-        json.dump({"users": users}, file, indent=2)
+@contextmanager
+def _file_lock(lock_path):
+    # Serializes writers across worker processes
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _atomic_write_json(path, data):
+    # Write to a temp file and rename it, so readers never see a partial file
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _get_user(username):
+    # O(1) lookup; the returned dict is shared and must not be modified
+    return _user_directory()["byName"].get(username)
+
+
+def _load_users():
+    # Copies, so callers can edit users without touching the cache
+    return [dict(user) for user in _user_directory()["users"]]
+
+
+def _write_users_locked(users):
+    # Caller must hold the USERS_LOCK_PATH file lock
+    users = [dict(user) for user in users]
+    _atomic_write_json(USERS_CONFIG_PATH, {"users": users})
+    signature = _users_file_signature()
+    with USERS_CACHE_LOCK:
+        _index_users(users, signature)
+
+
+def _update_users(update):
+    # Re-reads, edits and writes user.config.json under its file lock, so edits made at the
+    # same time by other workers are not lost. update(users) edits the list in place and
+    # returns an error response to leave the file unchanged, or None to save it.
+    with _file_lock(USERS_LOCK_PATH):
+        users = _load_users()
+        error = update(users)
+        if error is None:
+            _write_users_locked(users)
+    return error
+
+
+def _find_user_locked(users, username):
+    # For _update_users callbacks: (user, None) or (None, 404 response)
+    user = next((item for item in users if item.get("username") == username), None)
+    if not user:
+        return None, (jsonify({"error": "user not found"}), 404)
+    return user, None
 
 
 def _md5(value: str) -> str:
@@ -99,76 +446,3013 @@ def _decrypt_password(encrypted_password: str) -> str:
         return encrypted_password
 
 
-def _load_db_config(username):
-    try:
-        path = os.path.join(USERS_DIR, username, "dbconfig.json")
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            # If data is a dict (old format), convert to list
-            if isinstance(data, dict):
-                configs = [data] if data else []
+class JsonConfigStore:
+    """Stores each user's configs as JSON lists in users/<name>/dbconfig.json and sqlconfig.json."""
+
+    def __init__(self, users_dir):
+        self.users_dir = users_dir
+
+    def _path(self, username, kind):
+        return os.path.join(self.users_dir, username, CONFIG_KINDS[kind]["file"])
+
+    def _lock_path(self, username, kind):
+        return os.path.join(self.users_dir, username, "." + CONFIG_KINDS[kind]["file"] + ".lock")
+
+    def _read(self, username, kind):
+        try:
+            with open(self._path(username, kind), "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return []
+        # If data is a dict (old format), convert to list
+        if isinstance(data, dict):
+            return [data] if data else []
+        return data
+
+    def _write(self, username, kind, entries):
+        _atomic_write_json(self._path(username, kind), entries)
+
+    def list(self, username, kind):
+        return self._read(username, kind)
+
+    def version(self, username, kind):
+        # Changes with every write, since writes rename a new file into place
+        try:
+            stat = os.stat(self._path(username, kind))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, username, kind, entry_id):
+        return next((e for e in self._read(username, kind) if e.get("id") == entry_id), None)
+
+    def find(self, username, kind, value):
+        field = CONFIG_KINDS[kind]["lookup"]
+        return next((e for e in self._read(username, kind) if e.get(field) == value), None)
+
+    def put(self, username, kind, entry):
+        os.makedirs(os.path.join(self.users_dir, username), exist_ok=True)
+        with _file_lock(self._lock_path(username, kind)):
+            entries = self._read(username, kind)
+            index = next((i for i, e in enumerate(entries) if e.get("id") == entry.get("id")), None)
+            if index is None:
+                entries.append(entry)
             else:
-                configs = data
-            # Decrypt passwords
-            decrypted_configs = []
-            for config in configs:
-                decrypted_config = config.copy()
-                if "password" in decrypted_config:
-                    decrypted_config["password"] = _decrypt_password(decrypted_config["password"])
-                decrypted_configs.append(decrypted_config)
-            return decrypted_configs
-    except FileNotFoundError:
-        return []
+                entries[index] = entry
+            self._write(username, kind, entries)
+
+    def delete(self, username, kind, entry_id):
+        os.makedirs(os.path.join(self.users_dir, username), exist_ok=True)
+        with _file_lock(self._lock_path(username, kind)):
+            entries = self._read(username, kind)
+            remaining = [e for e in entries if e.get("id") != entry_id]
+            if len(remaining) == len(entries):
+                return False
+            self._write(username, kind, remaining)
+            return True
+
+    def replace(self, username, kind, entries):
+        os.makedirs(os.path.join(self.users_dir, username), exist_ok=True)
+        with _file_lock(self._lock_path(username, kind)):
+            self._write(username, kind, entries)
+
+
+class SqliteConfigStore:
+    """Stores configs in one SQLite database (WAL mode), one row per entry.
+
+    A new database is filled once from the existing JSON files in users_dir.
+    """
+
+    def __init__(self, path, users_dir):
+        self.path = path
+        self._local = threading.local()
+        created = not os.path.exists(path)
+        connection = self._connection()
+        for kind in CONFIG_KINDS.values():
+            table = kind["table"]
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "username TEXT NOT NULL, id TEXT NOT NULL, lookup TEXT, data TEXT NOT NULL, "
+                "PRIMARY KEY (username, id))"
+            )
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_lookup ON {table} (username, lookup)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS config_versions ("
+            "username TEXT NOT NULL, kind TEXT NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (username, kind))"
+        )
+        if created:
+            self.import_json(JsonConfigStore(users_dir))
+
+    def _connection(self):
+        # sqlite3 connections are not shared across threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _upsert(self, connection, username, kind, entry):
+        if not entry.get("id"):
+            entry = {**entry, "id": str(uuid.uuid4())}
+        connection.execute(
+            f"INSERT INTO {CONFIG_KINDS[kind]['table']} (username, id, lookup, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (username, id) DO UPDATE SET lookup = excluded.lookup, data = excluded.data",
+            (username, entry["id"], entry.get(CONFIG_KINDS[kind]["lookup"]), json.dumps(entry)),
+        )
+
+    def _bump_version(self, connection, username, kind):
+        connection.execute(
+            "INSERT INTO config_versions (username, kind, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (username, kind) DO UPDATE SET version = version + 1",
+            (username, kind),
+        )
+
+    def version(self, username, kind):
+        # Bumped in the same transaction as every write of the user's entries of this kind
+        row = self._connection().execute(
+            "SELECT version FROM config_versions WHERE username = ? AND kind = ?", (username, kind)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def list(self, username, kind):
+        rows = self._connection().execute(
+            f"SELECT data FROM {CONFIG_KINDS[kind]['table']} WHERE username = ? ORDER BY rowid",
+            (username,),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, username, kind, entry_id):
+        row = self._connection().execute(
+            f"SELECT data FROM {CONFIG_KINDS[kind]['table']} WHERE username = ? AND id = ?",
+            (username, entry_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, username, kind, value):
+        row = self._connection().execute(
+            f"SELECT data FROM {CONFIG_KINDS[kind]['table']} WHERE username = ? AND lookup = ? "
+            "ORDER BY rowid LIMIT 1",
+            (username, value),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, username, kind, entry):
+        with self._transaction() as connection:
+            self._upsert(connection, username, kind, entry)
+            self._bump_version(connection, username, kind)
+
+    def delete(self, username, kind, entry_id):
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f"DELETE FROM {CONFIG_KINDS[kind]['table']} WHERE username = ? AND id = ?",
+                (username, entry_id),
+            )
+            self._bump_version(connection, username, kind)
+        return cursor.rowcount > 0
+
+    def replace(self, username, kind, entries):
+        with self._transaction() as connection:
+            connection.execute(f"DELETE FROM {CONFIG_KINDS[kind]['table']} WHERE username = ?", (username,))
+            for entry in entries:
+                self._upsert(connection, username, kind, entry)
+            self._bump_version(connection, username, kind)
+
+    def import_json(self, json_store):
+        if not os.path.isdir(json_store.users_dir):
+            return
+        for username in sorted(os.listdir(json_store.users_dir)):
+            if not os.path.isdir(os.path.join(json_store.users_dir, username)):
+                continue
+            for kind in CONFIG_KINDS:
+                entries = json_store.list(username, kind)
+                if entries:
+                    self.replace(username, kind, entries)
+        app.logger.info("Imported JSON configs from %s into %s", json_store.users_dir, self.path)
+
+
+def _create_config_store():
+    if CONFIG_STORE == "sqlite":
+        return SqliteConfigStore(CONFIG_SQLITE_PATH, USERS_DIR)
+    return JsonConfigStore(USERS_DIR)
+
+
+CONFIG_STORE_BACKEND = _create_config_store()
+
+
+class MemorySessionStore:
+    """Keeps sessions in a dict of this process; expired entries are swept periodically."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + SESSION_SWEEP_INTERVAL_SECONDS
+
+    def _maybe_sweep(self, now):
+        # Caller must hold self._lock
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SESSION_SWEEP_INTERVAL_SECONDS
+        expired = [key for key, (_, expires_at) in self._sessions.items() if expires_at <= now]
+        for key in expired:
+            self._sessions.pop(key)
+
+    def put(self, session_id, session, expires_at):
+        with self._lock:
+            self._maybe_sweep(time.time())
+            self._sessions[session_id] = (session, expires_at)
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                self._sessions.pop(session_id, None)
+                return None
+            return entry[0]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SqliteSessionStore:
+    """Keeps sessions in a SQLite file (WAL mode) shared by all workers on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_sweep = time.time() + SESSION_SWEEP_INTERVAL_SECONDS
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _maybe_sweep(self, now):
+        # Amortized: at most one indexed range delete per interval and worker
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SESSION_SWEEP_INTERVAL_SECONDS
+        self._connection().execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def put(self, session_id, session, expires_at):
+        self._maybe_sweep(time.time())
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(session), expires_at),
+        )
+
+    def get(self, session_id):
+        now = time.time()
+        self._maybe_sweep(now)
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at > ?", (session_id, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id):
+        self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class RedisSessionStore:
+    """Keeps sessions in Redis (or a local stand-in speaking its protocol); keys expire on their own."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("SESSION_STORE=redis requires the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, session_id):
+        return f"sqlapp:session:{session_id}"
+
+    def put(self, session_id, session, expires_at):
+        ttl = max(1, int(expires_at - time.time()))
+        self.client.set(self._key(session_id), json.dumps(session), ex=ttl)
+
+    def get(self, session_id):
+        data = self.client.get(self._key(session_id))
+        return json.loads(data) if data else None
+
+    def delete(self, session_id):
+        self.client.delete(self._key(session_id))
+
+
+def _create_session_store():
+    if SESSION_STORE == "sqlite":
+        return SqliteSessionStore(SESSION_SQLITE_PATH)
+    if SESSION_STORE == "redis":
+        return RedisSessionStore(SESSION_REDIS_URL)
+    return MemorySessionStore()
+
+
+SESSION_STORE_BACKEND = _create_session_store()
+
+
+def _decrypt_db_config(config):
+    decrypted_config = config.copy()
+    if "password" in decrypted_config:
+        decrypted_config["password"] = _decrypt_password(decrypted_config["password"])
+    if decrypted_config.get("replicas"):
+        decrypted_config["replicas"] = [
+            dict(replica, password=_decrypt_password(replica["password"])) if replica.get("password") else replica
+            for replica in decrypted_config["replicas"]
+        ]
+    return decrypted_config
+
+
+def _encrypt_db_config(config):
+    encrypted_config = config.copy()
+    if "password" in encrypted_config:
+        encrypted_config["password"] = _encrypt_password(encrypted_config["password"])
+    if encrypted_config.get("replicas"):
+        encrypted_config["replicas"] = [
+            dict(replica, password=_encrypt_password(replica["password"])) if replica.get("password") else replica
+            for replica in encrypted_config["replicas"]
+        ]
+    return encrypted_config
+
+
+def _load_db_config(username):
+    return [_decrypt_db_config(config) for config in CONFIG_STORE_BACKEND.list(username, "db")]
 
 
 def _save_db_config(username, configs):
-    os.makedirs(os.path.join(USERS_DIR, username), exist_ok=True)
-    path = os.path.join(USERS_DIR, username, "dbconfig.json")
-    encrypted_configs = []
-    for config in configs:
-        encrypted_config = config.copy()
-        if "password" in encrypted_config:
-            encrypted_config["password"] = _encrypt_password(encrypted_config["password"])
-        encrypted_configs.append(encrypted_config)
-    with open(path, "w", encoding="utf-8") as file:
-        json.dump(encrypted_configs, file, indent=2)
+    CONFIG_STORE_BACKEND.replace(username, "db", [_encrypt_db_config(config) for config in configs])
+
+
+def _get_db_config_entry(username, config_id):
+    config = CONFIG_STORE_BACKEND.get(username, "db", config_id)
+    return _decrypt_db_config(config) if config else None
+
+
+def _find_db_config(username, database):
+    config = CONFIG_STORE_BACKEND.find(username, "db", database)
+    return _decrypt_db_config(config) if config else None
+
+
+def _put_db_config(username, config):
+    CONFIG_STORE_BACKEND.put(username, "db", _encrypt_db_config(config))
+
+
+def _delete_db_config_entry(username, config_id):
+    return CONFIG_STORE_BACKEND.delete(username, "db", config_id)
 
 
 def _load_sql_config(username):
-    try:
-        path = os.path.join(USERS_DIR, username, "sqlconfig.json")
-        with open(path, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return []
+    return CONFIG_STORE_BACKEND.list(username, "sql")
 
 
 def _save_sql_config(username, config):
-    os.makedirs(os.path.join(USERS_DIR, username), exist_ok=True)
-    path = os.path.join(USERS_DIR, username, "sqlconfig.json")
-    with open(path, "w", encoding="utf-8") as file:
-        json.dump(config, file, indent=2)
+    CONFIG_STORE_BACKEND.replace(username, "sql", config)
 
 
-def _get_username_from_request():
-    token = request.cookies.get("sessionId")
+def _get_sql_config_entry(username, config_id):
+    return CONFIG_STORE_BACKEND.get(username, "sql", config_id)
 
-    if not token:
-        return None
+
+def _find_sql_config(username, menu_name):
+    return CONFIG_STORE_BACKEND.find(username, "sql", menu_name)
+
+
+def _put_sql_config(username, config):
+    CONFIG_STORE_BACKEND.put(username, "sql", config)
+
+
+def _delete_sql_config_entry(username, config_id):
+    return CONFIG_STORE_BACKEND.delete(username, "sql", config_id)
+
+
+def _metrics_begin(endpoint):
+    METRICS_LOCAL.labels = {"endpoint": endpoint, "database": "", "config": ""}
+    METRICS_LOCAL.timings = OrderedDict()
+    METRICS_LOCAL.rows = 0
+    METRICS_LOCAL.started = time.perf_counter()
+
+
+def _metrics_label(db_config=None, config_id=None):
+    labels = getattr(METRICS_LOCAL, "labels", None)
+    if labels is None:
+        return
+    if db_config:
+        host, port, database = _database_identity(db_config)
+        labels["database"] = f"{host}:{port}/{database}"
+    if config_id:
+        labels["config"] = str(config_id)
+
+
+def _observe(name, labels, value):
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS_LOCK:
+        entry = METRICS.get(key)
+        if entry is None:
+            entry = METRICS[key] = {"buckets": [0] * len(METRICS_BUCKETS), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(METRICS_BUCKETS):
+            if value <= bound:
+                entry["buckets"][index] += 1
+        entry["sum"] += value
+        entry["count"] += 1
+
+
+def _count(name, labels, value=1):
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS_LOCK:
+        METRICS[key] = METRICS.get(key, 0) + value
+
+
+@contextmanager
+def _timed(stage):
+    started = time.perf_counter()
     try:
-        data = _decode_session(token)
-        return data.get("username")
-    except jwt.PyJWTError:
-        return None
-    return None
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        labels = getattr(METRICS_LOCAL, "labels", None) or {"endpoint": "", "database": "", "config": ""}
+        _observe("sqlapp_stage_duration_seconds", {**labels, "stage": stage}, elapsed)
+        timings = getattr(METRICS_LOCAL, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
 
 
-def _check_super_role():
-    username = _get_username_from_request()
-    if not username:
+def _metrics_label_text(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _render_metrics():
+    with METRICS_LOCK:
+        items = sorted(
+            ((key, dict(value) if isinstance(value, dict) else value) for key, value in METRICS.items()),
+            key=lambda item: item[0],
+        )
+    lines = []
+    current = None
+    for (name, labels), value in items:
+        if name != current:
+            current = name
+            kind, help_text = METRICS_HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        if not isinstance(value, dict):
+            lines.append(f"{name}{_metrics_label_text(labels)} {value}")
+            continue
+        for bound, bucket_count in zip(METRICS_BUCKETS, value["buckets"]):
+            bucket_labels = labels + (("le", repr(bound)),)
+            lines.append(f"{name}_bucket{_metrics_label_text(bucket_labels)} {bucket_count}")
+        lines.append(f"{name}_bucket{_metrics_label_text(labels + (('le', '+Inf'),))} {value['count']}")
+        lines.append(f"{name}_sum{_metrics_label_text(labels)} {value['sum']}")
+        lines.append(f"{name}_count{_metrics_label_text(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _compressor(coding):
+    # Returns (compress, flush, finish) callables; flush emits everything buffered so far
+    if coding == "br":
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.flush, compressor.finish
+    if coding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        return (
+            compressor.compress,
+            lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+    # gzip has a gzip header, HTTP "deflate" is the zlib format
+    wbits = 31 if coding == "gzip" else 15
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, wbits)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _negotiate_coding():
+    best = None
+    best_quality = 0
+    for coding in CONTENT_CODINGS:
+        quality = request.accept_encodings.quality(coding)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compress_stream(chunks, coding):
+    # Flushes after every chunk so streamed NDJSON batches still reach the client one by one
+    compress, flush, finish = _compressor(coding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _etag_response(response, content=None):
+    # Strong ETag over the uncompressed body (or the given content). Compression appends the
+    # content coding to it, so If-None-Match is matched against every coded variant. Only
+    # GET and HEAD are answered with 304; other methods just carry the ETag.
+    if content is None:
+        content = response.get_data()
+    etag = hashlib.sha256(content).hexdigest()[:32]
+    if request.method in ("GET", "HEAD") and request.if_none_match:
+        for candidate in [etag] + [f"{etag}-{coding}" for coding in CONTENT_CODINGS]:
+            if request.if_none_match.contains(candidate):
+                not_modified = Response(status=304)
+                not_modified.set_etag(candidate)
+                not_modified.headers["Cache-Control"] = "private, no-cache"
+                not_modified.vary.update(("Accept-Encoding", "Cookie"))
+                return not_modified
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
+@app.before_request
+def _metrics_before_request():
+    _metrics_begin(request.endpoint or "unknown")
+
+
+@app.after_request
+def _metrics_after_request(response):
+    started = getattr(METRICS_LOCAL, "started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = METRICS_LOCAL.labels["endpoint"]
+    if response.is_streamed:
+        # The body is produced after this hook; the duration covers it once the server closes it
+        response.call_on_close(lambda: _observe(
+            "sqlapp_http_request_duration_seconds", {"endpoint": endpoint}, time.perf_counter() - started
+        ))
+    else:
+        _observe("sqlapp_http_request_duration_seconds", {"endpoint": endpoint}, elapsed)
+    _count("sqlapp_http_requests_total", {"endpoint": endpoint, "status": str(response.status_code)})
+    timings = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in METRICS_LOCAL.timings.items()]
+    timings.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+
+@app.after_request
+def _compress_response(response):
+    if not COMPRESSION_ENABLED or request.method == "HEAD":
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    coding = _negotiate_coding()
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, coding)
+        response.direct_passthrough = False
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            return response
+        compress, _, finish = _compressor(coding)
+        response.set_data(compress(data) + finish())
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{coding}", weak)
+    return response
+
+
+def _engine_key(db_config):
+    password = db_config.get("password") or ""
+    password_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return (
+        str(db_config.get("host") or ""),
+        str(db_config.get("port") or ""),
+        str(db_config.get("database") or ""),
+        str(db_config.get("user") or ""),
+        password_hash,
+    )
+
+
+def _build_db_url(db_config):
+    encoded_password = urllib.parse.quote_plus(db_config["password"])
+    return (
+        f"mysql+pymysql://{db_config['user']}:{encoded_password}"
+        f"@{db_config['host']}:{db_config['port']}/{db_config['database']}"
+    )
+
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of connecting while a database host's circuit is open."""
+
+
+def _host_key(db_config):
+    return (str(db_config.get("host") or ""), str(db_config.get("port") or ""))
+
+
+def _host_entry_locked(key):
+    # Caller must hold HOST_HEALTH_LOCK
+    entry = HOST_HEALTH.get(key)
+    if entry is None:
+        entry = {
+            "state": "closed",
+            "failures": 0,
+            "openedAt": None,
+            "lastError": None,
+            "lastFailureAt": None,
+            "lastOkAt": None,
+            "latencyMs": None,
+            "probeConfig": None,
+            # engine key -> monotonic time the credentials last connected
+            "verified": {},
+        }
+        HOST_HEALTH[key] = entry
+    return entry
+
+
+def _record_host_success(db_config, latency_ms=None, verified=True):
+    with HOST_HEALTH_LOCK:
+        entry = _host_entry_locked(_host_key(db_config))
+        if entry["state"] == "open":
+            app.logger.info("Database host reachable again, closing circuit: %s", ":".join(_host_key(db_config)))
+        entry["state"] = "closed"
+        entry["failures"] = 0
+        entry["openedAt"] = None
+        entry["lastOkAt"] = time.time()
+        if latency_ms is not None:
+            entry["latencyMs"] = round(latency_ms, 1)
+        if verified:
+            entry["verified"][_engine_key(db_config)] = time.monotonic()
+
+
+def _record_host_failure(db_config, error):
+    # Consecutive connection errors open the circuit; the prober closes it again
+    with HOST_HEALTH_LOCK:
+        entry = _host_entry_locked(_host_key(db_config))
+        entry["failures"] += 1
+        entry["lastError"] = str(error)
+        entry["lastFailureAt"] = time.time()
+        entry["verified"].pop(_engine_key(db_config), None)
+        if entry["state"] == "closed" and entry["failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+            entry["state"] = "open"
+            entry["openedAt"] = time.time()
+            entry["probeConfig"] = dict(db_config)
+            app.logger.error(
+                "Database host unreachable, opening circuit: %s (%s)", ":".join(_host_key(db_config)), error
+            )
+            if HEALTH_PROBER["thread"] is None:
+                HEALTH_PROBER["thread"] = threading.Thread(target=_probe_hosts, name="health-prober", daemon=True)
+                HEALTH_PROBER["thread"].start()
+
+
+def _check_circuit(db_config):
+    with HOST_HEALTH_LOCK:
+        entry = HOST_HEALTH.get(_host_key(db_config))
+        if not entry or entry["state"] != "open":
+            return
+        failures = entry["failures"]
+        last_error = entry["lastError"]
+    _count("sqlapp_circuit_rejections_total", {"host": ":".join(_host_key(db_config))})
+    raise DatabaseUnavailable(
+        f"database host {':'.join(_host_key(db_config))} is unavailable "
+        f"({failures} failed connection attempts, last error: {last_error})"
+    )
+
+
+def _probe_host(db_config):
+    started = time.perf_counter()
+    try:
+        engine = _get_engine(db_config, check_circuit=False)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        # Connection errors were counted by the engine's error hook. Any other error
+        # (bad credentials, unknown database) came from a server that is up.
+        if _mysql_error_code(e) not in CONNECT_ERROR_CODES:
+            _record_host_success(db_config, verified=False)
         return False
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
+    _record_host_success(db_config, (time.perf_counter() - started) * 1000)
+    return True
+
+
+def _probe_hosts():
+    # Background thread: re-checks open circuits until none are left
+    while True:
+        time.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+        with HOST_HEALTH_LOCK:
+            targets = [entry["probeConfig"] for entry in HOST_HEALTH.values() if entry["state"] == "open"]
+            if not targets:
+                HEALTH_PROBER["thread"] = None
+                return
+        for db_config in targets:
+            _probe_host(db_config)
+
+
+def _host_health_stats():
+    now = time.monotonic()
+    with HOST_HEALTH_LOCK:
+        return [
+            {
+                "host": host,
+                "port": port,
+                "state": entry["state"],
+                "failures": entry["failures"],
+                "openedAt": entry["openedAt"],
+                "lastError": entry["lastError"],
+                "lastFailureAt": entry["lastFailureAt"],
+                "lastOkAt": entry["lastOkAt"],
+                "latencyMs": entry["latencyMs"],
+                "verifiedConnections": sum(
+                    1 for verified_at in entry["verified"].values()
+                    if now - verified_at < HEALTH_STATE_MAX_AGE_SECONDS
+                ),
+            }
+            for (host, port), entry in HOST_HEALTH.items()
+        ]
+
+
+def _is_connect_failure(context):
+    # A handle_error context without a Connection comes from the pool opening a new DBAPI
+    # connection, unless it is the pre-ping of a pooled one. Errors of running statements
+    # say nothing about whether the host accepts connections.
+    if context.connection is not None or context.is_pre_ping:
+        return False
+    return _mysql_error_code(context.original_exception) in CONNECT_ERROR_CODES
+
+
+def _track_engine_health(engine, db_config):
+    # New DBAPI connections close the host's circuit; failures to open one count towards opening it
+    tracked_config = dict(db_config)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _record_host_success(tracked_config)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if _is_connect_failure(context):
+            _record_host_failure(tracked_config, context.original_exception)
+
+
+def _parse_replicas(payload):
+    # Returns (replicas, max lag) from a db config payload; host is required, the other
+    # connection fields default to the primary's
+    replicas = []
+    for replica in payload.get("replicas") or []:
+        if not isinstance(replica, dict) or not replica.get("host"):
+            raise ValueError("replicas need a host")
+        weight = int(replica.get("weight") or 1)
+        if weight <= 0:
+            raise ValueError("replica weight must be positive")
+        entry = {"host": replica["host"], "weight": weight}
+        for key in ("port", "user", "password"):
+            if replica.get(key):
+                entry[key] = replica[key]
+        replicas.append(entry)
+    max_lag = payload.get("max_replica_lag_seconds")
+    if max_lag is not None:
+        max_lag = float(max_lag)
+        if max_lag < 0:
+            raise ValueError("max_replica_lag_seconds must not be negative")
+    return replicas, max_lag
+
+
+def _replica_configs(db_config):
+    replicas = []
+    for replica in db_config.get("replicas") or []:
+        config = {key: db_config.get(key) for key in ("id", "host", "port", "database", "user", "password")}
+        config.update({key: replica[key] for key in ("host", "port", "user", "password") if replica.get(key)})
+        config["weight"] = int(replica.get("weight") or 1)
+        replicas.append(config)
+    return replicas
+
+
+def _is_read_only(sql):
+    return _is_select(sql) and not re.search(
+        r"\bfor\s+(?:update|share)\b|\block\s+in\s+share\s+mode\b", sql, re.IGNORECASE
+    )
+
+
+def _note_write(username, db_config):
+    # The user's reads of this database stay on the primary for REPLICA_STICKY_SECONDS
+    if not db_config.get("replicas"):
+        return
+    now = time.monotonic()
+    with RECENT_WRITES_LOCK:
+        RECENT_WRITES[(username, _engine_key(db_config))] = now
+        if len(RECENT_WRITES) > 10000:
+            for key in [key for key, wrote_at in RECENT_WRITES.items() if now - wrote_at >= REPLICA_STICKY_SECONDS]:
+                RECENT_WRITES.pop(key)
+
+
+def _route_stats_entry_locked(config, role):
+    # Caller must hold ROUTE_STATS_LOCK
+    key = _host_key(config)
+    entry = ROUTE_STATS.get(key)
+    if entry is None:
+        entry = {
+            "role": role,
+            "queries": 0,
+            "errors": 0,
+            "totalMs": 0.0,
+            "maxMs": 0.0,
+            "lagSeconds": None,
+            "lagStatus": "unknown",
+            "lagError": None,
+            "lagCheckedAt": None,
+            "lagChecking": False,
+        }
+        ROUTE_STATS[key] = entry
+    entry["role"] = role
+    return entry
+
+
+def _check_replica_lag(replica):
+    # "notReplica" is a standalone server, e.g. a local stand-in; "stopped" means the
+    # replication threads are not running, so the data is stale by an unknown amount
+    lag, status, error = None, "unknown", None
+    try:
+        engine = _get_engine(replica)
+        with engine.connect() as connection:
+            try:
+                row = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            except Exception:
+                # Before MySQL 8.0.22
+                connection.rollback()
+                row = connection.execute(text("SHOW SLAVE STATUS")).mappings().first()
+        if row is None:
+            status = "notReplica"
+        else:
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            status = "ok" if lag is not None else "stopped"
+    except Exception as e:
+        status, error = "error", str(e)
+    with ROUTE_STATS_LOCK:
+        entry = _route_stats_entry_locked(replica, "replica")
+        entry["lagSeconds"] = lag
+        entry["lagStatus"] = status
+        entry["lagError"] = error
+        entry["lagCheckedAt"] = time.monotonic()
+        entry["lagChecking"] = False
+
+
+def _replica_eligible(replica, max_lag):
+    with HOST_HEALTH_LOCK:
+        health = HOST_HEALTH.get(_host_key(replica))
+        if health and health["state"] == "open":
+            return False
+    now = time.monotonic()
+    with ROUTE_STATS_LOCK:
+        entry = _route_stats_entry_locked(replica, "replica")
+        # Lag is measured in the background, so routing never waits for it
+        stale = entry["lagCheckedAt"] is None or now - entry["lagCheckedAt"] >= REPLICA_LAG_CHECK_SECONDS
+        if stale and not entry["lagChecking"]:
+            entry["lagChecking"] = True
+            REPLICA_LAG_EXECUTOR.submit(_check_replica_lag, dict(replica))
+        lag, status = entry["lagSeconds"], entry["lagStatus"]
+    if status == "stopped":
+        return False
+    if max_lag is None:
+        return True
+    # With a lag limit, only replicas whose lag was measured within it qualify
+    if status == "notReplica":
+        return True
+    return status == "ok" and lag <= max_lag
+
+
+def _route_read(db_config, username=None):
+    # Returns the config a read-only statement runs on: a healthy replica picked by weight,
+    # or the primary when there is none or the user wrote to this database moments ago
+    replicas = _replica_configs(db_config)
+    if not replicas:
+        return db_config
+    with RECENT_WRITES_LOCK:
+        wrote_at = RECENT_WRITES.get((username, _engine_key(db_config)))
+    if wrote_at is not None and time.monotonic() - wrote_at < REPLICA_STICKY_SECONDS:
+        return db_config
+    max_lag = db_config.get("max_replica_lag_seconds")
+    candidates = [replica for replica in replicas if _replica_eligible(replica, max_lag)]
+    if not candidates:
+        return db_config
+    return random.choices(candidates, weights=[replica["weight"] for replica in candidates])[0]
+
+
+def _record_route(primary_config, target_config, elapsed_ms, ok):
+    with ROUTE_STATS_LOCK:
+        role = "primary" if _host_key(target_config) == _host_key(primary_config) else "replica"
+        entry = _route_stats_entry_locked(target_config, role)
+        entry["queries"] += 1
+        if not ok:
+            entry["errors"] += 1
+        entry["totalMs"] += elapsed_ms
+        entry["maxMs"] = max(entry["maxMs"], elapsed_ms)
+
+
+def _route_stats():
+    now = time.monotonic()
+    with ROUTE_STATS_LOCK:
+        return [
+            {
+                "host": host,
+                "port": port,
+                "role": entry["role"],
+                "queries": entry["queries"],
+                "errors": entry["errors"],
+                "avgMs": round(entry["totalMs"] / entry["queries"], 1) if entry["queries"] else None,
+                "maxMs": round(entry["maxMs"], 1),
+                "lagSeconds": entry["lagSeconds"],
+                "lagStatus": entry["lagStatus"],
+                "lagError": entry["lagError"],
+                "lagAgeSeconds": (
+                    round(now - entry["lagCheckedAt"], 1) if entry["lagCheckedAt"] is not None else None
+                ),
+            }
+            for (host, port), entry in ROUTE_STATS.items()
+        ]
+
+
+def _dispose_db_config_engines(db_config):
+    # Primary and replica engines of a replaced or deleted config
+    for config in [db_config] + _replica_configs(db_config):
+        _dispose_engine(config)
+    _invalidate_schema(db_config)
+
+
+def _connect_args():
+    connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}
+    if DB_READ_TIMEOUT_SECONDS > 0:
+        connect_args["read_timeout"] = DB_READ_TIMEOUT_SECONDS
+    if DB_WRITE_TIMEOUT_SECONDS > 0:
+        connect_args["write_timeout"] = DB_WRITE_TIMEOUT_SECONDS
+    return connect_args
+
+
+def _evict_idle_engines_locked(now):
+    # Caller must hold ENGINES_LOCK. Engines with connections still checked out are kept.
+    for key, entry in list(ENGINES.items()):
+        if now - entry["lastUsed"] < DB_ENGINE_IDLE_SECONDS:
+            continue
+        if entry["engine"].pool.checkedout() > 0:
+            continue
+        ENGINES.pop(key, None)
+        entry["engine"].dispose()
+
+
+def _get_engine(db_config, check_circuit=True):
+    # Fails fast with DatabaseUnavailable while the host's circuit is open
+    if check_circuit:
+        _check_circuit(db_config)
+    key = _engine_key(db_config)
+    now = time.monotonic()
+    with ENGINES_LOCK:
+        # The sweep walks every engine, so it runs at most twice per idle period
+        if now - ENGINE_SWEEP["at"] >= DB_ENGINE_IDLE_SECONDS / 2:
+            ENGINE_SWEEP["at"] = now
+            _evict_idle_engines_locked(now)
+        entry = ENGINES.get(key)
+        if entry is None:
+            engine = create_engine(
+                _build_db_url(db_config),
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                pool_recycle=DB_POOL_RECYCLE_SECONDS,
+                connect_args=_connect_args(),
+            )
+            _track_engine_health(engine, db_config)
+            entry = {"engine": engine, "createdAt": now, "lastUsed": now, "uses": 0}
+            ENGINES[key] = entry
+        entry["lastUsed"] = now
+        entry["uses"] += 1
+        return entry["engine"]
+
+
+def _dispose_engine(db_config):
+    key = _engine_key(db_config)
+    with ENGINES_LOCK:
+        entry = ENGINES.pop(key, None)
+    if entry:
+        entry["engine"].dispose()
+
+
+def _engine_stats():
+    now = time.monotonic()
+    stats = []
+    with ENGINES_LOCK:
+        for (host, port, database, user, _), entry in ENGINES.items():
+            pool = entry["engine"].pool
+            stats.append({
+                "host": host,
+                "port": port,
+                "database": database,
+                "user": user,
+                "poolSize": pool.size(),
+                "checkedIn": pool.checkedin(),
+                "checkedOut": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "uses": entry["uses"],
+                "ageSeconds": round(now - entry["createdAt"], 1),
+                "idleSeconds": round(now - entry["lastUsed"], 1),
+            })
+    return stats
+
+
+# Quoted strings and identifiers, and comments (MySQL's /*! and optimizer /*+ forms are code)
+SQL_TOKEN = re.compile(
+    r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`"""
+    r"""|(?P<comment>(?:\#|--(?=\s|$))[^\n]*|/\*(?![!+]).*?(?:\*/|$))""",
+    re.DOTALL,
+)
+
+STATEMENT_KEYWORDS = ("select", "insert", "replace", "update", "delete")
+
+
+def _statement_keyword(sql):
+    # The statement's first keyword, lowercased. A WITH clause belongs to the statement after
+    # its CTEs, so "WITH t AS (...) DELETE ..." is a delete; that statement's keyword is the
+    # first one outside the CTE bodies, ignoring quoted text and comments. "with" is returned
+    # when none is found (e.g. a parenthesized main query).
+    head = re.match(r"\s*(\w+)", sql)
+    if head is None:
+        return ""
+    keyword = head.group(1).lower()
+    if keyword != "with":
+        return keyword
+    depth = 0
+    for token in re.findall(r"[()]|\w+", SQL_TOKEN.sub(" ", sql[head.end():])):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.lower() in STATEMENT_KEYWORDS:
+            return token.lower()
+    return keyword
+
+
+def _is_select(sql):
+    head = sql.lstrip()[:6].lower()
+    if head == "select":
+        return True
+    return head.startswith("with") and _statement_keyword(sql) == "select"
+
+
+def _strip_statement(sql):
+    # Drops trailing semicolons and comments, so the statement can be wrapped as a derived
+    # table or extended with LIMIT without a trailing -- comment swallowing the rest
+    sql = sql.strip().rstrip(";").strip()
+    tail = sql[sql.rfind("\n") + 1:]
+    if "--" not in tail and "#" not in tail and not sql.endswith("*/"):
+        return sql
+    while True:
+        last = None
+        for last in SQL_TOKEN.finditer(sql):
+            pass
+        if last is None or last.group("comment") is None or sql[last.end():].strip():
+            return sql
+        sql = sql[:last.start()].strip().rstrip(";").strip()
+
+
+def _normalize_sql(sql):
+    # For grouping log records only: collapsing whitespace also touches string literals, so
+    # caches key on _strip_statement instead
+    return re.sub(r"\s+", " ", _strip_statement(sql))
+
+
+def _quote_identifier(name):
+    if not isinstance(name, str) or not name:
+        raise ValueError(f"invalid column name: {name}")
+    return "`{}`".format(name.replace("`", "``"))
+
+
+def _escape_like(value):
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _ttl_cache_get(cache, lock, key, ttl):
+    now = time.monotonic()
+    with lock:
+        entry = cache.get(key)
+        if entry and now - entry[1] < ttl:
+            return True, entry[0]
+    return False, None
+
+
+def _ttl_cache_put(cache, lock, key, value, max_entries):
+    with lock:
+        cache.pop(key, None)
+        cache[key] = (value, time.monotonic())
+        while len(cache) > max_entries:
+            cache.pop(next(iter(cache)))
+
+
+def _statement(sql, params=None):
+    # List values bind as expanding IN parameters. Compiled forms are cached by the
+    # engine (keyed on the SQL text), so the text() construct itself is not kept.
+    statement = text(sql)
+    expanding = sorted(name for name, value in (params or {}).items() if isinstance(value, (list, tuple)))
+    if expanding:
+        statement = statement.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return statement
+
+
+def _encode_cursor(data):
+    raw = json.dumps(data, default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("utf-8")
+
+
+def _cursor_value(value):
+    # Ints and floats stay exact in JSON; Decimal and bytes keys travel as typed text
+    if isinstance(value, Decimal):
+        return {"after": str(value), "afterType": "decimal"}
+    if isinstance(value, (bytes, bytearray)):
+        return {"after": base64.b64encode(bytes(value)).decode("ascii"), "afterType": "bytes"}
+    return {"after": value}
+
+
+def _cursor_after(data):
+    after = data.get("after")
+    kind = data.get("afterType")
+    if after is None or kind is None:
+        return after
+    try:
+        if kind == "decimal":
+            return Decimal(after)
+        if kind == "bytes":
+            return base64.b64decode(after.encode("ascii"), validate=True)
+    except Exception:
+        pass
+    raise ValueError("invalid cursor")
+
+
+def _decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode("utf-8")))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(data, dict):
+        raise ValueError("invalid cursor")
+    return data
+
+
+class _RawJSON(str):
+    """JSON text that _dump_json embeds as is instead of encoding it again."""
+
+    __slots__ = ()
+
+
+_encode_string = json.encoder.encode_basestring
+
+
+def _encode_int(value):
+    # Integers beyond 2^53 become strings to avoid JavaScript precision loss
+    if -MAX_SAFE_INTEGER <= value <= MAX_SAFE_INTEGER:
+        return str(value)
+    return f'"{value}"'
+
+
+def _encode_float(value):
+    return repr(value) if math.isfinite(value) else "null"
+
+
+def _encode_timedelta(value):
+    # MySQL TIME columns arrive as timedelta; render them as [-]HH:MM:SS[.ffffff]
+    total = abs(value)
+    hours, remainder = divmod(total.days * 86400 + total.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    text_value = f"{'-' if value < timedelta(0) else ''}{hours:02d}:{minutes:02d}:{seconds:02d}"
+    if total.microseconds:
+        text_value += f".{total.microseconds:06d}"
+    return f'"{text_value}"'
+
+
+def _encode_bytes(value):
+    return '"' + base64.b64encode(bytes(value)).decode("ascii") + '"'
+
+
+def _encode_value(value):
+    # Generic encoder, dispatching on the Python type of the value
+    if value is None:
+        return "null"
+    kind = type(value)
+    if kind is str:
+        return _encode_string(value)
+    if kind is int:
+        return _encode_int(value)
+    if kind is bool:
+        return "true" if value else "false"
+    if kind is float:
+        return _encode_float(value)
+    if kind is Decimal:
+        return f'"{value}"'
+    if kind is datetime:
+        return '"' + value.isoformat(sep=" ") + '"'
+    if kind is date or kind is dt_time:
+        return '"' + value.isoformat() + '"'
+    if kind is timedelta:
+        return _encode_timedelta(value)
+    if kind in (bytes, bytearray, memoryview):
+        return _encode_bytes(value)
+    if isinstance(value, (dict, list, tuple)):
+        return _dump_json(value)
+    return _encode_string(str(value))
+
+
+def _nullable(encode):
+    return lambda value: "null" if value is None else encode(value)
+
+
+def _encode_text(value):
+    if value is None:
+        return "null"
+    if type(value) is str:
+        return _encode_string(value)
+    return _encode_value(value)
+
+
+def _encode_bit(value):
+    # BIT columns arrive as big-endian bytes
+    if value is None:
+        return "null"
+    if isinstance(value, (bytes, bytearray)):
+        return _encode_int(int.from_bytes(value, "big"))
+    return _encode_value(value)
+
+
+def _encode_datetime(value):
+    # Zero dates arrive as strings, so other types fall back to the generic encoder
+    if type(value) is datetime:
+        return '"' + value.isoformat(sep=" ") + '"'
+    return _encode_value(value)
+
+
+_encode_small_int = _nullable(str)
+_encode_decimal = _nullable(lambda value: f'"{value}"')
+_ENCODERS_BY_TYPE = {
+    FIELD_TYPE.TINY: _encode_small_int,
+    FIELD_TYPE.SHORT: _encode_small_int,
+    FIELD_TYPE.LONG: _encode_small_int,
+    FIELD_TYPE.INT24: _encode_small_int,
+    FIELD_TYPE.YEAR: _encode_small_int,
+    FIELD_TYPE.LONGLONG: _nullable(_encode_int),
+    FIELD_TYPE.FLOAT: _nullable(_encode_float),
+    FIELD_TYPE.DOUBLE: _nullable(_encode_float),
+    FIELD_TYPE.DECIMAL: _encode_decimal,
+    FIELD_TYPE.NEWDECIMAL: _encode_decimal,
+    FIELD_TYPE.DATETIME: _encode_datetime,
+    FIELD_TYPE.TIMESTAMP: _encode_datetime,
+    FIELD_TYPE.BIT: _encode_bit,
+    FIELD_TYPE.VARCHAR: _encode_text,
+    FIELD_TYPE.VAR_STRING: _encode_text,
+    FIELD_TYPE.STRING: _encode_text,
+    FIELD_TYPE.ENUM: _encode_text,
+    FIELD_TYPE.SET: _encode_text,
+    FIELD_TYPE.JSON: _encode_text,
+    FIELD_TYPE.TINY_BLOB: _encode_text,
+    FIELD_TYPE.MEDIUM_BLOB: _encode_text,
+    FIELD_TYPE.LONG_BLOB: _encode_text,
+    FIELD_TYPE.BLOB: _encode_text,
+}
+
+
+def _row_encoder(columns, columnar):
+    # Builds one encoder per column from the cursor type codes, then a row function that
+    # writes the row's JSON text directly: an array for columnar, else an object.
+    # Other columns and drivers without type codes use the generic encoder.
+    encoders = [_ENCODERS_BY_TYPE.get(column["typeCode"], _encode_value) for column in columns]
+    if columnar:
+        def encode(row):
+            return "[" + ",".join([encoder(value) for encoder, value in zip(encoders, row)]) + "]"
+    else:
+        prefixes = [_encode_string(column["name"]) + ":" for column in columns]
+        pairs = list(zip(prefixes, encoders))
+
+        def encode(row):
+            return "{" + ",".join([prefix + encoder(value) for (prefix, encoder), value in zip(pairs, row)]) + "}"
+    return encode
+
+
+def _dump_json(value):
+    # Serializes response bodies, embedding _RawJSON fragments (encoded rows) unchanged
+    if isinstance(value, _RawJSON):
+        return value
+    if isinstance(value, dict):
+        return "{" + ",".join([_encode_string(str(key)) + ":" + _dump_json(item) for key, item in value.items()]) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join([_dump_json(item) for item in value]) + "]"
+    return _encode_value(value)
+
+
+def _json_response(data, status=200):
+    return Response(_dump_json(data), status=status, mimetype="application/json")
+
+
+def _describe_columns(result):
+    description = (result.cursor.description if result.cursor is not None else None) or []
+    columns = []
+    for index, name in enumerate(result.keys()):
+        column = description[index] if index < len(description) else (name, None)
+        null_ok = column[6] if len(column) > 6 else None
+        columns.append({
+            "name": name,
+            "typeCode": column[1],
+            "nullable": None if null_ok is None else bool(null_ok),
+        })
+    return columns
+
+
+def _collect_rows(result, columnar, budget=None, raw=None):
+    # Returns (columns, rows, truncated). rows are the JSON texts of the rows, see _row_encoder;
+    # columns is None for the default list-of-objects format, truncated is None unless the
+    # budget cut the fetch short. raw, when given, collects the driver rows in the same order
+    # (it may hold one more row than rows when the budget stopped after encoding it).
+    described = _describe_columns(result)
+    encode = _row_encoder(described, columnar)
+    columns = described if columnar else None
+    if raw is not None:
+        encode_row = encode
+
+        def encode(row):
+            raw.append(row)
+            return encode_row(row)
+    if budget is not None:
+        rows, truncated = _fetch_within_budget(result, encode, budget)
+        METRICS_LOCAL.rows = getattr(METRICS_LOCAL, "rows", 0) + len(rows)
+        return columns, rows, truncated
+
+    with _timed("fetch"):
+        fetched = result.fetchall()
+    METRICS_LOCAL.rows = getattr(METRICS_LOCAL, "rows", 0) + len(fetched)
+    with _timed("convert"):
+        return columns, [encode(row) for row in fetched], None
+
+
+def _fetch_within_budget(source, encode, budget):
+    # Fetches in batches and stops at the first budget hit. Bytes are the size of the
+    # encoded rows, which is what the response will carry.
+    deadline = time.monotonic() + budget["maxFetchMs"] / 1000
+    rows = []
+    size = 2
+    reason = None
+    while reason is None:
+        if rows and time.monotonic() > deadline:
+            reason = "time"
+            break
+        with _timed("fetch"):
+            batch = source.fetchmany(RESULT_FETCH_BATCH_SIZE)
+        if not batch:
+            break
+        with _timed("convert"):
+            for row in batch:
+                if len(rows) >= budget["maxRows"]:
+                    reason = "rows"
+                    break
+                value = encode(row)
+                size += len(value) + 1
+                if size > budget["maxBytes"]:
+                    reason = "bytes"
+                    break
+                rows.append(value)
+    if reason is None:
+        return rows, None
+    limits = {key: budget[key] for key in BUDGET_FIELDS.values()}
+    return rows, {"reason": reason, "rowCount": len(rows), "limits": limits}
+
+
+def _limit_probe_sql(sql, limit):
+    # Appends LIMIT n+1 so MySQL stops producing rows once the budget is exceeded. Returns None,
+    # so the budget is enforced by fetchmany on the unchanged SQL, unless the tail is clearly safe:
+    # no LIMIT of its own (literal or bound), no locking or INTO clause anywhere, no trailing
+    # comment, and the statement ends in a name, literal, parameter or closing parenthesis.
+    base = _strip_statement(sql)
+    if not _is_select(base):
+        return None
+    value = r"(\d+|:\w+|\?|@\w+)"
+    own_limit = re.compile(rf"\blimit\s+{value}(\s*,\s*{value}|\s+offset\s+{value})?\s*$", re.IGNORECASE)
+    unsafe = re.compile(
+        r"\bfor\s+(update|share)\b|\block\s+in\s+share\s+mode\b|\bnowait\b|\bskip\s+locked\b"
+        r"|\binto\b|\bprocedure\b|((--|#)[^\n]*|\*/)\s*$",
+        re.IGNORECASE,
+    )
+    if own_limit.search(base) or unsafe.search(base) or not re.search(r"[\w`'\")]$", base):
+        return None
+    return f"{base} LIMIT {int(limit)}"
+
+
+def _execute_within_budget(connection, sql, columnar, budget, params=None):
+    # Unbuffered cursor so rows past the budget are never loaded into the worker
+    probe_sql = _limit_probe_sql(sql, budget["maxRows"] + 1)
+    with _timed("execute"):
+        result = connection.execute(
+            _statement(probe_sql or sql, params), params or {}, execution_options={"stream_results": True}
+        )
+    columns, rows, truncated = _collect_rows(result, columnar, budget)
+    if truncated and not (probe_sql and truncated["reason"] == "rows"):
+        # Closing an unbuffered cursor reads every remaining row; drop the socket instead
+        connection.invalidate()
+        connection.rollback()
+    else:
+        result.close()
+    return columns, rows, truncated
+
+
+def _results_body(columns, rows, truncated=None):
+    rows = _RawJSON("[" + ",".join(rows) + "]")
+    body = {"results": rows} if columns is None else {"columns": columns, "rows": rows}
+    if truncated:
+        body["truncated"] = truncated
+    return body
+
+
+def _ndjson_line(data):
+    return _dump_json(data) + "\n"
+
+
+def _stream_rows(db_config, sql, batch_size, columnar=False, params=None, on_finish=None):
+    # Runs inside the response body, so the connection is held only while streaming.
+    # on_finish(ok) is called once the stream ended, failed or was closed by the client.
+    row_count = 0
+    ok = False
+    try:
+        engine = _get_engine(db_config)
+        with engine.connect() as connection:
+            # stream_results makes PyMySQL use an unbuffered SSCursor
+            streaming = connection.execution_options(stream_results=True)
+            result = streaming.execute(_statement(sql, params), params or {})
+            columns = _describe_columns(result)
+            encode = _row_encoder(columns, columnar)
+            if not columnar:
+                columns = [column["name"] for column in columns]
+            yield _ndjson_line({"type": "columns", "columns": columns})
+            while True:
+                batch = result.fetchmany(batch_size)
+                if not batch:
+                    break
+                row_count += len(batch)
+                rows = _RawJSON("[" + ",".join([encode(row) for row in batch]) + "]")
+                yield _ndjson_line({"type": "rows", "rows": rows})
+        ok = True
+        yield _ndjson_line({"type": "end", "rowCount": row_count})
+    except Exception as e:
+        yield _ndjson_line({"type": "error", "error": str(e), "rowCount": row_count})
+    finally:
+        METRICS_LOCAL.rows = row_count
+        if on_finish is not None:
+            on_finish(ok)
+
+
+def _parse_paging(payload):
+    # Returns None when the client did not ask for a page
+    page_size = payload.get("pageSize")
+    if page_size is None:
+        return None
+    page_size = int(page_size)
+    if page_size < 1:
+        raise ValueError("pageSize must be positive")
+    page_size = min(page_size, PAGE_SIZE_MAX)
+
+    key_column = payload.get("keyColumn") or None
+    after = None
+    offset = 0
+    cursor = payload.get("cursor")
+    if cursor:
+        data = _decode_cursor(cursor)
+        key_column = data.get("key") or key_column
+        after = _cursor_after(data)
+        offset = int(data.get("offset") or 0)
+    elif payload.get("offset") is not None:
+        offset = int(payload.get("offset"))
+    elif payload.get("page") is not None:
+        offset = (int(payload.get("page")) - 1) * page_size
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    if key_column:
+        # Keyset paging continues from the cursor value, never from an offset
+        offset = 0
+
+    return {
+        "pageSize": page_size,
+        "offset": offset,
+        "keyColumn": key_column,
+        "after": after,
+        "withTotal": bool(payload.get("withTotal")),
+    }
+
+
+def _parse_view(payload):
+    # Returns None when the client did not ask for sorting or filtering
+    sort_specs = payload.get("sort") or []
+    filter_specs = payload.get("filters") or []
+    if not isinstance(sort_specs, list) or not isinstance(filter_specs, list):
+        raise ValueError("sort and filters must be lists")
+
+    sort = []
+    for spec in sort_specs:
+        if not isinstance(spec, dict) or not spec.get("column"):
+            raise ValueError("sort entries need a column")
+        direction = str(spec.get("direction") or "asc").lower()
+        if direction not in ("asc", "desc"):
+            raise ValueError(f"invalid sort direction: {direction}")
+        sort.append({"column": spec["column"], "direction": direction})
+
+    filters = []
+    for spec in filter_specs:
+        if not isinstance(spec, dict) or not spec.get("column"):
+            raise ValueError("filter entries need a column")
+        operator = spec.get("operator") or "eq"
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"invalid filter operator: {operator}")
+        if operator not in ("isNull", "notNull") and spec.get("value") is None:
+            raise ValueError(f"filter on {spec['column']} needs a value")
+        filters.append({"column": spec["column"], "operator": operator, "value": spec.get("value")})
+
+    if not sort and not filters:
+        return None
+    return {"sort": sort, "filters": filters}
+
+
+def _result_columns(connection, db_config, base_sql, params=None):
+    cache_key = (_engine_key(db_config), _strip_statement(base_sql))
+    found, names = _ttl_cache_get(
+        RESULT_COLUMNS_CACHE, RESULT_COLUMNS_CACHE_LOCK, cache_key, COUNT_CACHE_TTL_SECONDS
+    )
+    if found:
+        return names
+    probe_sql = f"SELECT * FROM ({base_sql}) AS _cols_src LIMIT 0"
+    result = connection.execute(_statement(probe_sql, params), params or {})
+    names = list(result.keys())
+    result.close()
+    _ttl_cache_put(
+        RESULT_COLUMNS_CACHE, RESULT_COLUMNS_CACHE_LOCK, cache_key, names, COUNT_CACHE_MAX_ENTRIES
+    )
+    return names
+
+
+def _checked_column(name, result_columns):
+    # Only result columns of the saved query may be referenced by sort, filter or keyset specs
+    if name not in result_columns:
+        raise ValueError(f"unknown column: {name}")
+    return f"_page_src.{_quote_identifier(name)}"
+
+
+def _build_view_clauses(view, result_columns, params):
+    where = []
+    order_by = []
+    if not view:
+        return where, order_by
+    for index, spec in enumerate(view["filters"]):
+        column = _checked_column(spec["column"], result_columns)
+        operator = spec["operator"]
+        if operator in ("isNull", "notNull"):
+            where.append(f"{column} {FILTER_OPERATORS[operator]}")
+            continue
+        name = f"_f{index}"
+        value = spec["value"]
+        if operator == "contains":
+            value = f"%{_escape_like(value)}%"
+        elif operator == "startsWith":
+            value = f"{_escape_like(value)}%"
+        where.append(f"{column} {FILTER_OPERATORS[operator]} :{name}")
+        params[name] = value
+    for spec in view["sort"]:
+        column = _checked_column(spec["column"], result_columns)
+        order_by.append(f"{column} {spec['direction'].upper()}")
+    return where, order_by
+
+
+def _cached_count(connection, cache_key, count_sql, params):
+    found, total = _ttl_cache_get(COUNT_CACHE, COUNT_CACHE_LOCK, cache_key, COUNT_CACHE_TTL_SECONDS)
+    if found:
+        return total
+    total = connection.execute(_statement(count_sql, params), params).scalar() or 0
+    _ttl_cache_put(COUNT_CACHE, COUNT_CACHE_LOCK, cache_key, total, COUNT_CACHE_MAX_ENTRIES)
+    return total
+
+
+def _view_sql(base_sql, where, order_by):
+    view_sql = f"SELECT * FROM ({base_sql}) AS _page_src"
+    if where:
+        view_sql += " WHERE " + " AND ".join(where)
+    if order_by:
+        view_sql += " ORDER BY " + ", ".join(order_by)
+    return view_sql
+
+
+def _fetch_unwrapped_page(connection, sql, paging, columnar, budget, params):
+    # Pages a SELECT that cannot be a derived table (duplicate column names): the statement
+    # runs unchanged, and the offset rows are skipped and the page cut here
+    with _timed("execute"):
+        result = connection.execute(_statement(sql, params), params)
+    described = _describe_columns(result)
+    skipped = 0
+    with _timed("fetch"):
+        while skipped < paging["offset"]:
+            batch = result.fetchmany(min(RESULT_FETCH_BATCH_SIZE, paging["offset"] - skipped))
+            if not batch:
+                break
+            skipped += len(batch)
+        fetched = result.fetchmany(paging["pageSize"] + 1)
+    METRICS_LOCAL.rows = getattr(METRICS_LOCAL, "rows", 0) + len(fetched)
+
+    encode = _row_encoder(described, columnar)
+    rows = []
+    size = 2
+    reason = None
+    with _timed("convert"):
+        for row in fetched:
+            if budget and len(rows) >= budget["maxRows"]:
+                reason = "rows"
+                break
+            value = encode(row)
+            size += len(value) + 1
+            if budget and size > budget["maxBytes"]:
+                reason = "bytes"
+                break
+            rows.append(value)
+    truncated = None
+    if reason:
+        limits = {key: budget[key] for key in BUDGET_FIELDS.values()}
+        truncated = {"reason": reason, "rowCount": len(rows), "limits": limits}
+
+    total = None
+    if paging["withTotal"]:
+        with _timed("count"):
+            total = skipped + len(fetched)
+            while True:
+                batch = result.fetchmany(RESULT_FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                total += len(batch)
+    result.close()
+    return (described if columnar else None), rows, truncated, total
+
+
+def _fetch_page(connection, db_config, sql, paging, columnar=False, view=None, budget=None, query_params=None):
+    # Wrap the saved SELECT as a derived table so MySQL only returns the requested rows.
+    # paging may be None when only sort/filter specs were given. query_params are the
+    # query's own bound values; the generated names all start with an underscore.
+    base_sql = _strip_statement(sql)
+    key_column = paging["keyColumn"] if paging else None
+    if key_column and view and view["sort"]:
+        raise ValueError("keyColumn cannot be combined with sort")
+
+    params = dict(query_params or {})
+    try:
+        result_columns = _result_columns(connection, db_config, base_sql, params) if (view or key_column) else []
+        where, order_by = _build_view_clauses(view, result_columns, params)
+        filter_where = list(where)
+        filter_params = dict(params)
+
+        if key_column:
+            key = _checked_column(key_column, result_columns)
+            if paging["after"] is not None:
+                where.append(f"{key} > :_after")
+                params["_after"] = paging["after"]
+            order_by = [key]
+
+        page_sql = _view_sql(base_sql, where, order_by)
+        if paging:
+            page_size = paging["pageSize"]
+            page_sql += " LIMIT :_limit"
+            params["_limit"] = page_size + 1
+            if not key_column:
+                page_sql += " OFFSET :_offset"
+                params["_offset"] = paging["offset"]
+
+        with _timed("execute"):
+            result = connection.execute(_statement(page_sql, params), params)
+    except SQLAlchemyError as e:
+        if _mysql_error_code(e) != ER_DUP_FIELDNAME:
+            raise
+        # SELECT a.id, b.id ... repeats a column name, so it cannot be a derived table.
+        # Plain pages still work on the unwrapped statement; sort, filters and keys cannot.
+        if view or key_column:
+            raise ValueError(
+                "the query returns duplicate column names; give its columns distinct aliases "
+                "to sort, filter or page it by key"
+            ) from e
+        columns, rows, truncated, total = _fetch_unwrapped_page(
+            connection, base_sql, paging, columnar, budget, dict(query_params or {})
+        )
+        has_more = len(rows) > page_size or truncated is not None
+        rows = rows[:page_size]
+        page = {
+            "pageSize": page_size,
+            "offset": paging["offset"],
+            "hasMore": has_more,
+            "nextCursor": _encode_cursor({"offset": paging["offset"] + len(rows)}) if has_more else None,
+        }
+        if total is not None:
+            page["total"] = total
+        return columns, rows, page, truncated
+    raw = [] if key_column else None
+    columns, rows, truncated = _collect_rows(result, columnar, budget, raw)
+    if not paging:
+        return columns, rows, None, truncated
+
+    # One extra row tells us whether another page exists without counting
+    has_more = len(rows) > page_size or truncated is not None
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more:
+        if key_column:
+            # The driver value, not its JSON text: BIGINTs past 2^53 and DECIMALs are strings
+            # there, and MySQL would compare the key with a string as a double
+            last_key = raw[len(rows) - 1][list(result.keys()).index(key_column)]
+            next_cursor = _encode_cursor({"key": key_column, **_cursor_value(last_key)})
+        else:
+            next_cursor = _encode_cursor({"offset": paging["offset"] + len(rows)})
+
+    page = {
+        "pageSize": page_size,
+        "offset": paging["offset"],
+        "hasMore": has_more,
+        "nextCursor": next_cursor,
+    }
+    if paging["withTotal"]:
+        count_sql = f"SELECT COUNT(*) FROM ({base_sql}) AS _page_src"
+        if filter_where:
+            count_sql += " WHERE " + " AND ".join(filter_where)
+        cache_key = (
+            _engine_key(db_config),
+            _strip_statement(sql),
+            json.dumps(view["filters"] if view else [], sort_keys=True, default=str),
+            json.dumps(query_params or {}, sort_keys=True, default=str),
+        )
+        with _timed("count"):
+            page["total"] = _cached_count(connection, cache_key, count_sql, filter_params)
+    return columns, rows, page, truncated
+
+
+def _database_identity(db_config):
+    return (
+        str(db_config.get("host") or ""),
+        str(db_config.get("port") or ""),
+        str(db_config.get("database") or ""),
+    )
+
+
+def _table_name(identifier):
+    # `schema`.`table` -> table
+    return identifier.replace("`", "").split(".")[-1].lower()
+
+
+def _cached_schema(db_config):
+    # The schema if it is already cached; never loads it
+    found, schema = _ttl_cache_get(SCHEMA_CACHE, SCHEMA_CACHE_LOCK, _engine_key(db_config), SCHEMA_CACHE_TTL_SECONDS)
+    return schema if found else None
+
+
+def _base_table(schema, identifier):
+    # A base table of the connection's database, or None for views, other databases'
+    # tables and names the schema does not know
+    if schema is None or "." in identifier.replace("`", ""):
+        return None
+    table = _schema_table(schema, identifier)
+    if table is None or table["type"] != "table":
+        return None
+    return table["name"].lower()
+
+
+def _sql_tables(sql, schema):
+    # The base tables a SELECT reads, or None when the text does not tell them apart: comma
+    # joins, views, unknown names or no cached schema. A cache entry with None is dropped by
+    # any write to its database.
+    if re.search(r"\b(?:from|join)\s+[`\w.]+(?:\s+(?:as\s+)?\w+)?\s*,", sql, re.IGNORECASE):
+        return None
+    ctes = {
+        name.lower()
+        for name in re.findall(r"(?:\bwith(?:\s+recursive)?|,)\s*`?(\w+)`?\s+as\s*\(", sql, re.IGNORECASE)
+    }
+    tables = set()
+    for identifier in re.findall(r"\b(?:from|join)\s+([`\w.]+)", sql, re.IGNORECASE):
+        if _table_name(identifier) in ctes:
+            continue
+        table = _base_table(schema, identifier)
+        if table is None:
+            return None
+        tables.add(table)
+    return frozenset(tables)
+
+
+def _write_target_table(sql):
+    # Returns None when the statement's target table cannot be determined, or when it
+    # writes through a join (UPDATE a JOIN b ..., UPDATE a, b ..., DELETE ... USING)
+    match = re.match(
+        r"\s*(?:(update)(?:\s+ignore)?|(?:insert|replace)(?:\s+ignore)?\s+into|(delete)\s+from)\s+([`\w.]+)(.*)",
+        sql,
+        re.IGNORECASE | re.DOTALL,
+    )
+    if not match:
+        return None
+    update, delete, identifier, rest = match.groups()
+    if update:
+        targets = re.split(r"\bset\b", rest, maxsplit=1, flags=re.IGNORECASE)[0]
+        if "," in targets or re.search(r"\bjoin\b", targets, re.IGNORECASE):
+            return None
+    if delete and re.match(r"\s*,|.*\busing\b", rest, re.IGNORECASE | re.DOTALL):
+        return None
+    return _table_name(identifier)
+
+
+def _result_cache_key(db_config, sql, payload, params=None):
+    # One entry per bound parameter set of the same statement
+    options = {
+        name: payload.get(name)
+        for name in ("pageSize", "page", "offset", "cursor", "keyColumn", "withTotal", "sort", "filters", "format")
+    }
+    options["params"] = params or {}
+    return (_engine_key(db_config), _strip_statement(sql), json.dumps(options, sort_keys=True, default=str))
+
+
+def _result_cache_get(key):
+    now = time.monotonic()
+    with RESULT_CACHE_LOCK:
+        entry = RESULT_CACHE.get(key)
+        if entry and entry["expiresAt"] <= now:
+            RESULT_CACHE.pop(key)
+            RESULT_CACHE_STATS["bytes"] -= entry["size"]
+            entry = None
+        if entry is None:
+            RESULT_CACHE_STATS["misses"] += 1
+            return None, 0
+        RESULT_CACHE.move_to_end(key)
+        RESULT_CACHE_STATS["hits"] += 1
+        return entry["body"], now - entry["storedAt"]
+
+
+def _result_cache_put(key, body, ttl, db_config, sql):
+    size = len(_dump_json(body))
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    now = time.monotonic()
+    entry = {
+        "body": body,
+        "size": size,
+        "storedAt": now,
+        "expiresAt": now + ttl,
+        "database": _database_identity(db_config),
+        "tables": _sql_tables(sql, _cached_schema(db_config)),
+    }
+    with RESULT_CACHE_LOCK:
+        previous = RESULT_CACHE.pop(key, None)
+        if previous:
+            RESULT_CACHE_STATS["bytes"] -= previous["size"]
+        RESULT_CACHE[key] = entry
+        RESULT_CACHE_STATS["bytes"] += size
+        # Evict least recently used entries until the memory budget fits
+        while RESULT_CACHE_STATS["bytes"] > RESULT_CACHE_MAX_BYTES:
+            _, evicted = RESULT_CACHE.popitem(last=False)
+            RESULT_CACHE_STATS["bytes"] -= evicted["size"]
+            RESULT_CACHE_STATS["evictions"] += 1
+
+
+def _invalidate_result_cache(db_config, table=None):
+    # table None drops every entry for the database, and so does a write through a view or
+    # to a table the cached schema does not know. Entries whose tables are None go with any
+    # write. Only this process's cache is touched; other workers keep their entries until
+    # the TTL expires.
+    database = _database_identity(db_config)
+    if table is not None:
+        table = _base_table(_cached_schema(db_config), table)
+    with RESULT_CACHE_LOCK:
+        for key, entry in list(RESULT_CACHE.items()):
+            if entry["database"] != database:
+                continue
+            if table is not None and entry["tables"] is not None and table not in entry["tables"]:
+                continue
+            RESULT_CACHE.pop(key)
+            RESULT_CACHE_STATS["bytes"] -= entry["size"]
+            RESULT_CACHE_STATS["invalidations"] += 1
+
+
+def _result_response(body, extra=None, cache=None):
+    # cache is (hit, age_seconds) for cacheable SELECTs
+    data = {**(extra or {}), **body}
+    if cache is None:
+        with _timed("serialize"):
+            response = _json_response(data)
+        # GET runs are revalidated with If-None-Match even when the result was not cacheable
+        if request.method == "GET":
+            return _etag_response(response)
+        return response
+    hit, age_seconds = cache
+    # The ETag covers the result only, not the cache metadata that changes with every hit
+    with _timed("serialize"):
+        content = _dump_json(data)
+        cache_info = _dump_json({"hit": hit, "ageSeconds": round(age_seconds, 3)})
+        separator = "," if data else ""
+        response = Response(content[:-1] + f'{separator}"cache":{cache_info}}}', mimetype="application/json")
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    response.headers["Age"] = str(int(age_seconds))
+    return _etag_response(response, content.encode("utf-8"))
+
+
+def _load_schema(connection):
+    # Three bulk INFORMATION_SCHEMA reads cover every table of the connection's database
+    tables = OrderedDict()
+    for name, table_type, engine, row_estimate, comment in connection.execute(text(SCHEMA_QUERIES["tables"])):
+        tables[name] = {
+            "name": name,
+            "type": "view" if table_type == "VIEW" else "table",
+            "engine": engine,
+            "rowEstimate": row_estimate,
+            "comment": comment or "",
+            "columns": [],
+            "primaryKey": [],
+            "indexes": [],
+        }
+    for row in connection.execute(text(SCHEMA_QUERIES["columns"])):
+        table_name, name, data_type, column_type, nullable, default, extra, comment = row
+        table = tables.get(table_name)
+        if table is None:
+            continue
+        extra = (extra or "").lower()
+        table["columns"].append({
+            "name": name,
+            "dataType": data_type,
+            "columnType": column_type,
+            "nullable": nullable == "YES",
+            "default": default,
+            "extra": extra,
+            "comment": comment or "",
+            # Generated, auto-increment and server-maintained timestamp columns are not edited by hand
+            "editable": not any(
+                marker in extra
+                for marker in ("generated", "auto_increment", "on update")
+            ),
+        })
+    for table_name, index_name, non_unique, column in connection.execute(text(SCHEMA_QUERIES["indexes"])):
+        table = tables.get(table_name)
+        if table is None:
+            continue
+        indexes = table["indexes"]
+        if not indexes or indexes[-1]["name"] != index_name:
+            indexes.append({"name": index_name, "unique": not int(non_unique), "columns": []})
+        indexes[-1]["columns"].append(column)
+    for table in tables.values():
+        for index in table["indexes"]:
+            if index["name"] == "PRIMARY":
+                table["primaryKey"] = index["columns"]
+    return tables
+
+
+def _schema_load_lock(key):
+    with SCHEMA_CACHE_LOCK:
+        for stale in [stale for stale in SCHEMA_LOAD_LOCKS if stale not in SCHEMA_CACHE and stale != key]:
+            if not SCHEMA_LOAD_LOCKS[stale].locked():
+                SCHEMA_LOAD_LOCKS.pop(stale)
+        return SCHEMA_LOAD_LOCKS.setdefault(key, threading.Lock())
+
+
+def _get_schema(db_config, connection=None, refresh=False):
+    # Cached per connection identity and reloaded lazily after SCHEMA_CACHE_TTL_SECONDS.
+    # Concurrent misses for the same database wait for one load instead of each querying.
+    key = _engine_key(db_config)
+    if not refresh:
+        found, schema = _ttl_cache_get(SCHEMA_CACHE, SCHEMA_CACHE_LOCK, key, SCHEMA_CACHE_TTL_SECONDS)
+        if found:
+            return schema
+    with _schema_load_lock(key):
+        found, schema = _ttl_cache_get(SCHEMA_CACHE, SCHEMA_CACHE_LOCK, key, SCHEMA_CACHE_TTL_SECONDS)
+        # A refresh that waited for another request's load reuses that result
+        if found and (not refresh or time.monotonic() - schema["loadedMonotonic"] < 1):
+            return schema
+        started = time.perf_counter()
+        with _timed("schema"):
+            if connection is None:
+                with _get_engine(db_config).connect() as own_connection:
+                    tables = _load_schema(own_connection)
+            else:
+                tables = _load_schema(connection)
+        schema = {
+            "database": db_config.get("database"),
+            "loadedAt": _now().isoformat(),
+            "loadedMonotonic": time.monotonic(),
+            "loadMs": round((time.perf_counter() - started) * 1000, 1),
+            "tables": tables,
+            "tableNames": {name.lower(): name for name in tables},
+        }
+        _ttl_cache_put(SCHEMA_CACHE, SCHEMA_CACHE_LOCK, key, schema, SCHEMA_CACHE_MAX_ENTRIES)
+    return schema
+
+
+def _invalidate_schema(db_config):
+    with SCHEMA_CACHE_LOCK:
+        SCHEMA_CACHE.pop(_engine_key(db_config), None)
+
+
+def _schema_table(schema, name):
+    # Exact name first, MySQL table names are case-sensitive on some platforms
+    name = str(name or "").replace("`", "").split(".")[-1]
+    tables = schema["tables"]
+    return tables.get(name) or tables.get(schema["tableNames"].get(name.lower()))
+
+
+def _schema_view(schema, tables=None):
+    return {
+        "database": schema["database"],
+        "loadedAt": schema["loadedAt"],
+        "loadMs": schema["loadMs"],
+        "tables": list(schema["tables"].values()) if tables is None else tables,
+    }
+
+
+def _query_tables(schema, sql):
+    # Tables after FROM/JOIN that the schema knows, in query order; aliases, derived
+    # tables and CTE names drop out because they are not in the schema
+    found = []
+    for identifier in re.findall(r"\b(?:from|join)\s+([`\w.]+)", sql, re.IGNORECASE):
+        table = _schema_table(schema, identifier)
+        if table is not None and table not in found:
+            found.append(table)
+    return found
+
+
+def _primary_table(schema, sql):
+    tables = _query_tables(schema, sql)
+    return tables[0]["name"] if tables else None
+
+
+def _table_metadata(connection, db_config, table):
+    schema = _get_schema(db_config, connection)
+    found = _schema_table(schema, table)
+    if found is None and time.monotonic() - schema["loadedMonotonic"] > SCHEMA_MISS_REFRESH_SECONDS:
+        # The table may have been created after the schema was loaded
+        found = _schema_table(_get_schema(db_config, connection, refresh=True), table)
+    if found is None:
+        raise ValueError(f"unknown table: {table}")
+    return {
+        "name": found["name"],
+        "columns": [column["name"] for column in found["columns"]],
+        "primaryKey": found["primaryKey"],
+    }
+
+
+def _build_row_update(table, meta, row, changes, key_columns=None):
+    # Returns (sql, params, key mode). The row is matched by its primary key when the
+    # row carries every key column, otherwise by its other non-null columns.
+    if not changes:
+        raise ValueError("No valid columns to update")
+    unknown = [column for column in changes if column not in meta["columns"]]
+    if unknown:
+        raise ValueError(f"unknown column: {', '.join(unknown)}")
+
+    primary_key = meta["primaryKey"]
+    if primary_key and all(row.get(column) is not None for column in primary_key):
+        where_columns = primary_key
+        key_mode = "primaryKey"
+    else:
+        where_columns = [
+            column for column in (key_columns or list(row.keys()))
+            if column in meta["columns"] and row.get(column) is not None and column not in changes
+        ]
+        key_mode = "columns"
+    if not where_columns:
+        raise ValueError("No valid columns for WHERE clause")
+
+    params = {}
+    set_parts = []
+    for index, column in enumerate(changes):
+        set_parts.append(f"{_quote_identifier(column)} = :s{index}")
+        params[f"s{index}"] = changes[column]
+    where_parts = []
+    for index, column in enumerate(where_columns):
+        where_parts.append(f"{_quote_identifier(column)} = :k{index}")
+        params[f"k{index}"] = row[column]
+    sql = (
+        f"UPDATE {_quote_identifier(meta['name'])} SET {', '.join(set_parts)} "
+        f"WHERE {' AND '.join(where_parts)}"
+    )
+    return sql, params, key_mode
+
+
+def _guarded_update(connection, statement, params=None):
+    # Runs the UPDATE in the connection's transaction and keeps it only if exactly one row matched.
+    # SQLAlchemy's PyMySQL dialect connects with CLIENT.FOUND_ROWS, so rowcount counts matched
+    # rows even when the new values equal the old ones.
+    result = connection.execute(statement, params or {})
+    if result.rowcount != 1:
+        connection.rollback()
+        return result.rowcount
+    connection.commit()
+    return 1
+
+
+def _guarded_update_error(rowcount):
+    # 409: the statement is valid, but the rows it matches do not allow a single-row update
+    if rowcount == 0:
+        return jsonify({"error": "没有找到匹配 WHERE 条件的行，无法更新。"}), 409
+    return jsonify({"error": f"找到 {rowcount} 行匹配 WHERE 条件，无法更新。"}), 409
+
+
+def _check_row_edit(edit):
+    # Returns why an edit payload is malformed, or None
+    if not isinstance(edit, dict):
+        return "each edit must be an object"
+    for field in ("row", "changes"):
+        if edit.get(field) is not None and not isinstance(edit[field], dict):
+            return f"{field} must be an object"
+    key_columns = edit.get("keyColumns")
+    if key_columns is not None and (
+        not isinstance(key_columns, list) or not all(isinstance(column, str) for column in key_columns)
+    ):
+        return "keyColumns must be a list of column names"
+    if edit.get("table") is not None and not isinstance(edit["table"], str):
+        return "table must be a string"
+    return None
+
+
+def _edit_outcome(index, key_mode=None, error=None):
+    if error is not None:
+        return {"index": index, "ok": False, "status": "error", "error": error}
+    return {"index": index, "ok": True, "status": "ok", "keyMode": key_mode}
+
+
+def _apply_row_edits(connection, db_config, default_table, edits):
+    # Runs all edits in the connection's transaction and returns (outcomes, touched tables).
+    # Edits with the same table, SET columns and key columns share one statement. Groups
+    # keyed by primary key run as one executemany, because each row can match at most one
+    # row and a total rowcount equal to the group size proves every row matched. Other
+    # groups, and primary-key groups whose total is off or that hit a database error, run
+    # row by row in savepoints, so a failing row only rolls back its own savepoint.
+    outcomes = [None] * len(edits)
+    groups = OrderedDict()
+    for index, edit in enumerate(edits):
+        table = edit.get("table") or default_table
+        try:
+            if not table:
+                raise ValueError("Could not determine table name from SQL query")
+            meta = _table_metadata(connection, db_config, table)
+            sql, params, key_mode = _build_row_update(
+                table, meta, edit.get("row") or {}, edit.get("changes") or {}, edit.get("keyColumns")
+            )
+        except ValueError as e:
+            outcomes[index] = _edit_outcome(index, error=str(e))
+            continue
+        groups.setdefault((sql, key_mode, meta["name"]), []).append((index, params))
+
+    tables = set()
+    for (sql, key_mode, table), items in groups.items():
+        statement = text(sql)
+        tables.add(table.lower())
+        if key_mode == "primaryKey" and len(items) > 1:
+            savepoint = connection.begin_nested()
+            try:
+                matched = connection.execute(statement, [params for _, params in items]).rowcount == len(items)
+            except SQLAlchemyError:
+                # The row-by-row pass below finds the failing rows
+                matched = False
+            if matched:
+                savepoint.commit()
+                for index, _ in items:
+                    outcomes[index] = _edit_outcome(index, key_mode)
+                continue
+            savepoint.rollback()
+
+        for index, params in items:
+            savepoint = connection.begin_nested()
+            try:
+                rowcount = connection.execute(statement, params).rowcount
+            except SQLAlchemyError as e:
+                savepoint.rollback()
+                outcomes[index] = _edit_outcome(index, error=str(getattr(e, "orig", None) or e))
+                continue
+            if rowcount == 1:
+                savepoint.commit()
+                outcomes[index] = _edit_outcome(index, key_mode)
+                continue
+            savepoint.rollback()
+            if rowcount == 0:
+                error = "没有找到匹配 WHERE 条件的行，无法更新。"
+            else:
+                error = f"找到 {rowcount} 行匹配 WHERE 条件，无法更新。"
+            outcomes[index] = _edit_outcome(index, error=error)
+    return outcomes, tables
+
+
+def _resolve_db_config(username, database):
+    # Keyed on the store's version of the user's db configs, so an edit made through any
+    # worker is seen by every worker on its next lookup; the TTL only bounds memory
+    key = (username, database, CONFIG_STORE_BACKEND.version(username, "db"))
+    found, config = _ttl_cache_get(
+        DB_CREDENTIALS_CACHE, DB_CREDENTIALS_CACHE_LOCK, key, DB_CREDENTIALS_TTL_SECONDS
+    )
+    if found:
+        return config
+    config = _find_db_config(username, database)
+    if config:
+        _ttl_cache_put(DB_CREDENTIALS_CACHE, DB_CREDENTIALS_CACHE_LOCK, key, config, COUNT_CACHE_MAX_ENTRIES)
+    return config
+
+
+def _saved_query_target(username, config_id):
+    # Returns (saved config, db config, error response); the stored connection is
+    # resolved on the server, so the client never sees the credentials
+    config = _get_sql_config_entry(username, config_id)
+    if not config:
+        return None, None, (jsonify({"error": "config not found"}), 404)
+    db_config = _resolve_db_config(username, config.get("dbname"))
+    if not db_config:
+        error = f"Database configuration not found for database: {config.get('dbname')}"
+        return config, None, (jsonify({"error": error}), 404)
+    return config, db_config, None
+
+
+def _parse_cache_ttl(payload):
+    # Returns None when the payload does not set a per-query cache TTL
+    cache_ttl = payload.get("cache_ttl")
+    if cache_ttl is None:
+        return None
+    cache_ttl = int(cache_ttl)
+    if cache_ttl < 0:
+        raise ValueError("cache_ttl must not be negative")
+    return cache_ttl
+
+
+def _parse_budget(payload):
+    # Returns the max_rows / max_bytes / max_fetch_ms values set in the payload; None clears one
+    budget = {}
+    for field in BUDGET_FIELDS:
+        if field not in payload:
+            continue
+        value = payload[field]
+        if value is not None:
+            value = int(value)
+            if value <= 0:
+                raise ValueError(f"{field} must be positive")
+        budget[field] = value
+    return budget
+
+
+def _coerce_query_param(spec, value):
+    kind = spec["type"]
+    if kind == "int":
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError("not an integer")
+        return int(value)
+    if kind == "float":
+        if isinstance(value, bool):
+            raise ValueError("not a number")
+        return float(value)
+    if kind == "bool":
+        if isinstance(value, bool):
+            return value
+        text_value = str(value).lower()
+        if text_value not in ("1", "0", "true", "false"):
+            raise ValueError("expected true or false")
+        return text_value in ("1", "true")
+    if kind == "date":
+        return date.fromisoformat(str(value))
+    if kind == "datetime":
+        return datetime.fromisoformat(str(value).rstrip("Z"))
+    return str(value)
+
+
+def _parse_query_params(payload, sql):
+    # Returns None when the payload does not declare parameters. Each parameter is
+    # {"name", "type", "multiple", "required", "default", "label"} and must appear in the
+    # SQL as :name; multiple parameters bind a list, written as "IN :name".
+    specs = payload.get("params")
+    if specs is None:
+        return None
+    if not isinstance(specs, list):
+        raise ValueError("params must be a list")
+    declared = []
+    for spec in specs:
+        if not isinstance(spec, dict) or not QUERY_PARAM_NAME.match(str(spec.get("name") or "")):
+            raise ValueError("parameter names must start with a letter and use letters, digits or _")
+        name = spec["name"]
+        if any(other["name"] == name for other in declared):
+            raise ValueError(f"duplicate parameter: {name}")
+        if not re.search(rf"(?<![:\w]):{name}\b", sql):
+            raise ValueError(f"parameter {name} is not used in the SQL")
+        kind = spec.get("type") or "string"
+        if kind not in QUERY_PARAM_TYPES:
+            raise ValueError(f"invalid parameter type: {kind}")
+        param = {
+            "name": name,
+            "type": kind,
+            "multiple": bool(spec.get("multiple")),
+            "required": bool(spec.get("required")),
+            "default": spec.get("default"),
+            "label": spec.get("label") or name,
+        }
+        if param["default"] is not None:
+            _bind_query_params({"params": [param]}, {})
+        declared.append(param)
+    return declared
+
+
+def _bind_query_params(config, values):
+    # Binds request values to a saved query's declared parameters; values that are
+    # missing take the declared default, or NULL (an empty list) when not required
+    if values is None:
+        values = {}
+    if not isinstance(values, dict):
+        raise ValueError("params must be an object")
+    bound = {}
+    for spec in (config or {}).get("params") or []:
+        name = spec["name"]
+        value = values.get(name)
+        if value is None or value == "" or value == []:
+            value = spec.get("default")
+        if value is None or value == "" or value == []:
+            if spec.get("required"):
+                raise ValueError(f"missing parameter: {name}")
+            bound[name] = [] if spec.get("multiple") else None
+            continue
+        try:
+            if spec.get("multiple"):
+                # Query strings carry lists as comma-separated values
+                items = value if isinstance(value, list) else str(value).split(",")
+                bound[name] = [_coerce_query_param(spec, item) for item in items]
+            else:
+                bound[name] = _coerce_query_param(spec, value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"invalid value for parameter {name}: {e}")
+    return bound
+
+
+def _request_query_params(saved, values):
+    # Saved queries bind their declared parameters; ad-hoc SQL binds the given object as is
+    if saved is not None:
+        return _bind_query_params(saved, values)
+    if values is not None and not isinstance(values, dict):
+        raise ValueError("params must be an object")
+    return values or None
+
+
+def _apply_budget_fields(target, budget):
+    for field, value in budget.items():
+        if value is None:
+            target.pop(field, None)
+        else:
+            target[field] = value
+
+
+def _result_budget(username, config=None):
+    # The lowest of the global, per-user and per-saved-query limits applies
+    budget = {"maxRows": RESULT_MAX_ROWS, "maxBytes": RESULT_MAX_BYTES, "maxFetchMs": RESULT_MAX_FETCH_MS}
+    user = _get_user(username) if username else None
+    for source in ((user or {}).get("limits") or {}, config or {}):
+        for field, key in BUDGET_FIELDS.items():
+            if source.get(field):
+                budget[key] = min(budget[key], int(source[field]))
+    return budget
+
+
+def _mysql_error_code(error):
+    # SQLAlchemy wraps the PyMySQL error; its first argument is the MySQL error code
+    orig = getattr(error, "orig", error)
+    args = getattr(orig, "args", ())
+    return args[0] if args and isinstance(args[0], int) else None
+
+
+def _mysql_connection_id(connection):
+    return connection.execute(text("SELECT CONNECTION_ID()")).scalar()
+
+
+def _set_max_execution_time(connection, timeout_ms):
+    # Applies to SELECT statements of this session; DEFAULT restores the server setting
+    value = str(int(timeout_ms)) if timeout_ms else "DEFAULT"
+    connection.execute(text(f"SET SESSION max_execution_time = {value}"))
+
+
+def _kill_query(db_config, connection_id):
+    engine = _get_engine(db_config)
+    with engine.connect() as connection:
+        connection.execute(text(f"KILL QUERY {int(connection_id)}"))
+
+
+def _query_body(connection, db_config, sql, paging, view, columnar, budget, params=None):
+    if paging or view:
+        columns, rows, page, truncated = _fetch_page(
+            connection, db_config, sql, paging, columnar, view, budget, params
+        )
+        body = _results_body(columns, rows, truncated)
+        if page is not None:
+            body["page"] = page
+        return body
+    columns, rows, truncated = _execute_within_budget(connection, sql, columnar, budget, params)
+    return _results_body(columns, rows, truncated)
+
+
+def _job_view(job):
+    finished_at = job["finishedAt"]
+    started_at = job["startedAt"]
+    elapsed_ms = None
+    if started_at is not None:
+        elapsed_ms = int(((finished_at or time.time()) - started_at) * 1000)
+    return {
+        "jobId": job["id"],
+        "status": job["status"],
+        "createdAt": datetime.utcfromtimestamp(job["createdAt"]).isoformat() + "Z",
+        "elapsedMs": elapsed_ms,
+        "timeoutMs": job["timeoutMs"],
+        "resultBytes": job["size"],
+        "error": job["error"],
+    }
+
+
+def _drop_job_locked(job_id):
+    # Caller must hold QUERY_JOBS_LOCK
+    job = QUERY_JOBS.pop(job_id, None)
+    if job:
+        QUERY_JOB_STATS["bytes"] -= job["size"]
+    return job
+
+
+def _expire_jobs_locked(now):
+    # Caller must hold QUERY_JOBS_LOCK. Finished jobs are kept until fetched or expired.
+    for job_id, job in list(QUERY_JOBS.items()):
+        if job["finishedAt"] is not None and now - job["finishedAt"] > QUERY_JOB_RESULT_TTL_SECONDS:
+            _drop_job_locked(job_id)
+
+
+def _store_job_result_locked(job, body):
+    # Caller must hold QUERY_JOBS_LOCK. Evicts the oldest unfetched results to fit the budget.
+    size = len(_dump_json(body))
+    if size > QUERY_JOB_RESULT_MAX_BYTES:
+        job["status"] = "failed"
+        job["error"] = f"result is {size} bytes, larger than QUERY_JOB_RESULT_MAX_BYTES"
+        return
+    for other in QUERY_JOBS.values():
+        if QUERY_JOB_STATS["bytes"] + size <= QUERY_JOB_RESULT_MAX_BYTES:
+            break
+        if other["body"] is not None:
+            QUERY_JOB_STATS["bytes"] -= other["size"]
+            other["body"] = None
+            other["size"] = 0
+            other["status"] = "expired"
+    job["body"] = body
+    job["size"] = size
+    job["status"] = "succeeded"
+    QUERY_JOB_STATS["bytes"] += size
+
+
+def _run_query_job(job_id):
+    with QUERY_JOBS_LOCK:
+        job = QUERY_JOBS.get(job_id)
+        if not job or job["status"] != "queued":
+            return
+        job["status"] = "running"
+        job["startedAt"] = time.time()
+        QUERY_JOBS_CHANGED.notify_all()
+
+    _metrics_begin("job")
+    _metrics_label(job["dbConfig"], job["extra"].get("config", {}).get("id"))
+    body = None
+    error = None
+    try:
+        with _timed("connect"):
+            engine = _get_engine(job["readConfig"])
+            connection = engine.connect()
+        with connection:
+            connection_id = _mysql_connection_id(connection)
+            with job["killLock"]:
+                job["connectionId"] = connection_id
+            try:
+                if job["cancelRequested"]:
+                    raise RuntimeError("job cancelled")
+                _set_max_execution_time(connection, job["timeoutMs"])
+                query_started = time.perf_counter()
+                try:
+                    body = _query_body(
+                        connection, job["dbConfig"], job["sql"], job["paging"], job["view"], job["columnar"],
+                        job["budget"], job["params"],
+                    )
+                finally:
+                    elapsed = time.perf_counter() - query_started
+                    _record_route(job["dbConfig"], job["readConfig"], elapsed * 1000, body is not None)
+                _record_slow_query(
+                    job["dbConfig"], job["sql"], elapsed, job["extra"].get("config"), job["username"], job["params"],
+                )
+            finally:
+                # A KILL QUERY in flight finishes before the connection goes back to the pool
+                with job["killLock"]:
+                    job["connectionId"] = None
+                try:
+                    _set_max_execution_time(connection, None)
+                except Exception:
+                    connection.invalidate()
+    except Exception as e:
+        error = e
+
+    with QUERY_JOBS_LOCK:
+        job["finishedAt"] = time.time()
+        if job["cancelRequested"]:
+            job["status"] = "cancelled"
+            job["error"] = "job cancelled"
+        elif error is None:
+            _store_job_result_locked(job, body)
+        elif _mysql_error_code(error) == ER_QUERY_TIMEOUT:
+            job["status"] = "timeout"
+            job["error"] = f"query exceeded max execution time of {job['timeoutMs']} ms"
+        else:
+            job["status"] = "failed"
+            job["error"] = str(error)
+        QUERY_JOBS_CHANGED.notify_all()
+
+
+def _submit_query_job(username, db_config, sql, payload, extra=None, params=None):
+    # Returns (job view, error response)
+    if not _is_select(sql):
+        return None, (jsonify({"error": "only SELECT statements can run as jobs"}), 400)
+    try:
+        paging = _parse_paging(payload)
+        view = _parse_view(payload)
+        timeout_ms = int(payload.get("timeoutMs") or QUERY_MAX_EXECUTION_TIME_MS)
+    except (TypeError, ValueError) as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    # Callers may shorten the limit but not raise it above the configured maximum
+    if QUERY_MAX_EXECUTION_TIME_MS > 0:
+        timeout_ms = min(timeout_ms, QUERY_MAX_EXECUTION_TIME_MS)
+
+    job = {
+        "id": uuid.uuid4().hex,
+        "username": username,
+        "dbConfig": db_config,
+        "sql": sql,
+        "params": params,
+        # Where the query runs, and where a cancel sends KILL QUERY
+        "readConfig": _route_read(db_config, username) if _is_read_only(sql) else db_config,
+        "paging": paging,
+        "view": view,
+        "columnar": payload.get("format") == "columnar",
+        "budget": _result_budget(username, (extra or {}).get("config")),
+        "extra": extra or {},
+        "timeoutMs": max(0, timeout_ms),
+        "status": "queued",
+        "createdAt": time.time(),
+        "startedAt": None,
+        "finishedAt": None,
+        "error": None,
+        "body": None,
+        "size": 0,
+        "cancelRequested": False,
+        "connectionId": None,
+        "killLock": threading.Lock(),
+        "future": None,
+    }
+    with QUERY_JOBS_LOCK:
+        _expire_jobs_locked(time.time())
+        active = sum(
+            1 for other in QUERY_JOBS.values()
+            if other["username"] == username and other["status"] in QUERY_JOB_ACTIVE
+        )
+        if active >= QUERY_JOB_MAX_PER_USER:
+            error = f"at most {QUERY_JOB_MAX_PER_USER} running jobs per user"
+            return None, (jsonify({"error": error}), 429)
+        QUERY_JOBS[job["id"]] = job
+        job["future"] = QUERY_JOB_EXECUTOR.submit(_run_query_job, job["id"])
+        return _job_view(job), None
+
+
+def _get_query_job(username, job_id):
+    with QUERY_JOBS_LOCK:
+        _expire_jobs_locked(time.time())
+        job = QUERY_JOBS.get(job_id)
+    if not job or job["username"] != username:
+        return None
+    return job
+
+
+def _cancel_query_job(job):
+    with QUERY_JOBS_LOCK:
+        if job["status"] not in QUERY_JOB_ACTIVE:
+            # Cancelling a finished job discards its result
+            _drop_job_locked(job["id"])
+            return
+        job["cancelRequested"] = True
+        if job["status"] == "queued" and job["future"].cancel():
+            job["status"] = "cancelled"
+            job["error"] = "job cancelled"
+            job["finishedAt"] = time.time()
+            QUERY_JOBS_CHANGED.notify_all()
+            return
+    # Held across the KILL so the worker can't hand the connection to another request meanwhile
+    with job["killLock"]:
+        if job["connectionId"] is not None:
+            _kill_query(job["readConfig"], job["connectionId"])
+
+
+def _run_dashboard_group(username, db_config, pending, options, deadline, outcomes):
+    # Runs saved queries of one database on a single connection, taking them from the
+    # pending deque that the other connections of the same database share. Each query
+    # gets the time left until the shared deadline as its max_execution_time, and a failing
+    # query only fails its own entry. A connection that only gets a worker after the
+    # deadline returns without connecting; entries nobody ran are reported as timed out
+    # by the caller.
+    if time.monotonic() >= deadline or not pending:
+        return
+    cache_payload = {key: options[key] for key in ("pageSize", "format") if key in options}
+    paging = _parse_paging(options)
+    columnar = options.get("format") == "columnar"
+    _metrics_begin("dashboard")
+    _metrics_label(db_config)
+    read_config = _route_read(db_config, username)
+    with _timed("connect"):
+        engine = _get_engine(read_config)
+        connection = engine.connect()
+    with connection:
+        try:
+            while True:
+                try:
+                    index, config, cache_ttl = pending.popleft()
+                except IndexError:
+                    return
+                sql = config.get("sql") or ""
+                started = time.monotonic()
+                remaining_ms = int((deadline - started) * 1000)
+                if remaining_ms <= 0:
+                    return
+                try:
+                    params = _bind_query_params(config, options.get("params"))
+                except ValueError as e:
+                    outcomes[index] = {"status": "error", "error": str(e)}
+                    continue
+                cache_key = None
+                if cache_ttl > 0:
+                    cache_key = _result_cache_key(db_config, sql, cache_payload, params)
+                    body, _ = _result_cache_get(cache_key)
+                    if body is not None:
+                        outcomes[index] = {"status": "ok", "cached": True, **body}
+                        continue
+                try:
+                    _set_max_execution_time(connection, remaining_ms)
+                    # Stage timings and row counts are per query for the slow-query log
+                    METRICS_LOCAL.timings = OrderedDict()
+                    METRICS_LOCAL.rows = 0
+                    budget = _result_budget(username, config)
+                    body = _query_body(connection, db_config, sql, paging, None, columnar, budget, params)
+                    _record_route(db_config, read_config, (time.monotonic() - started) * 1000, True)
+                    _record_slow_query(db_config, sql, time.monotonic() - started, config, username, params)
+                except Exception as e:
+                    _record_route(db_config, read_config, (time.monotonic() - started) * 1000, False)
+                    connection.rollback()
+                    if _mysql_error_code(e) == ER_QUERY_TIMEOUT:
+                        outcomes[index] = {"status": "timeout", "error": "query exceeded the dashboard timeout"}
+                    else:
+                        outcomes[index] = {"status": "error", "error": str(e)}
+                    continue
+                if cache_key and not body.get("truncated"):
+                    _result_cache_put(cache_key, body, cache_ttl, db_config, sql)
+                outcomes[index] = {
+                    "status": "ok",
+                    "elapsedMs": int((time.monotonic() - started) * 1000),
+                    **body,
+                }
+        finally:
+            try:
+                _set_max_execution_time(connection, None)
+            except Exception:
+                connection.invalidate()
+
+
+def _slow_query_handler():
+    if not SLOW_QUERY_LOGGER.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            SLOW_QUERY_LOG_PATH,
+            maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=SLOW_QUERY_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        SLOW_QUERY_LOGGER.addHandler(handler)
+    return SLOW_QUERY_LOGGER
+
+
+def _explain_query(db_config, sql, params=None):
+    # Cached per connection and statement, so a slow menu opened repeatedly is explained once
+    cache_key = (_engine_key(db_config), _strip_statement(sql))
+    found, plan = _ttl_cache_get(
+        SLOW_QUERY_EXPLAIN_CACHE, SLOW_QUERY_EXPLAIN_CACHE_LOCK, cache_key, SLOW_QUERY_EXPLAIN_TTL_SECONDS
+    )
+    if found:
+        return plan
+    engine = _get_engine(db_config)
+    with engine.connect() as connection:
+        explain_sql = f"EXPLAIN FORMAT=JSON {_strip_statement(sql)}"
+        raw = connection.execute(_statement(explain_sql, params), params or {}).scalar()
+    plan = json.loads(raw) if isinstance(raw, str) else raw
+    _ttl_cache_put(SLOW_QUERY_EXPLAIN_CACHE, SLOW_QUERY_EXPLAIN_CACHE_LOCK, cache_key, plan, 1000)
+    return plan
+
+
+def _write_slow_query(record, db_config, sql, params=None):
+    try:
+        if SLOW_QUERY_EXPLAIN and _is_select(sql):
+            try:
+                record["explain"] = _explain_query(db_config, sql, params)
+            except Exception as e:
+                record["explainError"] = str(e)
+        _slow_query_handler().info(json.dumps(record, default=str, ensure_ascii=False))
+    except Exception as e:
+        app.logger.warning("Failed to write slow query log: %s", e)
+    finally:
+        SLOW_QUERY_PENDING.release()
+
+
+def _record_slow_query(db_config, sql, elapsed, config=None, username=None, params=None):
+    # Called after a statement finished; elapsed is in seconds
+    elapsed_ms = elapsed * 1000
+    if SLOW_QUERY_THRESHOLD_MS <= 0 or elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+    if not SLOW_QUERY_PENDING.acquire(blocking=False):
+        return
+    labels = getattr(METRICS_LOCAL, "labels", None) or {}
+    timings = getattr(METRICS_LOCAL, "timings", None) or {}
+    host, port, database = _database_identity(db_config)
+    record = {
+        "time": _now().isoformat() + "Z",
+        "elapsedMs": round(elapsed_ms, 1),
+        "endpoint": labels.get("endpoint"),
+        "username": username,
+        "sqlConfigId": (config or {}).get("id") or labels.get("config") or None,
+        "menuName": (config or {}).get("menu_name"),
+        "dbConfigId": db_config.get("id"),
+        "database": f"{host}:{port}/{database}",
+        "sql": sql,
+        "params": params,
+        "rowCount": getattr(METRICS_LOCAL, "rows", None),
+        "timingsMs": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+    }
+    SLOW_QUERY_EXECUTOR.submit(_write_slow_query, record, dict(db_config), sql, params)
+
+
+def _read_slow_queries():
+    # Oldest rotated file first, so later records of a query win
+    paths = [f"{SLOW_QUERY_LOG_PATH}.{index}" for index in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)]
+    paths.append(SLOW_QUERY_LOG_PATH)
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _slow_query_offenders(limit):
+    # Groups records per saved query (or per statement for ad-hoc SQL), worst first
+    groups = {}
+    for record in _read_slow_queries():
+        key = record.get("sqlConfigId") or _normalize_sql(record.get("sql") or "")
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "sqlConfigId": record.get("sqlConfigId"),
+                "menuName": record.get("menuName"),
+                "database": record.get("database"),
+                "count": 0,
+                "totalMs": 0.0,
+                "maxMs": 0.0,
+                "lastSeen": None,
+                "worst": None,
+            }
+        elapsed_ms = record.get("elapsedMs") or 0
+        group["count"] += 1
+        group["totalMs"] += elapsed_ms
+        group["lastSeen"] = record.get("time")
+        group["menuName"] = record.get("menuName") or group["menuName"]
+        if group["worst"] is None or elapsed_ms >= group["maxMs"]:
+            group["maxMs"] = elapsed_ms
+            group["worst"] = record
+    offenders = sorted(groups.values(), key=lambda group: group["maxMs"], reverse=True)[:limit]
+    for group in offenders:
+        group["avgMs"] = round(group.pop("totalMs") / group["count"], 1)
+    return offenders
+
+
+def _export_value(value):
+    # Plain text for CSV/XLSX cells; binary values as base64 like in JSON results
+    if value is None:
+        return ""
+    kind = type(value)
+    if kind is str:
+        return value
+    if kind is datetime:
+        return value.isoformat(sep=" ")
+    if kind is timedelta:
+        return _encode_timedelta(value)[1:-1]
+    if kind in (bytes, bytearray, memoryview):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return str(value)
+
+
+def _csv_chunks(names, batches):
+    # The BOM lets Excel detect UTF-8; the buffer is reused for every batch
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows([[_export_value(value) for value in row] for row in batch])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value):
+    kind = type(value)
+    if kind is int and -MAX_SAFE_INTEGER <= value <= MAX_SAFE_INTEGER:
+        return f"<c><v>{value}</v></c>"
+    if kind is float and math.isfinite(value):
+        return f"<c><v>{value!r}</v></c>"
+    if value is None:
+        return "<c/>"
+    # Everything else, including Decimal and big integers, is kept exact as inline text
+    cell_text = XML_INVALID_CHARS.sub("", _export_value(value))
+    cell_text = cell_text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{cell_text}</t></is></c>'
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _xlsx_chunks(names, batches):
+    # Streams a minimal workbook: the sheet uses inline strings, so no shared-string table
+    # has to be held in memory, and zipfile writes to the non-seekable sink with data descriptors
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(("<row>" + "".join(_xlsx_cell(name) for name in names) + "</row>").encode("utf-8"))
+            row_count = 1
+            for batch in batches:
+                batch = batch[:XLSX_MAX_ROWS - row_count]
+                row_count += len(batch)
+                sheet.write("".join(
+                    "<row>" + "".join([_xlsx_cell(value) for value in row]) + "</row>" for row in batch
+                ).encode("utf-8"))
+                data = sink.drain()
+                if data:
+                    yield data
+                if row_count >= XLSX_MAX_ROWS:
+                    break
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def _export_stream(db_config, sql, params, write_chunks):
+    # Rows come from an unbuffered cursor in EXPORT_BATCH_SIZE batches, so memory stays flat
+    try:
+        engine = _get_engine(db_config)
+        with engine.connect() as connection:
+            streaming = connection.execution_options(stream_results=True)
+            result = streaming.execute(_statement(sql, params), params)
+            fetched_all = False
+
+            def batches():
+                nonlocal fetched_all
+                while True:
+                    batch = result.fetchmany(EXPORT_BATCH_SIZE)
+                    if not batch:
+                        fetched_all = True
+                        return
+                    yield batch
+
+            try:
+                yield from write_chunks(list(result.keys()), batches())
+            finally:
+                if not fetched_all:
+                    # Stopped early (XLSX row limit, client gone, error): closing an unbuffered
+                    # cursor reads every remaining row; drop the connection instead
+                    connection.invalidate()
+    except Exception:
+        # Headers are already sent; re-raising makes the server abort the download instead of
+        # ending it like a complete file
+        app.logger.exception("Export failed")
+        raise
+
+
+def _content_disposition(name, extension):
+    # filename is the ASCII fallback for old clients; filename* carries the full UTF-8 name
+    ascii_name = re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_.") or "export"
+    filename = f"{name}.{extension}"
+    return (
+        f"attachment; filename=\"{ascii_name}.{extension}\"; "
+        f"filename*=UTF-8''{urllib.parse.quote(filename)}"
+    )
+
+
+def _get_username_from_request():
+    token = request.cookies.get("sessionId")
+
+    if not token:
+        return None
+    try:
+        data = _decode_session(token)
+        return data.get("username")
+    except jwt.PyJWTError:
+        return None
+    return None
+
+
+def _check_super_role():
+    username = _get_username_from_request()
+    if not username:
+        return False
+    user = _get_user(username)
     return user and user.get("role") == "SUPER"
 
 
@@ -180,8 +3464,7 @@ def login():
     if not username or not password:
         return jsonify({"error": "username and password required"}), 400
 
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
+    user = _get_user(username)
     if not user:
         return jsonify({"error": "invalid credentials"}), 401
     if user.get("status") == 1:
@@ -191,10 +3474,14 @@ def login():
         return jsonify({"error": "invalid credentials"}), 401
 
     session_id = _format_session_id()
-    SESSIONS[session_id] = {
-        "username": username,
-        "expiresAt": _expire_at().isoformat() + "Z",
-    }
+    SESSION_STORE_BACKEND.put(
+        session_id,
+        {
+            "username": username,
+            "expiresAt": _expire_at().isoformat() + "Z",
+        },
+        time.time() + SESSION_TTL_MINUTES * 60,
+    )
     role = user.get("role") if user else "USER"
     
     token = _encode_session(
@@ -223,7 +3510,7 @@ def logout():
     payload = request.get_json(silent=True) or {}
     session_id = payload.get("sessionId")
     if session_id:
-        SESSIONS.pop(session_id, None)
+        SESSION_STORE_BACKEND.delete(session_id)
     response = jsonify({"ok": True})
     response.delete_cookie("sessionId", path="/")
     return response
@@ -243,21 +3530,16 @@ def get_session():
         response = jsonify({"ok": False})
         response.delete_cookie("sessionId")
         return response
-    session = SESSIONS.get(session_id)
+    # Expired sessions are never returned by the store
+    session = SESSION_STORE_BACKEND.get(session_id)
     if not session:
         response = jsonify({"ok": False})
         response.delete_cookie("sessionId")
         return response
-    if _now().isoformat() + "Z" > session["expiresAt"]:
-        SESSIONS.pop(session_id, None)
-        response = jsonify({"ok": False})
-        response.delete_cookie("sessionId")
-        return response
     
     # Get user role
     username = session["username"]
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
+    user = _get_user(username)
     role = user.get("role") if user else "USER"
     
     return jsonify({"ok": True, "sessionId": session_id, "username": username, "role": role})
@@ -285,14 +3567,13 @@ def update_user_password(username):
     if not new_password:
         return jsonify({"error": "password required"}), 400
 
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
-    if not user:
-        return jsonify({"error": "user not found"}), 404
+    def update(users):
+        user, error = _find_user_locked(users, username)
+        if error:
+            return error
+        user["md5"] = _md5(f"{new_password}{USER_SECRET}")
 
-    user["md5"] = _md5(f"{new_password}{USER_SECRET}")
-    _save_users(users)
-    return jsonify({"ok": True})
+    return _update_users(update) or jsonify({"ok": True})
 
 
 @app.post("/api/users")
@@ -305,10 +3586,6 @@ def create_user():
     if not username or not password:
         return jsonify({"error": "username and password required"}), 400
 
-    users = _load_users()
-    if any(item.get("username") == username for item in users):
-        return jsonify({"error": "user already exists"}), 409
-
     role = payload.get("role") or "USER"
     # Validate role
     if role not in ["USER", "SUPER"]:
@@ -320,8 +3597,15 @@ def create_user():
         "status": 0,
         "role": role,
     }
-    users.append(new_user)
-    _save_users(users)
+
+    def update(users):
+        if any(item.get("username") == username for item in users):
+            return jsonify({"error": "user already exists"}), 409
+        users.append(new_user)
+
+    error = _update_users(update)
+    if error:
+        return error
     os.makedirs(os.path.join(USERS_DIR, username), exist_ok=True)
     return jsonify({"ok": True})
 
@@ -335,14 +3619,13 @@ def update_user_status(username):
     if status not in (0, 1):
         return jsonify({"error": "status must be 0 or 1"}), 400
 
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
-    if not user:
-        return jsonify({"error": "user not found"}), 404
+    def update(users):
+        user, error = _find_user_locked(users, username)
+        if error:
+            return error
+        user["status"] = status
 
-    user["status"] = status
-    _save_users(users)
-    return jsonify({"ok": True})
+    return _update_users(update) or jsonify({"ok": True})
 
 
 @app.post("/api/users/<username>/role")
@@ -355,14 +3638,45 @@ def update_user_role(username):
     if role not in ["USER", "SUPER"]:
         role = "USER"
 
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
-    if not user:
-        return jsonify({"error": "user not found"}), 404
+    def update(users):
+        user, error = _find_user_locked(users, username)
+        if error:
+            return error
+        user["role"] = role
 
-    user["role"] = role
-    _save_users(users)
-    return jsonify({"ok": True})
+    return _update_users(update) or jsonify({"ok": True})
+
+
+@app.post("/api/users/<username>/limits")
+def update_user_limits(username):
+    if not _check_super_role():
+        return jsonify({"error": "unauthorized, only SUPER role can access"}), 403
+    payload = request.get_json(silent=True) or {}
+    try:
+        budget = _parse_budget(payload)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    limits = {}
+
+    def update(users):
+        user, error = _find_user_locked(users, username)
+        if error:
+            return error
+        limits.update(user.get("limits") or {})
+        _apply_budget_fields(limits, budget)
+        if limits:
+            user["limits"] = limits
+        else:
+            user.pop("limits", None)
+
+    return _update_users(update) or jsonify({"ok": True, "limits": limits})
+
+
+def _unavailable_response(error):
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(max(1, math.ceil(HEALTH_PROBE_INTERVAL_SECONDS)))
+    return response, 503
 
 
 @app.post("/api/db/health")
@@ -377,16 +3691,29 @@ def db_health():
     if missing:
         return jsonify({"ok": False, "error": f"missing fields: {', '.join(missing)}"}), 400
 
-    try:
-        encoded_password = urllib.parse.quote_plus(config["password"])
+    # Answer from the host tracker while it is recent, instead of connecting on every check
+    with HOST_HEALTH_LOCK:
+        entry = HOST_HEALTH.get(_host_key(config))
+        verified_at = entry["verified"].get(_engine_key(config)) if entry else None
+        state = dict(entry, verified=None) if entry else None
+    if state and state["state"] == "open":
+        return jsonify({"ok": False, "error": state["lastError"], "circuit": "open"}), 400
+    if verified_at is not None and time.monotonic() - verified_at < HEALTH_STATE_MAX_AGE_SECONDS:
+        return jsonify({
+            "ok": True,
+            "message": "connection ok",
+            "cached": True,
+            "latencyMs": state["latencyMs"],
+        })
 
-        engine = create_engine(
-            f"mysql+pymysql://{config['user']}:{encoded_password}"
-            f"@{config['host']}:{config['port']}/{config['database']}"
-        )
+    started = time.perf_counter()
+    try:
+        engine = _get_engine(config)
         with engine.connect() as connection:
             connection.execute(text("SELECT 1"))
-        return jsonify({"ok": True, "message": "connection ok"})
+        latency_ms = (time.perf_counter() - started) * 1000
+        _record_host_success(config, latency_ms)
+        return jsonify({"ok": True, "message": "connection ok", "latencyMs": round(latency_ms, 1)})
     except Exception as error:
         return jsonify({"ok": False, "error": str(error)}), 400
 
@@ -396,12 +3723,11 @@ def get_db_config():
     username = _get_username_from_request()
     if not username:
         return jsonify({"error": "unauthorized"}), 401
-    users = _load_users()
-    user = next((item for item in users if item.get("username") == username), None)
+    user = _get_user(username)
     if not user:
         return jsonify({"error": f"User '{username}' not found. Please login again."}), 404
     configs = _load_db_config(username)
-    return jsonify({"configs": configs, "missing": not bool(configs)})
+    return _etag_response(jsonify({"configs": configs, "missing": not bool(configs)}))
 
 
 @app.post("/api/db/config")
@@ -421,49 +3747,30 @@ def update_db_config():
         "password": payload.get("password") or "",
     }
     
-    existing_configs = _load_db_config(username)
-    
     # Check if a config with the same id already exists
-    config_index = next(
-        (i for i, config in enumerate(existing_configs) 
-         if config.get("id") == config_id),
-        None
-    )
-    
-    if config_index is not None:
-        # Update existing config
-        original_config = existing_configs[config_index]
-        original_db_name = original_config.get("database")
-        new_db_name = new_config.get("database")
-        
-        # Check if database name changed
-        if new_db_name != original_db_name:
-            # Check if a config with the new database name already exists
-            if new_db_name:
-                existing_db_config = next(
-                    (config for config in existing_configs 
-                     if config.get("database") == new_db_name and config.get("id") != config_id),
-                    None
-                )
-                if existing_db_config:
-                    return jsonify({"error": "数据库名已存在，请使用不同的数据库名"}), 409
-        
-        existing_configs[config_index] = new_config
-    else:
-        # Check if a config with the same database name already exists
-        db_name = new_config.get("database")
-        if db_name:
-            existing_db_config = next(
-                (config for config in existing_configs 
-                 if config.get("database") == db_name),
-                None
-            )
-            if existing_db_config:
-                return jsonify({"error": "数据库名已存在，请使用不同的数据库名"}), 409
-        # Add new config
-        existing_configs.append(new_config)
-    
-    _save_db_config(username, existing_configs)
+    original_config = _get_db_config_entry(username, config_id)
+
+    # Replicas left out of the payload are kept from the stored config
+    try:
+        replicas, max_lag = _parse_replicas(payload if "replicas" in payload else (original_config or {}))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if replicas:
+        new_config["replicas"] = replicas
+        if max_lag is not None:
+            new_config["max_replica_lag_seconds"] = max_lag
+
+    # A database name may only be used by one config
+    new_db_name = new_config.get("database")
+    if new_db_name and (not original_config or new_db_name != original_config.get("database")):
+        existing_db_config = _find_db_config(username, new_db_name)
+        if existing_db_config and existing_db_config.get("id") != config_id:
+            return jsonify({"error": "数据库名已存在，请使用不同的数据库名"}), 409
+
+    _put_db_config(username, new_config)
+    if original_config:
+        # Drop the pooled engines and cached schema of the replaced connection
+        _dispose_db_config_engines(original_config)
     return jsonify({"ok": True, "id": config_id})
 
 
@@ -478,96 +3785,454 @@ def delete_db_config():
     if not config_id:
         return jsonify({"error": "config id required"}), 400
     
-    existing_configs = _load_db_config(username)
-    filtered_configs = [
-        config for config in existing_configs 
-        if config.get("id") != config_id
-    ]
-    
-    _save_db_config(username, filtered_configs)
+    existing_config = _get_db_config_entry(username, config_id)
+    _delete_db_config_entry(username, config_id)
+    if existing_config:
+        _dispose_db_config_engines(existing_config)
     return jsonify({"ok": True})
 
 
-@app.post("/api/execute-sql")
-def execute_sql():
+@app.get("/api/db/config/<config_id>/schema")
+def get_db_schema(config_id):
     username = _get_username_from_request()
     if not username:
         return jsonify({"error": "unauthorized"}), 401
-    
+    db_config = _get_db_config_entry(username, config_id)
+    if not db_config:
+        return jsonify({"error": "config not found"}), 404
+    _metrics_label(db_config)
     try:
-        payload = request.get_json(silent=True) or {}
-        db_config = payload.get("dbConfig")
-        
-        sql = payload.get("sql")
-        # params = payload.get("params")
+        schema = _get_schema(db_config, refresh=request.args.get("refresh") in ("1", "true"))
+    except DatabaseUnavailable as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if not db_config or not sql:
-            return jsonify({"error": "Missing dbConfig or sql"}), 400
-        
-        encoded_password = urllib.parse.quote_plus(db_config["password"])
+    # ?table=name returns one table instead of the whole database
+    table_name = request.args.get("table")
+    if table_name:
+        table = _schema_table(schema, table_name)
+        if table is None:
+            return jsonify({"error": f"unknown table: {table_name}"}), 404
+        return _etag_response(jsonify(_schema_view(schema, [table])))
+    return _etag_response(jsonify(_schema_view(schema)))
 
-        # Connect to database using SQLAlchemy
-        engine = create_engine(
-            f"mysql+pymysql://{db_config['user']}:{encoded_password}"
-            f"@{db_config['host']}:{db_config['port']}/{db_config['database']}"
-        )
 
-        with engine.connect() as connection:
+@app.get("/api/db/pool")
+def get_db_pool_stats():
+    if not _check_super_role():
+        return jsonify({"error": "unauthorized, only SUPER role can access"}), 403
+    return jsonify({
+        "settings": {
+            "poolSize": DB_POOL_SIZE,
+            "maxOverflow": DB_MAX_OVERFLOW,
+            "poolTimeoutSeconds": DB_POOL_TIMEOUT_SECONDS,
+            "prePing": DB_POOL_PRE_PING,
+            "recycleSeconds": DB_POOL_RECYCLE_SECONDS,
+            "idleSeconds": DB_ENGINE_IDLE_SECONDS,
+            "connectTimeoutSeconds": DB_CONNECT_TIMEOUT_SECONDS,
+            "readTimeoutSeconds": DB_READ_TIMEOUT_SECONDS,
+            "circuitFailureThreshold": CIRCUIT_FAILURE_THRESHOLD,
+            "probeIntervalSeconds": HEALTH_PROBE_INTERVAL_SECONDS,
+        },
+        "engines": _engine_stats(),
+        "hosts": _host_health_stats(),
+        "routing": _route_stats(),
+    })
+
+
+@app.get("/api/cache/stats")
+def get_result_cache_stats():
+    if not _check_super_role():
+        return jsonify({"error": "unauthorized, only SUPER role can access"}), 403
+    with RESULT_CACHE_LOCK:
+        stats = dict(RESULT_CACHE_STATS)
+        stats["entries"] = len(RESULT_CACHE)
+    stats["maxBytes"] = RESULT_CACHE_MAX_BYTES
+    stats["defaultTtlSeconds"] = RESULT_CACHE_TTL_SECONDS
+    return jsonify(stats)
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    # Scrapers authenticate with METRICS_TOKEN as a bearer token; SUPER users may also read it
+    authorized = bool(METRICS_TOKEN) and request.headers.get("Authorization") == f"Bearer {METRICS_TOKEN}"
+    if not authorized and not _check_super_role():
+        return jsonify({"error": "unauthorized, only SUPER role can access"}), 403
+    return Response(_render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/slow-queries")
+def get_slow_queries():
+    if not _check_super_role():
+        return jsonify({"error": "unauthorized, only SUPER role can access"}), 403
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 20), 200))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({"thresholdMs": SLOW_QUERY_THRESHOLD_MS, "offenders": _slow_query_offenders(limit)})
+
+
+def _run_sql(db_config, sql, payload, cache_ttl, budget, extra=None, params=None):
+    # Shared by /api/execute-sql and saved-query runs; extra is merged into JSON responses
+    # and params are the statement's bound values
+    _metrics_label(db_config)
+    username = _get_username_from_request()
+    # Read-only statements may run on a replica; anything else pins the user to the primary
+    read_config = None
+    if _is_read_only(sql):
+        read_config = _route_read(db_config, username)
+    else:
+        _note_write(username, db_config)
+    config = (extra or {}).get("config")
+    started = time.perf_counter()
+
+    def finish(ok):
+        elapsed = time.perf_counter() - started
+        if read_config is not None:
+            _record_route(db_config, read_config, elapsed * 1000, ok)
+        _record_slow_query(db_config, sql, elapsed, config, username, params)
+
+    response = _run_sql_statement(db_config, sql, payload, cache_ttl, budget, extra, params, read_config, finish)
+    if isinstance(response, Response) and response.is_streamed:
+        # A streamed body runs after this returns and calls finish itself
+        return response
+    status = response[1] if isinstance(response, tuple) else response.status_code
+    finish(status < 500)
+    return response
+
+
+def _run_sql_statement(db_config, sql, payload, cache_ttl, budget, extra=None, params=None, read_config=None,
+                       on_finish=None):
+    # Caches and metadata are keyed on db_config; read_config is where a read-only statement runs.
+    # on_finish is handed to a streamed response, see _stream_rows.
+    try:
+        try:
+            paging = _parse_paging(payload)
+            view = _parse_view(payload)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        # "columnar" returns column metadata once plus positional row arrays
+        columnar = payload.get("format") == "columnar"
+
+        # Stream SELECT results as NDJSON batches instead of one JSON document
+        if payload.get("stream") and _is_select(sql):
+            batch_size = max(1, min(int(payload.get("batchSize") or STREAM_BATCH_SIZE), PAGE_SIZE_MAX))
+            return Response(
+                stream_with_context(
+                    _stream_rows(read_config or db_config, sql, batch_size, columnar, params, on_finish)
+                ),
+                mimetype="application/x-ndjson",
+                headers={"X-Accel-Buffering": "no"},
+            )
+
+        cache_key = None
+        if cache_ttl > 0 and _is_select(sql):
+            cache_key = _result_cache_key(db_config, sql, payload, params)
+            cached_body, age_seconds = _result_cache_get(cache_key)
+            if cached_body is not None:
+                return _result_response(cached_body, extra, (True, age_seconds))
+        
+        # Reuse a pooled engine for this connection identity
+        with _timed("connect"):
+            engine = _get_engine(read_config or db_config)
+            connection = engine.connect()
+
+        with connection:
             # Log the received SQL for debugging
             # print('Received SQL:', sql)
             
-            # For UPDATE statements, first verify that WHERE condition matches exactly one row
-            sql_upper = sql.strip()
-            if sql_upper.startswith('UPDATE') or sql_upper.startswith('update') :
-                # Extract table name and WHERE clause using regex
-                # Use more flexible regex pattern to handle various whitespace
-                match = re.match(r'UPDATE\s+(\w+)\s+SET\s+.*?\s+WHERE\s+(.+)', sql_upper, re.IGNORECASE)
-                if not match:
-                    print('Failed to parse UPDATE statement:', sql_upper)
+            # UPDATE statements must match exactly one row. The statement runs in a transaction
+            # that is rolled back when it matched none or several, instead of counting first.
+            if _statement_keyword(sql) == "update":
+                if not re.search(r"\bwhere\b", sql, re.IGNORECASE):
+                    app.logger.info("Rejected UPDATE statement without WHERE: %s", sql)
                     return jsonify({"error": "Invalid UPDATE statement format"}), 400
-                
-                table_name = match.group(1)
-                where_clause = match.group(2)
-                # Create a SELECT COUNT query to verify row count
-                select_sql = f"SELECT COUNT(*) as count FROM {table_name} WHERE {where_clause}"
-                # print('Verification SQL:', select_sql)
-                
-                try:
-                    # Execute SELECT query to verify row count
-                    verify_result = connection.execute(text(select_sql))
-                    verify_row = verify_result.fetchone()
-                    row_count = verify_row[0] if verify_row else 0
-                    print('Row count:', row_count)
-                    
-                    if row_count == 0:
-                        return jsonify({"error": "没有找到匹配 WHERE 条件的行，无法更新。"}), 400
-                    elif row_count > 1:
-                        return jsonify({"error": f"找到 {row_count} 行匹配 WHERE 条件，无法更新。"}), 400
-                except Exception as e:
-                    print(f'Verification query failed: {str(e)}')
-                    return jsonify({"error": f"验证查询失败: {str(e)}"}), 400
+                with _timed("update_verify"):
+                    rowcount = _guarded_update(connection, _statement(sql, params), params)
+                if rowcount != 1:
+                    return _guarded_update_error(rowcount)
+                _invalidate_result_cache(db_config, _write_target_table(sql))
+                return _result_response(_results_body([] if columnar else None, []), extra)
             
+            if (paging or view) and _is_select(sql):
+                try:
+                    columns, rows, page, truncated = _fetch_page(
+                        connection, db_config, sql, paging, columnar, view, budget, params
+                    )
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                body = _results_body(columns, rows, truncated)
+                if page is not None:
+                    body["page"] = page
+                if cache_key and not truncated:
+                    _result_cache_put(cache_key, body, cache_ttl, db_config, sql)
+                    return _result_response(body, extra, (False, 0))
+                return _result_response(body, extra)
+
+            # SELECTs stop fetching at the result budget and flag the response as truncated
+            if _is_select(sql):
+                columns, rows, truncated = _execute_within_budget(connection, sql, columnar, budget, params)
+                body = _results_body(columns, rows, truncated)
+                if cache_key and not truncated:
+                    _result_cache_put(cache_key, body, cache_ttl, db_config, sql)
+                    return _result_response(body, extra, (False, 0))
+                return _result_response(body, extra)
+
             # Execute SQL query
-            result = connection.execute(text(sql))
-            # Commit the transaction for UPDATE/INSERT/DELETE statements
-            connection.commit()
+            with _timed("execute"):
+                result = connection.execute(_statement(sql, params), params or {})
+                # Commit the transaction for UPDATE/INSERT/DELETE statements
+                connection.commit()
             
             # Log the number of rows affected
             
+            # Writes drop cached results of the affected table on the same database
+            if not _is_select(sql):
+                _invalidate_result_cache(db_config, _write_target_table(sql))
+                # DDL changes what the schema API and the row editor read
+                if re.match(r"\s*(?:create|alter|drop|rename)\b", sql, re.IGNORECASE):
+                    _invalidate_schema(db_config)
+
             # Convert result to list of dictionaries only if it returns rows
-            results = []
             if result.returns_rows:
-                for row in result.mappings():
-                    row_dict = dict(row)
-                    # Convert large integers to strings to avoid JavaScript precision loss
-                    for key, value in row_dict.items():
-                        if isinstance(value, int) and abs(value) > 9007199254740991:
-                            row_dict[key] = str(value)
-                    results.append(row_dict)
-            return jsonify({"results": results})
+                columns, rows, _ = _collect_rows(result, columnar)
+                return _result_response(_results_body(columns, rows), extra)
+            return _result_response(_results_body([] if columnar else None, []), extra)
+
+    except DatabaseUnavailable as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/api/execute-sql")
+def execute_sql():
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    
+    try:
+        payload = request.get_json(silent=True) or {}
+        db_config = payload.get("dbConfig")
+        
+        sql = payload.get("sql")
+
+        # Run a saved query by its sqlconfig.json id
+        sql_config_id = payload.get("sqlConfigId")
+        cache_ttl = RESULT_CACHE_TTL_SECONDS
+        saved = None
+        if not sql and sql_config_id:
+            _metrics_label(config_id=sql_config_id)
+            saved = _get_sql_config_entry(username, sql_config_id)
+            if not saved:
+                return jsonify({"error": "config not found"}), 404
+            sql = saved.get("sql")
+            if saved.get("cache_ttl") is not None:
+                cache_ttl = int(saved["cache_ttl"])
+
+        if not db_config or not sql:
+            return jsonify({"error": "Missing dbConfig or sql"}), 400
+        try:
+            params = _request_query_params(saved, payload.get("params"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return _run_sql(db_config, sql, payload, cache_ttl, _result_budget(username, saved), params=params)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/api/jobs")
+def submit_query_job():
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(silent=True) or {}
+
+    # Either a saved query, resolved on the server, or dbConfig + sql like /api/execute-sql
+    extra = None
+    config = None
+    sql_config_id = payload.get("sqlConfigId")
+    if sql_config_id:
+        config, db_config, error = _saved_query_target(username, sql_config_id)
+        if error:
+            return error
+        sql = config.get("sql")
+        extra = {"config": config}
+    else:
+        db_config = payload.get("dbConfig")
+        sql = payload.get("sql")
+    if not db_config or not sql:
+        return jsonify({"error": "Missing dbConfig or sql"}), 400
+    try:
+        params = _request_query_params(config, payload.get("params"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job, error = _submit_query_job(username, db_config, sql, payload, extra, params)
+    if error:
+        return error
+    return jsonify(job), 202
+
+
+@app.get("/api/jobs")
+def list_query_jobs():
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    with QUERY_JOBS_LOCK:
+        _expire_jobs_locked(time.time())
+        jobs = [_job_view(job) for job in QUERY_JOBS.values() if job["username"] == username]
+    return jsonify({"jobs": jobs})
+
+
+@app.get("/api/jobs/<job_id>")
+def get_query_job(job_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    job = _get_query_job(username, job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    # ?wait=N long-polls until the job leaves queued/running or N seconds pass
+    try:
+        wait = max(0.0, min(float(request.args.get("wait") or 0), QUERY_JOB_WAIT_MAX_SECONDS))
+    except ValueError:
+        return jsonify({"error": "wait must be a number"}), 400
+    with QUERY_JOBS_CHANGED:
+        if wait:
+            QUERY_JOBS_CHANGED.wait_for(lambda: job["status"] not in QUERY_JOB_ACTIVE, timeout=wait)
+        return jsonify(_job_view(job))
+
+
+@app.get("/api/jobs/<job_id>/result")
+def get_query_job_result(job_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    job = _get_query_job(username, job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    with QUERY_JOBS_LOCK:
+        status = job["status"]
+        if status in QUERY_JOB_ACTIVE:
+            return jsonify(_job_view(job)), 202
+        if status != "succeeded":
+            codes = {"timeout": 504, "cancelled": 409, "expired": 410}
+            return jsonify({"error": job["error"] or f"job {status}", "job": _job_view(job)}), codes.get(status, 500)
+        # Results are held until fetched once
+        view = _job_view(job)
+        _drop_job_locked(job_id)
+    return _json_response({**job["extra"], **job["body"], "job": view})
+
 
+@app.post("/api/jobs/<job_id>/cancel")
+def cancel_query_job(job_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    job = _get_query_job(username, job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    try:
+        _cancel_query_job(job)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    return jsonify({"ok": True})
+
+
+@app.post("/api/dashboard")
+def run_dashboard():
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "ids required"}), 400
+    if len(ids) > DASHBOARD_MAX_QUERIES:
+        return jsonify({"error": f"at most {DASHBOARD_MAX_QUERIES} queries per dashboard"}), 400
+    # pageSize and format apply to every query; pageSize defaults to PAGE_SIZE_MAX
+    options = {"pageSize": payload.get("pageSize") or PAGE_SIZE_MAX}
+    if payload.get("format"):
+        options["format"] = payload["format"]
+    # Shared parameter values; each query binds the names it declares
+    if payload.get("params") is not None:
+        if not isinstance(payload["params"], dict):
+            return jsonify({"error": "params must be an object"}), 400
+        options["params"] = payload["params"]
+    try:
+        _parse_paging(options)
+        timeout_ms = int(payload.get("timeoutMs") or DASHBOARD_TIMEOUT_MS)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    timeout_ms = max(1, min(timeout_ms, DASHBOARD_TIMEOUT_MS))
+
+    started = time.monotonic()
+    deadline = started + timeout_ms / 1000
+    outcomes = [None] * len(ids)
+    configs = [None] * len(ids)
+    groups = OrderedDict()
+    for index, config_id in enumerate(ids):
+        config, db_config, error = _saved_query_target(username, config_id)
+        configs[index] = config
+        if error:
+            response, _ = error
+            outcomes[index] = {"status": "error", "error": response.get_json()["error"]}
+            continue
+        sql = config.get("sql") or ""
+        if not _is_select(sql):
+            outcomes[index] = {"status": "error", "error": "only SELECT statements can run on a dashboard"}
+            continue
+        cache_ttl = RESULT_CACHE_TTL_SECONDS
+        if config.get("cache_ttl") is not None:
+            cache_ttl = int(config["cache_ttl"])
+        key = _engine_key(db_config)
+        if key not in groups:
+            groups[key] = (db_config, [])
+        groups[key][1].append((index, config, cache_ttl))
+
+    # Each database gets up to DASHBOARD_CONNECTIONS_PER_DATABASE connections that take its
+    # queries in request order, so a slow query does not hold up the rest of its database
+    futures = {}
+    for db_config, items in groups.values():
+        pending = deque(items)
+        for _ in range(min(len(items), DASHBOARD_CONNECTIONS_PER_DATABASE)):
+            future = DASHBOARD_EXECUTOR.submit(
+                _run_dashboard_group, username, db_config, pending, options, deadline, outcomes
+            )
+            futures[future] = items
+    # Wait a little past the deadline for max_execution_time to stop the slowest query
+    errors = []
+    for future, items in futures.items():
+        try:
+            future.result(timeout=max(0, deadline - time.monotonic()) + 1)
+        except Exception as e:
+            # A connection still queued behind other dashboards is dropped; a running one
+            # stops at its next deadline check or when max_execution_time ends its query.
+            # Entries nobody ran are reported as timed out below.
+            if not future.done():
+                future.cancel()
+            else:
+                errors.append((items, e))
+    # A failed connection (e.g. the database is down) fails the entries that no other
+    # connection of its database got to; this waits until all of them have finished
+    for items, e in errors:
+        for index, _, _ in items:
+            if outcomes[index] is None:
+                outcomes[index] = {"status": "error", "error": str(e)}
+
+    results = []
+    for index, config_id in enumerate(ids):
+        config = configs[index] or {}
+        outcome = outcomes[index] or {"status": "timeout", "error": "dashboard deadline exceeded"}
+        results.append({"id": config_id, "menu_name": config.get("menu_name"), **outcome})
+    return _json_response({"results": results, "elapsedMs": int((time.monotonic() - started) * 1000)})
 
 
 @app.post("/api/sql/config")
@@ -581,10 +4246,14 @@ def save_sql_config():
     dbname = payload.get("dbname") or ""
     if not menu_name or not sql:
         return jsonify({"error": "menu_name and sql are required"}), 400
+    try:
+        cache_ttl = _parse_cache_ttl(payload)
+        budget = _parse_budget(payload)
+        query_params = _parse_query_params(payload, sql)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     
-    existing_configs = _load_sql_config(username)
-    
-    if any(config.get("menu_name") == menu_name for config in existing_configs):
+    if _find_sql_config(username, menu_name):
         return jsonify({"error": "目录名已存在"}), 409
     
     # if any(config.get("dbname") == dbname for config in existing_configs):
@@ -597,8 +4266,12 @@ def save_sql_config():
         "dbname": dbname,
         "created_at": _now().isoformat() + "Z"
     }
-    existing_configs.append(new_config)
-    _save_sql_config(username, existing_configs)
+    if cache_ttl is not None:
+        new_config["cache_ttl"] = cache_ttl
+    if query_params:
+        new_config["params"] = query_params
+    _apply_budget_fields(new_config, budget)
+    _put_sql_config(username, new_config)
     return jsonify({"ok": True})
 
 
@@ -608,7 +4281,7 @@ def get_sql_config():
     if not username:
         return jsonify({"error": "unauthorized"}), 401
     configs = _load_sql_config(username)
-    return jsonify({"configs": configs})
+    return _etag_response(jsonify({"configs": configs}))
 
 
 @app.get("/api/sql/config/<config_id>")
@@ -617,11 +4290,248 @@ def get_sql_config_by_id(config_id):
    
     if not username:
         return jsonify({"error": "unauthorized"}), 401
-    configs = _load_sql_config(username)
-    config = next((c for c in configs if c.get("id") == config_id), None)
+    config = _get_sql_config_entry(username, config_id)
     if not config:
         return jsonify({"error": "config not found"}), 404
-    return jsonify({"config": config})
+    return _etag_response(jsonify({"config": config}))
+
+
+def _run_query_args(args):
+    # The /run options of a GET request. Numbers are plain query values; sort, filters and
+    # params are JSON-encoded like the export's. Raises ValueError for a malformed value.
+    payload = {}
+    for name in ("pageSize", "page", "offset"):
+        if args.get(name):
+            payload[name] = int(args[name])
+    for name in ("cursor", "keyColumn", "format"):
+        if args.get(name):
+            payload[name] = args[name]
+    if args.get("withTotal"):
+        payload["withTotal"] = args["withTotal"] in ("1", "true")
+    for name in ("sort", "filters", "params"):
+        if args.get(name):
+            payload[name] = json.loads(args[name])
+    return payload
+
+
+@app.post("/api/sql/config/<config_id>/run")
+def run_sql_config(config_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    return _run_saved_query(username, config_id, request.get_json(silent=True) or {})
+
+
+@app.get("/api/sql/config/<config_id>/run")
+def get_sql_config_results(config_id):
+    # The cacheable form of /run: the same options as query arguments, answered with an ETag
+    # that If-None-Match revalidates. Only read-only saved queries run through GET.
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        payload = _run_query_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _run_saved_query(username, config_id, payload, read_only=True)
+
+
+def _run_saved_query(username, config_id, payload, read_only=False):
+    _metrics_label(config_id=config_id)
+    config, db_config, error = _saved_query_target(username, config_id)
+    if error:
+        return error
+    if read_only and not _is_read_only(config.get("sql") or ""):
+        return jsonify({"error": "only read-only queries can run with GET, use POST"}), 400
+
+    cache_ttl = RESULT_CACHE_TTL_SECONDS
+    if config.get("cache_ttl") is not None:
+        cache_ttl = int(config["cache_ttl"])
+    budget = _result_budget(username, config)
+    try:
+        params = _bind_query_params(config, payload.get("params"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _run_sql(db_config, config.get("sql"), payload, cache_ttl, budget, {"config": config}, params)
+
+
+@app.get("/api/sql/config/<config_id>/schema")
+def get_sql_config_schema(config_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    config, db_config, error = _saved_query_target(username, config_id)
+    if error:
+        return error
+    _metrics_label(db_config, config_id)
+    try:
+        schema = _get_schema(db_config, refresh=request.args.get("refresh") in ("1", "true"))
+    except DatabaseUnavailable as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    # The tables the saved query reads; the first one is where row edits go
+    tables = _query_tables(schema, config.get("sql") or "")
+    body = _schema_view(schema, tables)
+    body["editTable"] = tables[0]["name"] if tables else None
+    return _etag_response(jsonify(body))
+
+
+@app.get("/api/sql/config/<config_id>/export")
+def export_sql_config(config_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    config, db_config, error = _saved_query_target(username, config_id)
+    if error:
+        return error
+    sql = config.get("sql") or ""
+    if not _is_select(sql):
+        return jsonify({"error": "only SELECT queries can be exported"}), 400
+
+    export_format = request.args.get("format", "csv")
+    if export_format not in ("csv", "xlsx"):
+        return jsonify({"error": "format must be csv or xlsx"}), 400
+    # sort, filters and params are JSON-encoded like the /api/execute-sql payload
+    try:
+        view = _parse_view({
+            "sort": json.loads(request.args.get("sort") or "[]"),
+            "filters": json.loads(request.args.get("filters") or "[]"),
+        })
+        params = _bind_query_params(config, json.loads(request.args.get("params") or "{}"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    base_sql = _strip_statement(sql)
+    export_sql = base_sql
+    if view:
+        try:
+            engine = _get_engine(db_config)
+            with engine.connect() as connection:
+                result_columns = _result_columns(connection, db_config, base_sql, params)
+            where, order_by = _build_view_clauses(view, result_columns, params)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        export_sql = _view_sql(base_sql, where, order_by)
+
+    name = config.get("menu_name") or "export"
+    extension = export_format
+    if export_format == "xlsx":
+        chunks = _export_stream(_route_read(db_config, username), export_sql, params, _xlsx_chunks)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        chunks = _export_stream(_route_read(db_config, username), export_sql, params, _csv_chunks)
+        mimetype = "text/csv"
+        # gzip=1 downloads a .csv.gz file instead of relying on transfer compression
+        if request.args.get("gzip") in ("1", "true"):
+            chunks = _compress_stream(chunks, "gzip")
+            extension += ".gz"
+            mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": _content_disposition(name, extension),
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.post("/api/sql/config/<config_id>/row")
+def update_sql_config_row(config_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(silent=True) or {}
+    config, db_config, error = _saved_query_target(username, config_id)
+    if error:
+        return error
+
+    invalid = _check_row_edit(payload)
+    if invalid:
+        return jsonify({"error": invalid}), 400
+    row = payload.get("row") or {}
+    changes = payload.get("changes") or {}
+    _note_write(username, db_config)
+
+    try:
+        engine = _get_engine(db_config)
+        with engine.connect() as connection:
+            table = payload.get("table") or _primary_table(_get_schema(db_config, connection), config.get("sql") or "")
+            if not table:
+                return jsonify({"error": "Could not determine table name from SQL query"}), 400
+            try:
+                meta = _table_metadata(connection, db_config, table)
+                sql, params, key_mode = _build_row_update(
+                    table, meta, row, changes, payload.get("keyColumns")
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            rowcount = _guarded_update(connection, text(sql), params)
+            if rowcount != 1:
+                return _guarded_update_error(rowcount)
+        _invalidate_result_cache(db_config, meta["name"].lower())
+        return jsonify({"ok": True, "keyMode": key_mode})
+    except DatabaseUnavailable as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/api/sql/config/<config_id>/rows")
+def update_sql_config_rows(config_id):
+    username = _get_username_from_request()
+    if not username:
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(silent=True) or {}
+    config, db_config, error = _saved_query_target(username, config_id)
+    if error:
+        return error
+
+    edits = payload.get("edits")
+    if not isinstance(edits, list) or not edits:
+        return jsonify({"error": "edits required"}), 400
+    if len(edits) > BATCH_EDIT_MAX_ROWS:
+        return jsonify({"error": f"at most {BATCH_EDIT_MAX_ROWS} edits per request"}), 400
+    for index, edit in enumerate(edits):
+        invalid = _check_row_edit(edit)
+        if invalid:
+            return jsonify({"error": f"edit {index}: {invalid}"}), 400
+    # "atomic" (default) keeps nothing if any edit fails, "partial" keeps the edits that matched
+    mode = payload.get("mode") or "atomic"
+    if mode not in ("atomic", "partial"):
+        return jsonify({"error": "mode must be atomic or partial"}), 400
+    _note_write(username, db_config)
+
+    try:
+        engine = _get_engine(db_config)
+        with engine.connect() as connection:
+            default_table = _primary_table(_get_schema(db_config, connection), config.get("sql") or "")
+            outcomes, tables = _apply_row_edits(connection, db_config, default_table, edits)
+            failed = sum(1 for outcome in outcomes if not outcome["ok"])
+            if failed and mode == "atomic":
+                connection.rollback()
+                return jsonify({
+                    "error": f"{failed} 行更新失败，所有修改已回滚。",
+                    "committed": 0,
+                    "failed": failed,
+                    "outcomes": outcomes,
+                }), 400
+            connection.commit()
+        for table in tables:
+            _invalidate_result_cache(db_config, table)
+        return jsonify({
+            "ok": True,
+            "committed": len(outcomes) - failed,
+            "failed": failed,
+            "outcomes": outcomes,
+        })
+    except DatabaseUnavailable as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
 @app.delete("/api/sql/config/<config_id>")
@@ -629,11 +4539,8 @@ def delete_sql_config(config_id):
     username = _get_username_from_request()
     if not username:
         return jsonify({"error": "unauthorized"}), 401
-    configs = _load_sql_config(username)
-    filtered_configs = [c for c in configs if c.get("id") != config_id]
-    if len(filtered_configs) == len(configs):
+    if not _delete_sql_config_entry(username, config_id):
         return jsonify({"error": "config not found"}), 404
-    _save_sql_config(username, filtered_configs)
     return jsonify({"ok": True})
 
 
@@ -649,16 +4556,30 @@ def update_sql_config(config_id):
     dbname = payload.get("dbname") or ""
     if not menu_name or not sql:
         return jsonify({"error": "menu_name and sql are required"}), 400
-    
-    configs = _load_sql_config(username)
-    config_index = next((i for i, c in enumerate(configs) if c.get("id") == config_id), None)
-    if config_index is None:
+    config = _get_sql_config_entry(username, config_id)
+    if config is None:
         return jsonify({"error": "config not found"}), 404
+    try:
+        cache_ttl = _parse_cache_ttl(payload)
+        budget = _parse_budget(payload)
+        # Parameters left out of the payload are kept, but must still match the SQL
+        query_params = _parse_query_params(
+            payload if "params" in payload else {"params": config.get("params") or []}, sql
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     
-    configs[config_index]["menu_name"] = menu_name
-    configs[config_index]["sql"] = sql
-    configs[config_index]["dbname"] = dbname
-    _save_sql_config(username, configs)
+    config["menu_name"] = menu_name
+    config["sql"] = sql
+    config["dbname"] = dbname
+    if cache_ttl is not None:
+        config["cache_ttl"] = cache_ttl
+    if query_params:
+        config["params"] = query_params
+    else:
+        config.pop("params", None)
+    _apply_budget_fields(config, budget)
+    _put_sql_config(username, config)
     return jsonify({"ok": True})
 
 
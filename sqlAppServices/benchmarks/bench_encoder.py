@@ -0,0 +1,91 @@
+"""Microbenchmark: result row serialization, previous path vs. the type-aware row encoder.
+
+Run from sqlAppServices/:  python benchmarks/bench_encoder.py [rows]
+
+The previous path built a dict per row, checked every cell for integers beyond 2^53 and
+serialized with Flask's JSON provider. The new path encodes each row straight to JSON text
+with per-column encoders chosen from the cursor type codes.
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from pymysql.constants import FIELD_TYPE  # noqa: E402
+
+COLUMNS = [
+    {"name": "id", "typeCode": FIELD_TYPE.LONG},
+    {"name": "account_id", "typeCode": FIELD_TYPE.LONGLONG},
+    {"name": "name", "typeCode": FIELD_TYPE.VAR_STRING},
+    {"name": "status", "typeCode": FIELD_TYPE.TINY},
+    {"name": "amount", "typeCode": FIELD_TYPE.NEWDECIMAL},
+    {"name": "ratio", "typeCode": FIELD_TYPE.DOUBLE},
+    {"name": "created_at", "typeCode": FIELD_TYPE.DATETIME},
+    {"name": "note", "typeCode": FIELD_TYPE.VAR_STRING},
+]
+
+
+def make_rows(count):
+    base = datetime(2026, 1, 1)
+    return [
+        (
+            index,
+            2 ** 60 + index if index % 10 == 0 else 100000 + index,
+            f"user-{index}",
+            index % 3,
+            Decimal(index) / 100,
+            index / 7,
+            base + timedelta(seconds=index),
+            None if index % 5 else "备注",
+        )
+        for index in range(count)
+    ]
+
+
+def previous_path(rows):
+    names = [column["name"] for column in COLUMNS]
+    results = []
+    for row in rows:
+        row_dict = dict(zip(names, row))
+        for key, value in row_dict.items():
+            if isinstance(value, int) and abs(value) > app.MAX_SAFE_INTEGER:
+                row_dict[key] = str(value)
+        results.append(row_dict)
+    with app.app.app_context():
+        return app.app.json.dumps({"results": results})
+
+
+def encoder_path(rows, columnar=False):
+    encode = app._row_encoder(COLUMNS, columnar)
+    body = app._results_body(COLUMNS if columnar else None, [encode(row) for row in rows])
+    return app._dump_json(body)
+
+
+def measure(label, func, rows, repeat=3):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(func(rows))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<24} {best * 1000:9.1f} ms  {len(rows) / best:12,.0f} rows/s  {size / 1024 / 1024:7.1f} MiB")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+    print(f"{count} rows, best of 3")
+    baseline = measure("previous (dict+jsonify)", previous_path, rows)
+    objects = measure("encoder (objects)", encoder_path, rows)
+    arrays = measure("encoder (columnar)", lambda data: encoder_path(data, True), rows)
+    print(f"speedup: objects {baseline / objects:.2f}x, columnar {baseline / arrays:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Fixtures running the app against the SQLite stand-in database of benchmarks/bench_api.py.
+
+Every test gets a freshly seeded `orders` table, two users with their saved queries and
+empty in-process caches. The `client` fixture is logged in as the first user.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import app  # noqa: E402
+import bench_api  # noqa: E402
+
+ROWS = 200
+DB_CONFIG = {"host": "127.0.0.1", "port": 3306, "database": "bench", "user": "bench", "password": "bench"}
+
+CACHES = (
+    app.JWT_CACHE,
+    app.HOST_HEALTH,
+    app.ROUTE_STATS,
+    app.RECENT_WRITES,
+    app.COUNT_CACHE,
+    app.RESULT_COLUMNS_CACHE,
+    app.RESULT_CACHE,
+    app.DB_CREDENTIALS_CACHE,
+    app.SCHEMA_CACHE,
+    app.QUERY_JOBS,
+    app.SLOW_QUERY_EXPLAIN_CACHE,
+)
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    # The stand-in replaces module attributes of app; monkeypatch puts them back afterwards
+    for name in ("_get_engine", "_set_max_execution_time", "_mysql_connection_id", "SCHEMA_QUERIES",
+                 "SLOW_QUERY_EXPLAIN", "USERS_CONFIG_PATH", "USERS_LOCK_PATH", "CONFIG_STORE_BACKEND",
+                 "SESSION_STORE_BACKEND", "SLOW_QUERY_LOG_PATH"):
+        monkeypatch.setattr(app, name, getattr(app, name))
+    for cache in CACHES:
+        cache.clear()
+    app.USERS_CACHE["loaded"] = False
+    app.RESULT_CACHE_STATS.update(hits=0, misses=0, evictions=0, invalidations=0, bytes=0)
+
+    path = str(tmp_path / "db.sqlite3")
+    bench_api.seed_database(path, ROWS)
+    bench_api.use_standin_database(path)
+    users = bench_api.create_fixtures(
+        str(tmp_path), SimpleNamespace(users=2, large_rows=50, queries_per_user=3), DB_CONFIG
+    )
+    yield SimpleNamespace(path=path, users=users, user=users[0], db_config=dict(DB_CONFIG))
+    for cache in CACHES:
+        cache.clear()
+
+
+@pytest.fixture
+def client(standin):
+    client = app.app.test_client()
+    response = client.post("/api/login", json={"username": standin.user, "password": bench_api.PASSWORD})
+    assert response.status_code == 200, response.data
+    return client
@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+import app
+
+
+def notes(standin, *ids):
+    connection = sqlite3.connect(standin.path)
+    try:
+        marks = ",".join("?" * len(ids))
+        return dict(connection.execute(f"SELECT id, note FROM orders WHERE id IN ({marks})", ids).fetchall())
+    finally:
+        connection.close()
+
+
+def edit_rows(client, standin, edits, mode=None):
+    payload = {"edits": edits} if mode is None else {"edits": edits, "mode": mode}
+    response = client.post(f"/api/sql/config/{standin.user}-grid/rows", json=payload)
+    return response.status_code, response.get_json()
+
+
+def by_key(row_id, note):
+    return {"row": {"id": row_id}, "changes": {"note": note}}
+
+
+@pytest.fixture
+def statements(standin):
+    # (statement, executemany) of every statement the stand-in database runs
+    engine = app._get_engine(standin.db_config)
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            seen.append((statement, executemany))
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_primary_key_edits_run_as_one_executemany(client, standin, statements):
+    status, body = edit_rows(client, standin, [by_key(row_id, f"note {row_id}") for row_id in (1, 2, 3)])
+    assert status == 200, body
+    assert body["committed"] == 3 and body["failed"] == 0
+    assert [outcome["keyMode"] for outcome in body["outcomes"]] == ["primaryKey"] * 3
+    assert [executemany for _, executemany in statements] == [True]
+    assert notes(standin, 1, 2, 3) == {1: "note 1", 2: "note 2", 3: "note 3"}
+
+
+def test_unmatched_row_falls_back_to_savepoints_and_atomic_rolls_back(client, standin, statements):
+    status, body = edit_rows(client, standin, [by_key(1, "a"), by_key(9999, "b"), by_key(3, "c")])
+    assert status == 400
+    assert body["committed"] == 0 and body["failed"] == 1
+    assert [outcome["ok"] for outcome in body["outcomes"]] == [True, False, True]
+    assert "没有找到" in body["outcomes"][1]["error"]
+    # The executemany total was off, so each row ran again on its own
+    assert [executemany for _, executemany in statements] == [True, False, False, False]
+    assert notes(standin, 1, 3) == {1: None, 3: None}
+
+
+def test_partial_mode_keeps_the_rows_that_matched(client, standin):
+    status, body = edit_rows(client, standin, [by_key(1, "a"), by_key(9999, "b"), by_key(3, "c")], mode="partial")
+    assert status == 200, body
+    assert body["committed"] == 2 and body["failed"] == 1
+    assert notes(standin, 1, 3) == {1: "a", 3: "c"}
+
+
+def test_database_error_only_rolls_back_its_own_row(client, standin):
+    # name is NOT NULL: the executemany fails as a whole, the savepoint pass isolates the row
+    edits = [
+        {"row": {"id": 1}, "changes": {"name": "renamed"}},
+        {"row": {"id": 2}, "changes": {"name": None}},
+        {"row": {"id": 3}, "changes": {"name": "renamed"}},
+    ]
+    status, body = edit_rows(client, standin, edits, mode="partial")
+    assert status == 200, body
+    assert [outcome["ok"] for outcome in body["outcomes"]] == [True, False, True]
+    assert "NOT NULL" in body["outcomes"][1]["error"]
+    names = client.post("/api/execute-sql", json={
+        "dbConfig": standin.db_config, "sql": "SELECT name FROM orders WHERE id IN (1, 2, 3) ORDER BY id",
+    }).get_json()["results"]
+    assert names[0] == {"name": "renamed"} and names[2] == {"name": "renamed"}
+    assert names[1]["name"] != "renamed"
+
+
+def test_key_column_edits_must_match_one_row_each(client, standin):
+    edits = [
+        {"row": {"id": 5, "status": 1}, "changes": {"note": "x"}, "keyColumns": ["status"]},
+        by_key(6, "y"),
+    ]
+    # Without the primary key in row, id is not used; status matches a quarter of the table
+    edits[0]["row"].pop("id")
+    status, body = edit_rows(client, standin, edits, mode="partial")
+    assert status == 200, body
+    assert "找到 50 行" in body["outcomes"][0]["error"]
+    assert body["outcomes"][1]["ok"] is True
+    assert notes(standin, 6) == {6: "y"}
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"edits": []}, "edits required"),
+    ({"edits": [by_key(1, "a")], "mode": "some"}, "mode must be"),
+    ({"edits": [{"row": [], "changes": {}}]}, "row must be an object"),
+])
+def test_malformed_batches(client, standin, payload, message):
+    response = client.post(f"/api/sql/config/{standin.user}-grid/rows", json=payload)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
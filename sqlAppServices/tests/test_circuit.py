@@ -0,0 +1,102 @@
+import socket
+from types import SimpleNamespace
+
+import pymysql
+import pytest
+
+import app
+
+# The stand-in fixture replaces _get_engine; requests here go through the real one
+GET_ENGINE = app._get_engine
+
+
+@pytest.fixture
+def health(monkeypatch):
+    # Real engines against a local port nobody listens on; no background prober
+    monkeypatch.setattr(app, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(app, "_probe_hosts", lambda: None)
+    app.HOST_HEALTH.clear()
+    yield
+    for key in list(app.ENGINES):
+        app.ENGINES.pop(key)["engine"].dispose()
+    app.HOST_HEALTH.clear()
+    app.HEALTH_PROBER["thread"] = None
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def db_config(port):
+    return {"host": "127.0.0.1", "port": port, "database": "bench", "user": "bench", "password": "bench"}
+
+
+def state(config):
+    return app.HOST_HEALTH[app._host_key(config)]["state"]
+
+
+def connect(config):
+    with app._get_engine(config).connect():
+        pass
+
+
+def test_refused_connections_open_the_circuit(health, closed_port):
+    config = db_config(closed_port)
+    for _ in range(app.CIRCUIT_FAILURE_THRESHOLD):
+        with pytest.raises(Exception) as raised:
+            connect(config)
+        assert app._mysql_error_code(raised.value) == 2003
+    assert state(config) == "open"
+    with pytest.raises(app.DatabaseUnavailable):
+        app._get_engine(config)
+
+
+def test_a_new_connection_closes_the_circuit(health, closed_port):
+    config = db_config(closed_port)
+    for _ in range(app.CIRCUIT_FAILURE_THRESHOLD):
+        app._record_host_failure(config, "refused")
+    assert state(config) == "open"
+    # What the prober sees when the host is back: the connect event of a fresh connection
+    engine = app.create_engine("sqlite://")
+    app._track_engine_health(engine, config)
+    with engine.connect():
+        pass
+    assert state(config) == "closed"
+    assert app.HOST_HEALTH[app._host_key(config)]["failures"] == 0
+
+
+def test_open_circuit_fails_requests_at_once(health, closed_port, client, monkeypatch):
+    monkeypatch.setattr(app, "_get_engine", GET_ENGINE)
+    config = db_config(closed_port)
+    for _ in range(app.CIRCUIT_FAILURE_THRESHOLD):
+        app._record_host_failure(config, "refused")
+    response = client.post("/api/execute-sql", json={"dbConfig": config, "sql": "SELECT 1"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    assert "unavailable" in response.get_json()["error"]
+
+
+def failure(code, connection=None, is_pre_ping=False):
+    return SimpleNamespace(
+        original_exception=pymysql.err.OperationalError(code, "error"),
+        connection=connection,
+        is_pre_ping=is_pre_ping,
+    )
+
+
+@pytest.mark.parametrize("context, counted", [
+    (failure(2003), True),
+    (failure(2006), True),
+    # A long query hitting the read timeout
+    (failure(2013, connection=object()), False),
+    (failure(2006, connection=object()), False),
+    # A pooled connection the server closed; the pool opens a new one
+    (failure(2006, is_pre_ping=True), False),
+    (failure(2013), False),
+    (failure(1045), False),
+])
+def test_only_connect_failures_count(context, counted):
+    assert app._is_connect_failure(context) is counted
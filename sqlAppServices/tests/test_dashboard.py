@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def concurrency(monkeypatch):
+    # Holds every query for a moment and records how many ran at the same time
+    state = {"running": 0, "peak": 0}
+    lock = threading.Lock()
+    query_body = app._query_body
+
+    def slow_query_body(*args, **kwargs):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        try:
+            time.sleep(0.05)
+            return query_body(*args, **kwargs)
+        finally:
+            with lock:
+                state["running"] -= 1
+
+    monkeypatch.setattr(app, "_query_body", slow_query_body)
+    return state
+
+
+def dashboard(client, ids, **options):
+    response = client.post("/api/dashboard", json={"ids": ids, "pageSize": 5, **options})
+    assert response.status_code == 200, response.data
+    return response.get_json()["results"]
+
+
+def test_queries_of_one_database_share_bounded_connections(client, standin, monkeypatch, concurrency):
+    monkeypatch.setattr(app, "DASHBOARD_CONNECTIONS_PER_DATABASE", 2)
+    ids = [f"{standin.user}-grid", f"{standin.user}-large", f"{standin.user}-grid"]
+    results = dashboard(client, ids)
+    assert [result["id"] for result in results] == ids
+    assert [result["status"] for result in results] == ["ok", "ok", "ok"]
+    assert all(len(result["results"]) == 5 for result in results)
+    assert concurrency["peak"] == 2
+
+
+def test_one_connection_per_database_runs_serially(client, standin, monkeypatch, concurrency):
+    monkeypatch.setattr(app, "DASHBOARD_CONNECTIONS_PER_DATABASE", 1)
+    ids = [f"{standin.user}-grid", f"{standin.user}-large"]
+    assert [result["status"] for result in dashboard(client, ids)] == ["ok", "ok"]
+    assert concurrency["peak"] == 1
+
+
+def test_shared_deadline_times_out_the_rest(client, standin, monkeypatch, concurrency):
+    monkeypatch.setattr(app, "DASHBOARD_CONNECTIONS_PER_DATABASE", 1)
+    ids = [f"{standin.user}-grid"] * 4
+    statuses = [result["status"] for result in dashboard(client, ids, timeoutMs=80)]
+    assert statuses[0] == "ok"
+    assert statuses[-1] == "timeout"
+
+
+def test_unreachable_database_fails_every_entry(client, standin, monkeypatch):
+    def unavailable(db_config, check_circuit=True):
+        raise app.DatabaseUnavailable("connection refused")
+
+    monkeypatch.setattr(app, "_get_engine", unavailable)
+    ids = [f"{standin.user}-grid", f"{standin.user}-large", f"{standin.user}-grid"]
+    results = dashboard(client, ids)
+    assert [result["status"] for result in results] == ["error"] * 3
+    assert all("connection refused" in result["error"] for result in results)
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+import app
+
+# The stand-in fixture replaces _get_engine; these tests use the real one
+GET_ENGINE = app._get_engine
+
+
+def db_config(database):
+    return {"host": "127.0.0.1", "port": 3306, "database": database, "user": "bench", "password": "bench"}
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    monkeypatch.setitem(app.ENGINE_SWEEP, "at", 0.0)
+    yield
+    for key in list(app.ENGINES):
+        app.ENGINES.pop(key)["engine"].dispose()
+
+
+def age(config, seconds):
+    app.ENGINES[app._engine_key(config)]["lastUsed"] -= seconds
+
+
+def test_engines_are_reused(engines):
+    assert GET_ENGINE(db_config("first"), check_circuit=False) is GET_ENGINE(db_config("first"), check_circuit=False)
+    assert app.ENGINES[app._engine_key(db_config("first"))]["uses"] == 2
+
+
+def test_idle_sweep_runs_once_per_half_idle_period(engines):
+    idle, busy = db_config("idle"), db_config("busy")
+    GET_ENGINE(idle, check_circuit=False)
+    age(idle, app.DB_ENGINE_IDLE_SECONDS * 2)
+    # A sweep just ran: lookups inside the window leave the idle engine alone
+    app.ENGINE_SWEEP["at"] = time.monotonic()
+    GET_ENGINE(busy, check_circuit=False)
+    assert app._engine_key(idle) in app.ENGINES
+    app.ENGINE_SWEEP["at"] -= app.DB_ENGINE_IDLE_SECONDS / 2
+    GET_ENGINE(busy, check_circuit=False)
+    assert app._engine_key(idle) not in app.ENGINES
+    assert app._engine_key(busy) in app.ENGINES
+
+
+def test_sweep_keeps_engines_with_checked_out_connections(engines, monkeypatch):
+    idle = db_config("idle")
+    engine = GET_ENGINE(idle, check_circuit=False)
+    age(idle, app.DB_ENGINE_IDLE_SECONDS * 2)
+    monkeypatch.setattr(engine.pool, "checkedout", lambda: 1)
+    GET_ENGINE(db_config("busy"), check_circuit=False)
+    assert app._engine_key(idle) in app.ENGINES
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import app
+
+
+def grid(standin):
+    return f"/api/sql/config/{standin.user}-grid/run"
+
+
+def test_get_run_matches_post_run(client, standin):
+    sort = [{"column": "id", "direction": "desc"}]
+    posted = client.post(grid(standin), json={"pageSize": 5, "withTotal": True, "sort": sort}).get_json()
+    fetched = client.get(grid(standin), query_string={"pageSize": 5, "withTotal": 1, "sort": json.dumps(sort)})
+    assert fetched.status_code == 200
+    assert fetched.get_json() == posted
+
+
+def test_get_run_is_revalidated_with_if_none_match(client, standin):
+    first = client.get(grid(standin), query_string={"pageSize": 5})
+    assert first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    again = client.get(grid(standin), query_string={"pageSize": 5}, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    other_page = client.get(
+        grid(standin), query_string={"pageSize": 5, "page": 2}, headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert other_page.status_code == 200
+
+
+def test_cache_hit_keeps_the_etag(client, standin, monkeypatch):
+    # The ETag covers the result, not the cache block that changes between a miss and a hit
+    monkeypatch.setattr(app, "RESULT_CACHE_TTL_SECONDS", 60)
+    first = client.get(grid(standin), query_string={"pageSize": 5})
+    assert first.get_json()["cache"]["hit"] is False
+    again = client.get(grid(standin), query_string={"pageSize": 5}, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_post_ignores_if_none_match(client, standin, monkeypatch):
+    monkeypatch.setattr(app, "RESULT_CACHE_TTL_SECONDS", 60)
+    first = client.post(grid(standin), json={"pageSize": 5})
+    again = client.post(grid(standin), json={"pageSize": 5}, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 200
+    assert again.get_json()["cache"]["hit"] is True
+
+
+@pytest.mark.parametrize("args, message", [
+    ({"pageSize": "ten"}, "invalid literal"),
+    ({"pageSize": 5, "sort": "[{"}, "Expecting"),
+])
+def test_malformed_get_run_arguments(client, standin, args, message):
+    response = client.get(grid(standin), query_string=args)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_run_query_args():
+    assert app._run_query_args({
+        "pageSize": "20", "page": "3", "withTotal": "true", "format": "columnar", "cursor": "",
+        "filters": '[{"column": "status", "operator": "eq", "value": 1}]', "params": '{"account": 7}',
+    }) == {
+        "pageSize": 20, "page": 3, "withTotal": True, "format": "columnar",
+        "filters": [{"column": "status", "operator": "eq", "value": 1}], "params": {"account": 7},
+    }
+
+
+def test_get_run_refuses_a_write(client, standin):
+    dbname = client.get(f"/api/sql/config/{standin.user}-grid").get_json()["config"]["dbname"]
+    sql = "UPDATE orders SET note = 'by get' WHERE id = 1"
+    assert client.post("/api/sql/config", json={"menu_name": "write", "sql": sql, "dbname": dbname}).status_code == 200
+    configs = client.get("/api/sql/config").get_json()["configs"]
+    config_id = next(config["id"] for config in configs if config["menu_name"] == "write")
+    response = client.get(f"/api/sql/config/{config_id}/run")
+    assert response.status_code == 400
+    row = client.post("/api/execute-sql", json={
+        "dbConfig": standin.db_config, "sql": "SELECT note FROM orders WHERE id = 1",
+    }).get_json()["results"][0]
+    assert row["note"] != "by get"
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import app
+import bench_api
+from conftest import ROWS
+
+
+def submit(client, standin, sql, **payload):
+    response = client.post("/api/jobs", json={"dbConfig": standin.db_config, "sql": sql, **payload})
+    assert response.status_code == 202, response.data
+    return response.get_json()["jobId"]
+
+
+def wait(client, job_id, seconds=5):
+    response = client.get(f"/api/jobs/{job_id}?wait={seconds}")
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def test_job_result_is_fetched_once(client, standin):
+    job_id = submit(client, standin, "SELECT id FROM orders ORDER BY id", pageSize=10)
+    assert wait(client, job_id)["status"] == "succeeded"
+    response = client.get(f"/api/jobs/{job_id}/result")
+    assert response.status_code == 200, response.data
+    body = response.get_json()
+    assert [row["id"] for row in body["results"]] == list(range(1, 11))
+    assert body["job"]["status"] == "succeeded"
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 404
+
+
+def test_saved_query_job(client, standin):
+    response = client.post("/api/jobs", json={"sqlConfigId": f"{standin.user}-grid"})
+    assert response.status_code == 202, response.data
+    job_id = response.get_json()["jobId"]
+    assert wait(client, job_id)["status"] == "succeeded"
+    body = client.get(f"/api/jobs/{job_id}/result").get_json()
+    assert body["config"]["id"] == f"{standin.user}-grid"
+    assert len(body["results"]) == ROWS
+
+
+def test_failed_job_reports_the_error(client, standin):
+    job_id = submit(client, standin, "SELECT missing FROM orders")
+    job = wait(client, job_id)
+    assert job["status"] == "failed"
+    assert "missing" in job["error"]
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 500
+
+
+def test_writes_do_not_run_as_jobs(client, standin):
+    response = client.post("/api/jobs", json={"dbConfig": standin.db_config, "sql": "DELETE FROM orders"})
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def blocking(monkeypatch):
+    # A query that runs until KILL QUERY arrives, on a connection the stand-in gives an id
+    started = threading.Event()
+    killed = threading.Event()
+    kills = []
+    query_body = app._query_body
+
+    def slow_body(*args, **kwargs):
+        started.set()
+        if killed.wait(5):
+            raise RuntimeError("Query execution was interrupted")
+        return query_body(*args, **kwargs)
+
+    def kill_query(db_config, connection_id):
+        kills.append(connection_id)
+        killed.set()
+
+    monkeypatch.setattr(app, "_query_body", slow_body)
+    monkeypatch.setattr(app, "_mysql_connection_id", lambda connection: 42)
+    monkeypatch.setattr(app, "_kill_query", kill_query)
+    yield started, kills
+    killed.set()
+
+
+def test_cancel_kills_the_running_query(client, standin, blocking):
+    started, kills = blocking
+    job_id = submit(client, standin, "SELECT id FROM orders")
+    assert started.wait(5)
+    assert wait(client, job_id, 0)["status"] == "running"
+    response = client.post(f"/api/jobs/{job_id}/cancel")
+    assert response.status_code == 200, response.data
+    assert kills == [42]
+    job = wait(client, job_id)
+    assert job["status"] == "cancelled"
+    response = client.get(f"/api/jobs/{job_id}/result")
+    assert response.status_code == 409
+    assert response.get_json()["error"] == "job cancelled"
+
+
+def test_cancel_after_finish_discards_the_result(client, standin):
+    job_id = submit(client, standin, "SELECT id FROM orders")
+    assert wait(client, job_id)["status"] == "succeeded"
+    assert client.post(f"/api/jobs/{job_id}/cancel").status_code == 200
+    assert client.get(f"/api/jobs/{job_id}").status_code == 404
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 404
+
+
+def test_jobs_of_other_users_are_not_found(client, standin):
+    job_id = submit(client, standin, "SELECT id FROM orders")
+    other = app.app.test_client()
+    response = other.post("/api/login", json={"username": standin.users[1], "password": bench_api.PASSWORD})
+    assert response.status_code == 200, response.data
+    assert other.get(f"/api/jobs/{job_id}").status_code == 404
+    assert other.post(f"/api/jobs/{job_id}/cancel").status_code == 404
+    wait(client, job_id)
@@ -0,0 +1,166 @@
+import sqlite3
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import app
+from conftest import ROWS
+
+
+def run(client, standin, sql, **payload):
+    response = client.post("/api/execute-sql", json={"dbConfig": standin.db_config, "sql": sql, **payload})
+    return response.status_code, response.get_json()
+
+
+def ids(body):
+    return [row["id"] for row in body["results"]]
+
+
+def test_offset_pages_cover_the_result_once(client, standin):
+    seen = []
+    cursor = None
+    while True:
+        status, body = run(client, standin, "SELECT id FROM orders ORDER BY id", pageSize=70, cursor=cursor)
+        assert status == 200, body
+        seen += ids(body)
+        cursor = body["page"]["nextCursor"]
+        if not body["page"]["hasMore"]:
+            break
+    assert seen == list(range(1, ROWS + 1))
+    assert cursor is None
+
+
+def test_page_number_and_total(client, standin):
+    status, body = run(client, standin, "SELECT id FROM orders ORDER BY id", pageSize=10, page=3, withTotal=True)
+    assert status == 200, body
+    assert ids(body) == list(range(21, 31))
+    assert body["page"]["total"] == ROWS
+
+
+def test_keyset_pages_cover_the_result_once(client, standin):
+    seen = []
+    payload = {"pageSize": 64, "keyColumn": "id"}
+    while True:
+        status, body = run(client, standin, "SELECT id, name FROM orders", **payload)
+        assert status == 200, body
+        seen += ids(body)
+        if not body["page"]["hasMore"]:
+            break
+        payload = {"pageSize": 64, "cursor": body["page"]["nextCursor"]}
+    assert seen == list(range(1, ROWS + 1))
+
+
+def test_filters_and_sort_apply_before_paging(client, standin):
+    status, body = run(
+        client, standin, "SELECT id, status FROM orders",
+        pageSize=5, withTotal=True,
+        sort=[{"column": "id", "direction": "desc"}],
+        filters=[{"column": "status", "operator": "eq", "value": 2}],
+    )
+    assert status == 200, body
+    assert ids(body) == [198, 194, 190, 186, 182]
+    assert body["page"]["total"] == ROWS // 4
+
+
+@pytest.mark.parametrize("sql, stripped", [
+    ("SELECT 1;", "SELECT 1"),
+    ("SELECT 1 -- note", "SELECT 1"),
+    ("SELECT 1; -- note\n", "SELECT 1"),
+    ("SELECT 1 # note", "SELECT 1"),
+    ("SELECT 1 /* note */ ;", "SELECT 1"),
+    ("SELECT 1 -- first\n-- second", "SELECT 1"),
+    ("SELECT '-- not a comment'", "SELECT '-- not a comment'"),
+    ("SELECT 'a#b' -- note", "SELECT 'a#b'"),
+    ("SELECT 1 --1", "SELECT 1 --1"),
+    ("SELECT /*+ MAX_EXECUTION_TIME(10) */ 1", "SELECT /*+ MAX_EXECUTION_TIME(10) */ 1"),
+])
+def test_strip_statement(sql, stripped):
+    assert app._strip_statement(sql) == stripped
+
+
+def test_trailing_comment_does_not_break_paging(client, standin):
+    status, body = run(client, standin, "SELECT id FROM orders ORDER BY id -- all orders", pageSize=3, withTotal=True)
+    assert status == 200, body
+    assert ids(body) == [1, 2, 3]
+    assert body["page"]["total"] == ROWS
+
+
+@pytest.fixture
+def duplicate_names(monkeypatch):
+    # MySQL rejects a derived table with repeated column names (error 1060); SQLite renames them
+    statement = app._statement
+
+    def reject_wrapped(sql, params=None):
+        if "AS _page_src" in sql or "AS _cols_src" in sql:
+            raise OperationalError(sql, params, Exception(app.ER_DUP_FIELDNAME, "Duplicate column name 'id'"))
+        return statement(sql, params)
+
+    monkeypatch.setattr(app, "_statement", reject_wrapped)
+
+
+def test_duplicate_column_names_page_unwrapped(client, standin, duplicate_names):
+    sql = "SELECT o.id, p.id FROM orders o JOIN orders p ON p.id = o.id ORDER BY o.id"
+    status, body = run(client, standin, sql, pageSize=4, offset=8, withTotal=True)
+    assert status == 200, body
+    assert [row["id"] for row in body["results"]] == [9, 10, 11, 12]
+    assert body["page"]["hasMore"] is True
+    assert body["page"]["total"] == ROWS
+    status, body = run(client, standin, sql, pageSize=4, cursor=body["page"]["nextCursor"])
+    assert [row["id"] for row in body["results"]] == [13, 14, 15, 16]
+    assert "truncated" not in body
+
+
+def test_duplicate_column_names_last_page(client, standin, duplicate_names):
+    sql = "SELECT o.id, p.id FROM orders o JOIN orders p ON p.id = o.id ORDER BY o.id"
+    status, body = run(client, standin, sql, pageSize=4, offset=ROWS - 2)
+    assert status == 200, body
+    assert len(body["results"]) == 2
+    assert body["page"]["hasMore"] is False
+
+
+def test_duplicate_column_names_with_sort_is_a_clear_error(client, standin, duplicate_names):
+    sql = "SELECT o.id, p.id FROM orders o JOIN orders p ON p.id = o.id"
+    status, body = run(client, standin, sql, pageSize=4, sort=[{"column": "id", "direction": "asc"}])
+    assert status == 400
+    assert "duplicate column names" in body["error"]
+
+
+def decoded(cursor):
+    return app._decode_cursor(cursor)
+
+
+@pytest.fixture
+def big_ids(standin):
+    # Keys past 2^53, which the JSON rows carry as strings
+    connection = sqlite3.connect(standin.path)
+    connection.executemany(
+        "INSERT INTO orders VALUES (?, 1, 'big', 1, 0, '2026-01-01 00:00:00', NULL)",
+        [(2 ** 53 + offset,) for offset in (1, 2, 3)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_keyset_cursor_keeps_the_driver_value(client, standin, big_ids):
+    sql = f"SELECT id FROM orders WHERE id > {2 ** 53}"
+    status, body = run(client, standin, sql, pageSize=1, keyColumn="id")
+    assert status == 200, body
+    assert body["results"] == [{"id": str(2 ** 53 + 1)}]
+    assert decoded(body["page"]["nextCursor"])["after"] == 2 ** 53 + 1
+    status, body = run(client, standin, sql, pageSize=1, cursor=body["page"]["nextCursor"])
+    assert body["results"] == [{"id": str(2 ** 53 + 2)}]
+
+
+@pytest.mark.parametrize("value", [2 ** 63 - 1, Decimal("12345678901234567.89"), b"\x00\xff", "k", 1.5, None])
+def test_cursor_values_round_trip(value):
+    cursor = app._encode_cursor({"key": "id", **app._cursor_value(value)})
+    paging = app._parse_paging({"pageSize": 10, "cursor": cursor})
+    assert paging["after"] == value
+    assert type(paging["after"]) is type(value)
+
+
+def test_tampered_typed_cursor_is_rejected():
+    cursor = app._encode_cursor({"key": "id", "after": "not a number", "afterType": "decimal"})
+    with pytest.raises(ValueError):
+        app._parse_paging({"pageSize": 10, "cursor": cursor})
@@ -0,0 +1,131 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(app, "RESULT_CACHE_TTL_SECONDS", 60)
+
+
+def run(client, standin, sql):
+    response = client.post("/api/execute-sql", json={"dbConfig": standin.db_config, "sql": sql})
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def test_repeated_select_is_served_from_cache(client, standin, cached):
+    sql = "SELECT id, name FROM orders WHERE id <= 3"
+    assert run(client, standin, sql)["cache"]["hit"] is False
+    body = run(client, standin, sql)
+    assert body["cache"]["hit"] is True
+    assert [row["id"] for row in body["results"]] == [1, 2, 3]
+
+
+def test_whitespace_inside_literals_keeps_separate_entries(client, standin, cached):
+    first = run(client, standin, "SELECT 'a  b' AS v FROM orders WHERE id = 1")
+    second = run(client, standin, "SELECT 'a b' AS v FROM orders WHERE id = 1")
+    assert first["results"] == [{"v": "a  b"}]
+    assert second["results"] == [{"v": "a b"}]
+    assert second["cache"]["hit"] is False
+
+
+@pytest.fixture
+def accounts(standin):
+    # A second table and a view over orders, with the schema cached like an opened menu has it
+    connection = sqlite3.connect(standin.path)
+    connection.executescript(
+        "CREATE TABLE accounts (id INTEGER PRIMARY KEY, name TEXT NOT NULL);"
+        "INSERT INTO accounts VALUES (1, 'first'), (2, 'second');"
+        "CREATE VIEW big_orders AS SELECT id, amount FROM orders WHERE amount > 500;"
+    )
+    connection.commit()
+    connection.close()
+    app._get_schema(standin.db_config, refresh=True)
+
+
+def hit(client, standin, sql):
+    return run(client, standin, sql)["cache"]["hit"]
+
+
+def write(client, standin, sql):
+    response = client.post("/api/execute-sql", json={"dbConfig": standin.db_config, "sql": sql})
+    assert response.status_code == 200, response.data
+
+
+@pytest.mark.parametrize("sql, tables", [
+    ("SELECT * FROM orders o JOIN accounts a ON a.id = o.account_id", {"orders", "accounts"}),
+    ("SELECT id FROM orders WHERE account_id IN (SELECT id FROM accounts)", {"orders", "accounts"}),
+    ("WITH recent AS (SELECT * FROM orders) SELECT * FROM recent", {"orders"}),
+    ("SELECT o.id FROM orders o, accounts a WHERE a.id = o.account_id", None),
+    ("SELECT * FROM big_orders", None),
+    ("SELECT * FROM other.orders", None),
+    ("SELECT * FROM missing", None),
+])
+def test_sql_tables(standin, accounts, sql, tables):
+    schema = app._cached_schema(standin.db_config)
+    expected = None if tables is None else frozenset(tables)
+    assert app._sql_tables(sql, schema) == expected
+
+
+def test_sql_tables_without_cached_schema_is_unknown():
+    assert app._sql_tables("SELECT * FROM orders", None) is None
+
+
+@pytest.mark.parametrize("sql, table", [
+    ("UPDATE orders SET note = 'x' WHERE id = 1", "orders"),
+    ("UPDATE `orders` o SET o.note = 'x' WHERE o.id = 1", "orders"),
+    ("INSERT INTO accounts (id, name) SELECT id, name FROM orders", "accounts"),
+    ("DELETE FROM orders WHERE id = 1", "orders"),
+    ("UPDATE orders o JOIN accounts a ON a.id = o.account_id SET a.name = 'x'", None),
+    ("UPDATE orders o, accounts a SET a.name = 'x' WHERE a.id = o.account_id", None),
+    ("DELETE FROM orders USING orders JOIN accounts ON accounts.id = orders.account_id", None),
+    ("DELETE o FROM orders o JOIN accounts a ON a.id = o.account_id", None),
+])
+def test_write_target_table(sql, table):
+    assert app._write_target_table(sql) == table
+
+
+def test_write_drops_only_entries_reading_the_table(client, standin, cached, accounts):
+    orders = "SELECT id FROM orders WHERE id = 1"
+    joined = "SELECT id FROM orders WHERE account_id IN (SELECT id FROM accounts)"
+    names = "SELECT name FROM accounts"
+    for sql in (orders, joined, names):
+        run(client, standin, sql)
+    write(client, standin, "UPDATE accounts SET name = 'renamed' WHERE id = 1")
+    assert hit(client, standin, orders) is True
+    assert hit(client, standin, joined) is False
+    body = run(client, standin, names)
+    assert body["cache"]["hit"] is False
+    assert {"name": "renamed"} in body["results"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT o.id FROM orders o, accounts a WHERE a.id = o.account_id AND a.id = 1",
+    "SELECT id FROM big_orders WHERE id <= 10",
+])
+def test_unparsed_entries_are_dropped_by_any_write(client, standin, cached, accounts, sql):
+    run(client, standin, sql)
+    write(client, standin, "UPDATE accounts SET name = 'renamed' WHERE id = 2")
+    assert hit(client, standin, sql) is False
+
+
+def test_write_through_a_view_drops_every_entry(client, standin, cached, accounts):
+    sql = "SELECT id FROM orders WHERE id = 1"
+    run(client, standin, sql)
+    app._invalidate_result_cache(standin.db_config, "big_orders")
+    assert hit(client, standin, sql) is False
+
+
+def test_row_edit_drops_cached_grid(client, standin, cached):
+    grid = f"{standin.user}-grid"
+    first = client.post(f"/api/sql/config/{grid}/run", json={"pageSize": 5}).get_json()
+    assert client.post(f"/api/sql/config/{grid}/run", json={"pageSize": 5}).get_json()["cache"]["hit"] is True
+    row = first["results"][0]
+    response = client.post(f"/api/sql/config/{grid}/row", json={"row": row, "changes": {"note": "edited"}})
+    assert response.status_code == 200, response.data
+    after = client.post(f"/api/sql/config/{grid}/run", json={"pageSize": 5}).get_json()
+    assert after["cache"]["hit"] is False
+    assert after["results"][0]["note"] == "edited"
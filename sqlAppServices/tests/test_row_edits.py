@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+def notes(standin, *ids):
+    connection = sqlite3.connect(standin.path)
+    try:
+        marks = ",".join("?" * len(ids))
+        return dict(connection.execute(f"SELECT id, note FROM orders WHERE id IN ({marks})", ids).fetchall())
+    finally:
+        connection.close()
+
+
+def edit_row(client, standin, payload):
+    response = client.post(f"/api/sql/config/{standin.user}-grid/row", json=payload)
+    return response.status_code, response.get_json()
+
+
+def execute(client, standin, sql):
+    response = client.post("/api/execute-sql", json={"dbConfig": standin.db_config, "sql": sql})
+    return response.status_code, response.get_json()
+
+
+def test_row_with_primary_key_is_updated_by_key(client, standin):
+    # The other values are stale, but the primary key alone identifies the row
+    status, body = edit_row(client, standin, {"row": {"id": 7, "name": "stale"}, "changes": {"note": "by key"}})
+    assert status == 200, body
+    assert body["keyMode"] == "primaryKey"
+    assert notes(standin, 7) == {7: "by key"}
+
+
+def test_row_without_primary_key_is_matched_by_key_columns(client, standin):
+    row = client.post("/api/execute-sql", json={
+        "dbConfig": standin.db_config, "sql": "SELECT account_id, name, created_at FROM orders WHERE id = 9",
+    }).get_json()["results"][0]
+    status, body = edit_row(client, standin, {
+        "row": row, "changes": {"note": "by columns"}, "keyColumns": ["account_id", "name", "created_at"],
+    })
+    assert status == 200, body
+    assert body["keyMode"] == "columns"
+    assert notes(standin, 9) == {9: "by columns"}
+
+
+@pytest.mark.parametrize("row, key_columns, message", [
+    # status is shared by a quarter of the rows
+    ({"status": 1}, ["status"], "找到 50 行"),
+    ({"name": "nobody"}, ["name"], "没有找到"),
+])
+def test_row_edit_conflict_rolls_back(client, standin, row, key_columns, message):
+    status, body = edit_row(client, standin, {"row": row, "changes": {"note": "conflict"}, "keyColumns": key_columns})
+    assert status == 409
+    assert message in body["error"]
+    status, body = execute(client, standin, "SELECT COUNT(*) AS n FROM orders WHERE note = 'conflict'")
+    assert body["results"] == [{"n": 0}]
+
+
+def test_guarded_update_statement(client, standin):
+    status, body = execute(client, standin, "UPDATE orders SET note = 'one' WHERE id = 3")
+    assert status == 200, body
+    assert notes(standin, 3) == {3: "one"}
+
+    status, body = execute(client, standin, "UPDATE orders SET note = 'many' WHERE id <= 3")
+    assert status == 409
+    assert "找到 3 行" in body["error"]
+    assert notes(standin, 1, 2, 3) == {1: None, 2: None, 3: "one"}
+
+    status, body = execute(client, standin, "UPDATE orders SET note = 'none' WHERE id = 0")
+    assert status == 409
+
+
+def test_update_without_where_is_rejected(client, standin):
+    status, body = execute(client, standin, "UPDATE orders SET note = 'all'")
+    assert status == 400
+    assert notes(standin, 1) == {1: None}
+
+
+def test_guarded_update_keeps_cached_results_on_conflict(client, standin, monkeypatch):
+    # A rolled-back update leaves the table as it was, so its cached results stay valid
+    monkeypatch.setattr(app, "RESULT_CACHE_TTL_SECONDS", 60)
+    sql = "SELECT id, note FROM orders WHERE id <= 3"
+    execute(client, standin, sql)
+    assert execute(client, standin, "UPDATE orders SET note = 'many' WHERE id <= 3")[0] == 409
+    assert execute(client, standin, sql)[1]["cache"]["hit"] is True
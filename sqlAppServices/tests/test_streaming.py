@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import app
+from conftest import ROWS
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    # Slow-query records of the statements that finished, with the row count seen at that point
+    calls = []
+
+    def record(db_config, sql, elapsed, config=None, username=None, params=None):
+        calls.append({"sql": sql, "elapsed": elapsed, "rows": app.METRICS_LOCAL.rows})
+
+    monkeypatch.setattr(app, "_record_slow_query", record)
+    return calls
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def request_durations(endpoint):
+    key = ("sqlapp_http_request_duration_seconds", (("endpoint", endpoint),))
+    entry = app.METRICS.get(key)
+    return entry["count"] if entry else 0
+
+
+def test_stream_sends_every_row_in_batches(client, standin):
+    response = client.post("/api/execute-sql", json={
+        "dbConfig": standin.db_config, "sql": "SELECT id FROM orders ORDER BY id", "stream": True, "batchSize": 64,
+    })
+    assert response.status_code == 200
+    messages = lines(response)
+    assert messages[0] == {"type": "columns", "columns": ["id"]}
+    batches = [message["rows"] for message in messages if message["type"] == "rows"]
+    assert [len(batch) for batch in batches] == [64, 64, 64, 8]
+    assert [row["id"] for batch in batches for row in batch] == list(range(1, ROWS + 1))
+    assert messages[-1] == {"type": "end", "rowCount": ROWS}
+
+
+def test_stream_timing_is_recorded_when_the_body_is_done(client, standin, recorded):
+    grid = f"{standin.user}-grid"
+    durations = request_durations("run_sql_config")
+    response = client.post(f"/api/sql/config/{grid}/run", json={"stream": True, "format": "columnar"})
+    # The generator has not run yet: nothing is timed before the rows are sent
+    assert recorded == []
+    assert request_durations("run_sql_config") == durations
+    messages = lines(response)
+    response.close()
+    assert messages[-1]["type"] == "end"
+    assert len(recorded) == 1
+    assert recorded[0]["rows"] == messages[-1]["rowCount"]
+    assert request_durations("run_sql_config") == durations + 1
+    route = next(entry for entry in app._route_stats() if entry["role"] == "primary")
+    assert route["queries"] == 1 and route["errors"] == 0
+
+
+def test_failed_stream_counts_as_a_route_error(client, standin, recorded):
+    response = client.post("/api/execute-sql", json={
+        "dbConfig": standin.db_config, "sql": "SELECT id FROM missing_table", "stream": True,
+    })
+    assert lines(response)[-1]["type"] == "error"
+    assert len(recorded) == 1
+    route = next(entry for entry in app._route_stats() if entry["role"] == "primary")
+    assert route["errors"] == 1
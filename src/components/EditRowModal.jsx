@@ -5,8 +5,10 @@ import styles from '../themes/terminal.less';
 
 export default function EditRowModal({
   open,
+  title = '编辑行数据',
   rowData,
   columns,
+  editableColumns,
   onCancel,
   onSave,
   saving,
@@ -48,8 +50,12 @@ export default function EditRowModal({
     if (col.key === 'edit' || col.key === 'index') {
       return false;
     }
-    // Exclude time-related columns
     const columnName = col.dataIndex || col.key;
+    // The table schema says which columns can be edited
+    if (editableColumns) {
+      return editableColumns.includes(columnName);
+    }
+    // Without a schema, exclude time-related columns
     return !columnName.toLowerCase().includes('time') && 
            !columnName.toLowerCase().includes('create_') && 
            !columnName.toLowerCase().includes('update_');
@@ -59,7 +65,7 @@ export default function EditRowModal({
     <div className={styles.terminalModalOverlay}>
       <div className={styles.terminalModalCard}   style={{ width: '600px' }}>
         <div className={styles.terminalModalHeader}>
-          <h3>编辑行数据</h3>
+          <h3>{title}</h3>
           <button
             className={styles.terminalModalClose}
             type="button"
@@ -1,11 +1,79 @@
-import { useState } from 'react';
-import { Link } from 'umi';
+import { useEffect, useState } from 'react';
+import { Button, Checkbox, Table } from 'antd';
 import { useApp } from '../contexts/appContext';
+import { useSqlConfig } from '../contexts/SqlConfigContext';
 import styles from '../themes/terminal.less';
 import SidebarNav from '../components/SidebarNav';
+import TerminalAlert from '../components/TerminalAlert';
+import { SqlService } from '../services/sqlService';
+
+// Saved queries shown on the dashboard, remembered per browser
+const DASHBOARD_IDS_KEY = 'dashboardQueryIds';
+const DASHBOARD_PAGE_SIZE = 20;
+
+const loadDashboardIds = () => {
+  try {
+    const ids = JSON.parse(localStorage.getItem(DASHBOARD_IDS_KEY));
+    return Array.isArray(ids) ? ids : [];
+  } catch {
+    return [];
+  }
+};
+
+// Columnar results ({ columns, rows: [[...]] }) to antd table props
+const toTable = (result) => {
+  const columns = (result.columns || []).map((name, index) => ({
+    title: name,
+    dataIndex: String(index),
+    key: String(index),
+    render: (value) => (value === null || value === undefined ? 'NULL' : String(value)),
+  }));
+  const dataSource = (result.rows || []).map((row, rowIndex) => ({
+    key: rowIndex,
+    ...Object.fromEntries(row.map((value, index) => [String(index), value])),
+  }));
+  return { columns, dataSource };
+};
 
 export default function HomeDashboard() {
   const { session } = useApp();
+  const { sqlConfigs } = useSqlConfig();
+  const [selectedIds, setSelectedIds] = useState(loadDashboardIds);
+  const [results, setResults] = useState([]);
+  const [elapsedMs, setElapsedMs] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState('');
+
+  // Only queries that still exist are run
+  const ids = selectedIds.filter(id => sqlConfigs.some(config => config.id === id));
+
+  const runDashboard = async () => {
+    if (ids.length === 0) {
+      setResults([]);
+      return;
+    }
+    setLoading(true);
+    setError('');
+    try {
+      // One request runs every selected query; the server groups them by database
+      const data = await SqlService.runDashboard(ids, { pageSize: DASHBOARD_PAGE_SIZE, format: 'columnar' });
+      setResults(data.results || []);
+      setElapsedMs(data.elapsedMs);
+    } catch (err) {
+      setError(err?.response?.data?.error || '仪表盘加载失败');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    runDashboard();
+  }, [ids.join(',')]);
+
+  const handleSelect = (values) => {
+    setSelectedIds(values);
+    localStorage.setItem(DASHBOARD_IDS_KEY, JSON.stringify(values));
+  };
 
   return (
     <>
@@ -17,8 +85,50 @@ export default function HomeDashboard() {
             {session ? `active session: ${session.username}` : 'no active session'}
           </p>
           <div className={styles.dashboardPanel}>
-            <p>$ echo "Welcome to the dashboard"</p>
+            <div style={{ display: 'flex', alignItems: 'center', justifyContent: 'space-between', gap: 16 }}>
+              <Checkbox.Group
+                options={sqlConfigs.map(config => ({ label: config.menu_name, value: config.id }))}
+                value={selectedIds}
+                onChange={handleSelect}
+              />
+              <Button size="small" loading={loading} disabled={ids.length === 0} onClick={runDashboard}>
+                刷新
+              </Button>
+            </div>
+            {ids.length === 0 && <p>$ 选择要显示在仪表盘上的查询</p>}
+            {elapsedMs !== null && ids.length > 0 && <p>$ {results.length} 个查询，耗时 {elapsedMs} ms</p>}
           </div>
+          {error && (
+            <div style={{ marginTop: 16 }}>
+              <TerminalAlert message="Dashboard Error" description={error} type="error" showIcon={true} />
+            </div>
+          )}
+          {ids.length > 0 && results.map(result => (
+            <div key={result.id} className={styles.dashboardPanel}>
+              <h3 className={styles.dashboardSubtitle}>
+                {result.menu_name || result.id}
+                {result.status === 'ok' && result.elapsedMs !== undefined && ` · ${result.elapsedMs} ms`}
+                {result.cached && ' · 缓存'}
+              </h3>
+              {result.status === 'ok' ? (
+                <Table
+                  {...toTable(result)}
+                  loading={loading}
+                  className={styles.terminalTable}
+                  size="small"
+                  pagination={false}
+                  scroll={{ x: 'max-content' }}
+                />
+              ) : (
+                <TerminalAlert
+                  message={result.status === 'timeout' ? '查询超时' : '查询失败'}
+                  description={result.error}
+                  type={result.status === 'timeout' ? 'warning' : 'error'}
+                  showIcon={true}
+                />
+              )}
+            </div>
+          ))}
         </section>
       </div>
       <footer className={styles.footer}>
@@ -27,4 +137,3 @@ export default function HomeDashboard() {
     </>
   );
 }
-
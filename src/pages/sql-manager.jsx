@@ -10,6 +10,7 @@ import { request } from 'umi';
 import SidebarNav from '../components/SidebarNav';
 import { useSqlConfig } from '../contexts/SqlConfigContext';
 import { useApp } from '../contexts/appContext';
+import { ConfigService } from '../services/ConfigService';
 
 const { Text } = Typography;
 
@@ -38,6 +39,18 @@ export default function SqlManagerPage() {
   const [deletingDbConfig, setDeletingDbConfig] = useState(null);
   const [editingDbConfig, setEditingDbConfig] = useState(null);
   const [dbNameError, setDbNameError] = useState('');
+  const [schemaConfig, setSchemaConfig] = useState(null);
+  const [schema, setSchema] = useState(null);
+  const [schemaLoading, setSchemaLoading] = useState(false);
+
+  // Tables and columns of a configured database, cached on the server until refreshed
+  const loadSchema = async (record, refresh = false) => {
+    setSchemaConfig(record);
+    setSchemaLoading(true);
+    const data = await ConfigService.getDbSchema(record.id, refresh);
+    setSchema(data);
+    setSchemaLoading(false);
+  };
 
   const openConfig = () => {
     setConfigOpen(true);
@@ -394,6 +407,14 @@ export default function SqlManagerPage() {
                       >
                         编辑
                       </Button>
+                      <Button
+                        className={styles.secondaryButton}
+                        type="button"
+                        onClick={() => loadSchema(record)}
+                        loading={schemaLoading && schemaConfig?.id === record.id}
+                      >
+                        表结构
+                      </Button>
                       <Button
                         className={styles.secondaryButton}
                         type="button"
@@ -423,6 +444,98 @@ export default function SqlManagerPage() {
             />
           )}
         </div>
+        {schemaConfig && (
+          <div className={styles.dashboardPanel}>
+            <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: 16 }}>
+              <h3 className={styles.dashboardSubtitle}>表结构：{schemaConfig.database}</h3>
+              <div style={{ display: 'flex', gap: '8px' }}>
+                <Button
+                  className={styles.secondaryButton}
+                  type="button"
+                  onClick={() => loadSchema(schemaConfig, true)}
+                  loading={schemaLoading}
+                >
+                  刷新
+                </Button>
+                <Button className={styles.secondaryButton} type="button" onClick={() => setSchemaConfig(null)}>
+                  关闭
+                </Button>
+              </div>
+            </div>
+            {!schemaLoading && !schema ? (
+              <div className={styles.terminalContent}>表结构加载失败，请检查数据库连接配置。</div>
+            ) : (
+              <Table
+                rowKey="name"
+                dataSource={schema?.tables || []}
+                loading={schemaLoading}
+                columns={[
+                  {
+                    title: '表名',
+                    dataIndex: 'name',
+                    key: 'name',
+                    render: (text, table) => (
+                      <Text className={styles.terminalText}>{table.type === 'view' ? `${text} (视图)` : text}</Text>
+                    ),
+                  },
+                  {
+                    title: '主键',
+                    dataIndex: 'primaryKey',
+                    key: 'primaryKey',
+                    render: (keys) => keys?.length ? keys.join(', ') : '-',
+                  },
+                  {
+                    title: '估算行数',
+                    dataIndex: 'rowEstimate',
+                    key: 'rowEstimate',
+                    render: (value) => value ?? '-',
+                  },
+                  {
+                    title: '注释',
+                    dataIndex: 'comment',
+                    key: 'comment',
+                    render: (text) => text || '-',
+                  },
+                ]}
+                expandable={{
+                  expandedRowRender: (table) => (
+                    <Table
+                      rowKey="name"
+                      dataSource={table.columns}
+                      pagination={false}
+                      size="small"
+                      className={styles.terminalTable}
+                      columns={[
+                        { title: '列名', dataIndex: 'name', key: 'name' },
+                        { title: '类型', dataIndex: 'columnType', key: 'columnType' },
+                        {
+                          title: '可空',
+                          dataIndex: 'nullable',
+                          key: 'nullable',
+                          render: (nullable) => (nullable ? 'YES' : 'NO'),
+                        },
+                        {
+                          title: '默认值',
+                          dataIndex: 'default',
+                          key: 'default',
+                          render: (value) => value ?? '-',
+                        },
+                        {
+                          title: '注释',
+                          dataIndex: 'comment',
+                          key: 'comment',
+                          render: (text) => text || '-',
+                        },
+                      ]}
+                    />
+                  ),
+                }}
+                className={styles.terminalTable}
+                size="middle"
+              />
+            )}
+          </div>
+        )}
         <div className={styles.dashboardPanel}>
           <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
             <h3 className={styles.dashboardSubtitle}>SQL 查询配置列表</h3>
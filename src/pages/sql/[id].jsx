@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useParams } from 'umi';
 import { request } from 'umi';
 import styles from '../../themes/terminal.less';
@@ -28,7 +28,16 @@ export default function SqlPage() {
   const [editingRow, setEditingRow] = useState(null);
   const [saving, setSaving] = useState(false);
   const [editError, setEditError] = useState('');
+  const [selectedRows, setSelectedRows] = useState([]);
+  const [batchRow, setBatchRow] = useState(null);
+  const [batchError, setBatchError] = useState('');
   const [notice, setNotice] = useState('');
+  const [truncated, setTruncated] = useState(null);
+  const [editTable, setEditTable] = useState(null);
+  const [paramValues, setParamValues] = useState({});
+  const [backgroundJob, setBackgroundJob] = useState(null);
+  // The whole result was streamed into the grid, which then pages locally
+  const [streamed, setStreamed] = useState(false);
   const [detailsCollapsed, setDetailsCollapsed] = useState(true);
   const [editSqlModalOpen, setEditSqlModalOpen] = useState(false);
   const [menuName, setMenuName] = useState('');
@@ -38,6 +47,9 @@ export default function SqlPage() {
   const [submitError, setSubmitError] = useState('');
   const [sortField, setSortField] = useState(null);
   const [sortOrder, setSortOrder] = useState(null);
+  const [pagination, setPagination] = useState({ current: 1, pageSize: 50, total: 0 });
+  const searchTimerRef = useRef(null);
+  const queryAbortRef = useRef(null);
 
   const handleEditRow = (record) => {
     setEditingRow(record);
@@ -87,8 +99,8 @@ export default function SqlPage() {
         }
       });
       
-      const data = await request(`/sql/config/${id}`);
-      setSqlConfig(data?.config || null);
+      // Re-run the updated query, the response also carries the saved config
+      await loadPage(1, pagination.pageSize);
       
       setNotice('更新成功');
       setTimeout(() => setNotice(''), 3000);
@@ -111,6 +123,41 @@ export default function SqlPage() {
     setDbname('');
   };
 
+  // Changed fields that may be written to the edit table
+  const toChanges = (formData) => {
+    const changes = {};
+    Object.keys(formData).filter(key => {
+      if (editTable) {
+        return editTable.editable.includes(key);
+      }
+      // Exclude time-related columns
+      return !key.toLowerCase().includes('time') && 
+             !key.toLowerCase().includes('create_') && 
+             !key.toLowerCase().includes('update_');
+    }).forEach(key => {
+      changes[key] = formData[key];
+    });
+    return changes;
+  };
+
+  // Columns that identify the row when it carries no primary key
+  const whereColumnsFor = (row, formData) => Object.keys(row).filter(key => {
+    if (editTable) {
+      // Table columns whose values compare exactly, unless they are being updated
+      return editTable.keyCandidates.includes(key) &&
+             !Object.keys(formData).includes(key) &&
+             row[key] != null;
+    }
+    // Exclude time-related columns and columns being updated
+    const lowerKey = key.toLowerCase();
+    return !lowerKey.includes('time') && 
+           !lowerKey.includes('create_') && 
+           !lowerKey.includes('update_') && 
+           !lowerKey.includes('date') &&
+           !Object.keys(formData).includes(key) && // Exclude columns being updated
+           row[key] != null; // Ensure value is not null
+  });
+
   const handleSaveEdit = async (formData) => {
     setSaving(true);
     setEditError('');
@@ -122,74 +169,18 @@ export default function SqlPage() {
         return;
       }
 
-      const dbConfigData = await request('/db/config');
-
-      const dbConfigs = dbConfigData?.configs || [];
-      const targetDbConfig = dbConfigs.find(config => config.database === sqlConfig.dbname);
-
-      if (!targetDbConfig) {
-        throw new Error(`Database configuration not found for database: ${sqlConfig.dbname}`);
-      }
-
-      const tableInfo = sqlConfig.sql.trim().toLowerCase();
-      const tableNameMatch = tableInfo.match(/from\s+(\w+)/i);
-      const tableName = tableNameMatch ? tableNameMatch[1] : null;
-
-      if (!tableName) {
-        throw new Error('Could not determine table name from SQL query');
-      }
-
-      const columns = Object.keys(formData).filter(key => {
-        // Exclude time-related columns
-        return !key.toLowerCase().includes('time') && 
-               !key.toLowerCase().includes('create_') && 
-               !key.toLowerCase().includes('update_');
-      });
-      if (columns.length === 0) {
+      const changes = toChanges(formData);
+      if (Object.keys(changes).length === 0) {
         throw new Error('No valid columns to update');
       }
 
-      const setClause = columns.map(key => {
-        const value = formData[key];
-        if (typeof value === 'string') {
-          return `${key} = '${value.replace(/'/g, "''")}'`;
-        } else if (value === null || value === undefined) {
-          return `${key} = NULL`;
-        } else {
-          return `${key} = ${value}`;
-        }
-      }).join(', ');
-      
-      const whereColumns = Object.keys(editingRow).filter(key => {
-        // Exclude time-related columns and columns being updated
-        const lowerKey = key.toLowerCase();
-        return !lowerKey.includes('time') && 
-               !lowerKey.includes('create_') && 
-               !lowerKey.includes('update_') && 
-               !lowerKey.includes('date') &&
-               !Object.keys(formData).includes(key) && // Exclude columns being updated
-               editingRow[key] != null; // Ensure value is not null
+      // The server builds the UPDATE itself. It matches the row by primary key when the
+      // row carries one, otherwise by the WHERE columns chosen here.
+      await SqlService.updateRow(id, {
+        row: editingRow,
+        changes,
+        keyColumns: whereColumnsFor(editingRow, formData),
       });
-      
-      if (whereColumns.length === 0) {
-        throw new Error('No valid columns for WHERE clause');
-      }
-
-      const whereClause = whereColumns.map(key => {
-        const value = editingRow[key];
-        if (typeof value === 'string') {
-          return `${key} = '${value.replace(/'/g, "''")}'`;
-        } else {
-          return `${key} = ${value}`;
-        }
-      }).join(' AND ');
-
-      const updateSql = `UPDATE ${tableName} SET ${setClause} WHERE ${whereClause}`;
-      
-      console.log('Frontend SQL:', updateSql);
-
-      // Execute UPDATE query
-      await SqlService.updateSql(targetDbConfig, updateSql);
 
       // Only update the specific row in the table data instead of refreshing the entire table
       setQueryResults(prevResults => {
@@ -221,116 +212,276 @@ export default function SqlPage() {
     }
   };
 
+  // The same changes for every selected row, applied in one transaction on the server
+  const handleSaveBatchEdit = async (formData) => {
+    const changes = toChanges(formData);
+    if (Object.keys(changes).length === 0) {
+      setBatchError('没有字段被修改');
+      return;
+    }
+    setSaving(true);
+    setBatchError('');
+    try {
+      await SqlService.updateRows(id, selectedRows.map(row => ({
+        row,
+        changes,
+        keyColumns: whereColumnsFor(row, changes),
+      })));
+      const edited = new Set(selectedRows);
+      setQueryResults(prevResults => prevResults.map(row => (edited.has(row) ? { ...row, ...changes } : row)));
+      setNotice(`已更新 ${selectedRows.length} 行`);
+      setTimeout(() => setNotice(''), 3000);
+      setSelectedRows([]);
+      setBatchRow(null);
+    } catch (err) {
+      // Atomic mode: nothing was kept; show the first row that failed
+      const data = err?.response?.data;
+      const failed = data?.outcomes?.find(outcome => !outcome.ok);
+      setBatchError([data?.error || '批量更新失败', failed?.error].filter(Boolean).join(' '));
+    } finally {
+      setSaving(false);
+    }
+  };
+
   const handleCloseEditModal = () => {
     setEditModalOpen(false);
     // Don't set editingRow to null to preserve row background color
     setEditError('');
   };
 
-  const handleTableChange = (pagination, filters, sorter) => {
-    setFilters(filters);
-    
-    // Handle sorting
-    if (sorter && sorter.field) {
-      setSortField(sorter.field);
-      setSortOrder(sorter.order);
+  const handleTableChange = (newPagination, _, sorter) => {
+    // Sorting is done by MySQL, so a new sort order reloads from the first page
+    const nextField = sorter && sorter.order ? sorter.field : null;
+    const nextOrder = sorter && sorter.order ? sorter.order : null;
+    const sortChanged = nextField !== sortField || nextOrder !== sortOrder;
+    setSortField(nextField);
+    setSortOrder(nextOrder);
+
+    const pageChanged = newPagination.current !== pagination.current || newPagination.pageSize !== pagination.pageSize;
+    if (streamed && !sortChanged) {
+      setPagination(prev => ({ ...prev, current: newPagination.current, pageSize: newPagination.pageSize }));
+      return;
+    }
+    if (sortChanged || pageChanged) {
+      loadPage(sortChanged ? 1 : newPagination.current, newPagination.pageSize, { field: nextField, order: nextOrder }, filters);
+    }
+  };
+
+  const handleSearchChange = (key, value) => {
+    const newFilters = { ...filters };
+    if (value) {
+      newFilters[key] = value;
     } else {
-      setSortField(null);
-      setSortOrder(null);
+      delete newFilters[key];
     }
+    setFilters(newFilters);
+
+    // Wait until typing pauses before asking the server to filter
+    clearTimeout(searchTimerRef.current);
+    searchTimerRef.current = setTimeout(() => {
+      loadPage(1, pagination.pageSize, { field: sortField, order: sortOrder }, newFilters);
+    }, 400);
   };
 
-  useEffect(() => {
-    const fetchSqlConfig = async () => {
+  const toSortSpecs = (sort) => (
+    sort.field && sort.order
+      ? [{ column: sort.field, direction: sort.order === 'ascend' ? 'asc' : 'desc' }]
+      : []
+  );
+
+  const toFilterSpecs = (searchFilters) => Object.entries(searchFilters)
+    .filter(([, value]) => value)
+    .map(([column, value]) => ({ column, operator: 'contains', value }));
+
+  // The export streams the whole result on the server with the grid's current sort and filters
+  const handleExport = (format) => {
+    window.location.assign(SqlService.exportUrl(id, format, {
+      sort: toSortSpecs({ field: sortField, order: sortOrder }),
+      filters: toFilterSpecs(filters),
+      params: paramValues,
+    }));
+  };
+
+  const loadPage = async (
+    current,
+    pageSize,
+    sort = { field: sortField, order: sortOrder },
+    searchFilters = filters,
+    queryParams = paramValues,
+    background = false,
+  ) => {
+    // A newer page request replaces the running one; a background job is also cancelled on the server
+    queryAbortRef.current?.abort();
+    const controller = new AbortController();
+    queryAbortRef.current = controller;
+    setQueryLoading(true);
+    setQueryError('');
+    try {
+      const options = {
+        pageSize,
+        page: current,
+        withTotal: true,
+        format: 'columnar',
+        sort: toSortSpecs(sort),
+        filters: toFilterSpecs(searchFilters),
+        // Values of the saved query's declared parameters; the server applies defaults
+        params: queryParams,
+      };
+      // Pages run in one round trip; the server resolves the database connection and returns
+      // the saved config together with the requested page. Long queries can run as a background
+      // job instead, which keeps no HTTP request open while MySQL works.
+      const resultData = background
+        ? await SqlService.runQueryJob({ sqlConfigId: id, ...options }, {
+          signal: controller.signal,
+          onStatus: setBackgroundJob,
+        })
+        : await SqlService.runSavedQuery(id, options, { signal: controller.signal });
+      if (controller.signal.aborted) {
+        return;
+      }
+
+      // Columnar format: column metadata once, rows as positional arrays
+      const columns = resultData?.columns || [];
+      const names = columns.map(column => column.name);
+      const results = (resultData?.rows || []).map(row => {
+        const record = {};
+        names.forEach((name, index) => {
+          record[name] = row[index];
+        });
+        return record;
+      });
+      setQueryResults(results);
+      setSelectedRows([]);
+      setStreamed(false);
+      setPagination({
+        current,
+        pageSize,
+        total: resultData?.page?.total ?? results.length,
+      });
+
+      // Column order comes from the cursor description, no SQL parsing needed
+      setColumnNames(names);
+      setSqlConfig(resultData?.config || null);
+      // The server stopped fetching at a row/byte/time budget
+      setTruncated(resultData?.truncated || null);
+    } catch (err) {
+      if (controller.signal.aborted) {
+        return;
+      }
+      if (background && err?.response?.status === 409) {
+        // Cancelled by the user, the current page stays as it was
+        setNotice('后台查询已取消');
+        setTimeout(() => setNotice(''), 3000);
+        return;
+      }
+      setQueryError(err?.response?.data?.error || '执行 SQL 查询失败');
+      setColumnNames([]);
+      // The query failed, load the config alone so it can still be viewed and fixed
       try {
         const data = await request(`/sql/config/${id}`);
         setSqlConfig(data?.config || null);
-      } catch (err) {
-        setError(err?.response?.data?.error || 'Failed to load SQL configuration');
-      } finally {
+      } catch (configErr) {
+        setError(configErr?.response?.data?.error || 'Failed to load SQL configuration');
+      }
+    } finally {
+      if (queryAbortRef.current === controller) {
+        queryAbortRef.current = null;
+        setBackgroundJob(null);
+        setQueryLoading(false);
         setLoading(false);
       }
-    };
-    fetchSqlConfig();
-  }, [id]);
+    }
+  };
 
-  useEffect(() => {
-    const executeSqlQuery = async () => {
-      if (!sqlConfig || !sqlConfig.sql) {
+  const handleRunInBackground = () => {
+    loadPage(pagination.current, pagination.pageSize, undefined, undefined, undefined, true);
+  };
+
+  // Streams the whole saved result as NDJSON; the first batch is shown while the rest arrives.
+  // Sorting or searching afterwards goes back to pages sorted and filtered by MySQL.
+  const handleLoadAll = async () => {
+    queryAbortRef.current?.abort();
+    const controller = new AbortController();
+    queryAbortRef.current = controller;
+    setQueryLoading(true);
+    setQueryError('');
+    setTruncated(null);
+    setSortField(null);
+    setSortOrder(null);
+    setFilters({});
+    let names = [];
+    try {
+      const rowCount = await SqlService.streamSavedQuery(id, { format: 'columnar', params: paramValues }, {
+        onColumns: (columns) => {
+          names = columns.map(column => column.name);
+          setColumnNames(names);
+          setQueryResults([]);
+          setSelectedRows([]);
+          setStreamed(true);
+          setPagination(prev => ({ ...prev, current: 1, total: 0 }));
+        },
+        onRows: (rows) => {
+          const records = rows.map(row => Object.fromEntries(names.map((name, index) => [name, row[index]])));
+          setQueryResults(prev => prev.concat(records));
+          setPagination(prev => ({ ...prev, total: prev.total + records.length }));
+        },
+      }, { signal: controller.signal });
+      setNotice(`已加载全部 ${rowCount} 行`);
+      setTimeout(() => setNotice(''), 3000);
+    } catch (err) {
+      if (controller.signal.aborted) {
         return;
       }
-
-      setQueryLoading(true);
-      setQueryError('');
-      try {
-        // Get database configuration based on dbname
-        const dbConfigData = await request('/db/config');
-
-        const dbConfigs = dbConfigData?.configs || [];
-        const targetDbConfig = dbConfigs.find(config => config.database === sqlConfig.dbname);
-
-        if (!targetDbConfig) {
-          throw new Error(`Database configuration not found for database: ${sqlConfig.dbname}`);
-        }
-
-        // Execute SQL query
-        const resultData = await SqlService.executeSql(targetDbConfig, sqlConfig.sql);
-
-        const results = resultData?.results || [];
-        setQueryResults(results);
-
-        // Extract column names from SQL query
-        if (results.length > 0) {
-          let columnNames = [];
-          const sql = sqlConfig.sql.trim();
-          
-          // Normalize SQL: remove newlines and extra spaces
-          const normalizedSql = sql.replace(/\s+/g, ' ');
-          const selectMatch = normalizedSql.match(/^\s*SELECT\s+(.+?)\s+FROM/i);
-          
-          if (selectMatch) {
-            const selectPart = selectMatch[1];
-            // Split by commas, ignoring commas inside quotes
-            const columns = selectPart.split(/,\s*(?![^"'\(]*["'\)])/);
-            columnNames = columns.map(col => {
-              col = col.trim(); // Trim spaces around each column
-              // Extract column name from expression
-              const aliasMatch = col.match(/\s+AS\s+(\w+)/i);
-              if (aliasMatch) {
-                return aliasMatch[1];
-              }
-              // Extract last identifier as column name
-              const idMatch = col.match(/([\w`]+)\s*$/);
-              if (idMatch) {
-                return idMatch[1].replace(/[`]/g, '');
-              }
-              return col;
-            });
-          }
-          
-          // Fallback to first row keys if SQL parsing fails
-          if (columnNames.length === 0) {
-            const firstRow = results[0];
-            // Use the order of columns from the SQL result to maintain consistency
-            columnNames = Object.keys(firstRow);
-          }
-          
-          setColumnNames(columnNames);
-        } else {
-          setColumnNames([]);
-        }
-      } catch (err) {
-        setQueryError(err?.response?.data?.error || '执行 SQL 查询失败');
-        setColumnNames([]);
-      } finally {
+      setQueryError(err?.message || '流式加载失败');
+    } finally {
+      if (queryAbortRef.current === controller) {
+        queryAbortRef.current = null;
         setQueryLoading(false);
       }
-    };
+    }
+  };
+
+  const handleCancelBackgroundJob = async () => {
+    if (!backgroundJob?.jobId) {
+      return;
+    }
+    try {
+      await SqlService.cancelQueryJob(backgroundJob.jobId);
+    } catch (err) {
+      setQueryError(err?.response?.data?.error || '取消后台查询失败');
+    }
+  };
 
-    if (sqlConfig && sqlConfig.sql) {
-      executeSqlQuery();
+  // Columns of the table row edits go to, from the server's schema cache
+  const loadEditTable = async () => {
+    const schema = await SqlService.getSavedQuerySchema(id);
+    const table = (schema?.tables || []).find(item => item.name === schema?.editTable);
+    if (!table) {
+      setEditTable(null);
+      return;
     }
-  }, [sqlConfig]);
+    const inexactTypes = ['float', 'double', 'timestamp', 'datetime', 'time', 'json', 'blob', 'text'];
+    setEditTable({
+      name: table.name,
+      editable: table.columns.filter(column => column.editable).map(column => column.name),
+      keyCandidates: table.columns
+        .filter(column => !inexactTypes.includes(column.dataType))
+        .map(column => column.name),
+    });
+  };
+
+  useEffect(() => {
+    setEditTable(null);
+    loadEditTable();
+    setSortField(null);
+    setSortOrder(null);
+    setFilters({});
+    setParamValues({});
+    loadPage(1, pagination.pageSize, { field: null, order: null }, {}, {});
+  }, [id]);
+
+  // Leaving the page cancels a query that is still running
+  useEffect(() => () => queryAbortRef.current?.abort(), []);
 
   if (loading) {
     return (
@@ -376,32 +527,18 @@ export default function SqlPage() {
     const sequenceColumn = {
       title: '#',
       key: 'index',
-      render: (_, __, index) => <span className={styles.terminalTableHeader}>{index + 1}</span>,
+      render: (_, __, index) => (
+        <span className={styles.terminalTableHeader}>
+          {(pagination.current - 1) * pagination.pageSize + index + 1}
+        </span>
+      ),
     };
     // Create columns from extracted column names
     const dataColumns = columnNames.map(key => ({
       title: key,
       dataIndex: key,
       key: key,
-      sorter: (a, b) => {
-        const aVal = a[key];
-        const bVal = b[key];
-        
-        // Handle null/undefined values
-        if (aVal == null && bVal == null) return 0;
-        if (aVal == null) return -1;
-        if (bVal == null) return 1;
-        
-        // Handle numeric values
-        if (typeof aVal === 'number' && typeof bVal === 'number') {
-          return aVal - bVal;
-        }
-        
-        // Handle string values
-        const aStr = String(aVal).toLowerCase();
-        const bStr = String(bVal).toLowerCase();
-        return aStr.localeCompare(bStr);
-      },
+      sorter: true,
       sortOrder: sortField === key ? sortOrder : null,
       render: (text) => <span className={styles.terminalText}>{text}</span>
     }));
@@ -411,33 +548,9 @@ export default function SqlPage() {
 
   const columns = generateColumns();
 
-  // Apply filters and sorting to query results
-  const filteredResults = queryResults.filter(record => {
-    return Object.entries(filters).every(([key, value]) => {
-      return String(record[key]).toLowerCase().includes(value.toLowerCase());
-    });
-  }).sort((a, b) => {
-    if (!sortField || !sortOrder) return 0;
-    
-    const aVal = a[sortField];
-    const bVal = b[sortField];
-    
-    // Handle null/undefined values
-    if (aVal == null && bVal == null) return 0;
-    if (aVal == null) return -1;
-    if (bVal == null) return 1;
-    
-    // Handle numeric values
-    if (typeof aVal === 'number' && typeof bVal === 'number') {
-      return sortOrder === 'ascend' ? aVal - bVal : bVal - aVal;
-    }
-    
-    // Handle string values
-    const aStr = String(aVal).toLowerCase();
-    const bStr = String(bVal).toLowerCase();
-    const comparison = aStr.localeCompare(bStr);
-    return sortOrder === 'ascend' ? comparison : -comparison;
-  });
+  // Use a combination of record values to generate a unique key
+  // This ensures we don't rely on the deprecated index parameter
+  const rowKeyOf = (record) => Object.values(record).join('-');
 
   return (
     <div className={styles.dashboard}>
@@ -448,6 +561,15 @@ export default function SqlPage() {
               <TerminalAlert message={notice} type="success" showIcon={true} />
             </div>
           )}
+          {truncated && (
+            <div style={{ marginBottom: 16 }}>
+              <TerminalAlert
+                message={`结果已截断：超出${{ rows: '行数', bytes: '大小', time: '时间' }[truncated.reason] || ''}限制，仅返回 ${truncated.rowCount} 行`}
+                type="warning"
+                showIcon={true}
+              />
+            </div>
+          )}
         <h2 className={styles.dashboardTitle}>
           <div style={{ display: 'flex', alignItems: 'center', justifyContent: 'space-between' }}>
             <div style={{ display: 'flex', alignItems: 'center', gap: '8px' }}>
@@ -489,6 +611,45 @@ export default function SqlPage() {
               </div>
             </>
           )}
+          {sqlConfig?.params?.length > 0 && (
+            <div style={{ marginBottom: 16, padding: 16, background: styles.sessionBackground, borderRadius: 8, border: styles.sessionBorder }}>
+              <h4 style={{ color: styles.sessionHighlightText, margin: '0 0 12px 0', fontSize: 14 }}>Query Parameters</h4>
+              <div style={{ display: 'flex', flexWrap: 'wrap', alignItems: 'center', gap: 12 }}>
+                {sqlConfig.params.map(param => (
+                  <div key={param.name} style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                    <span style={{ color: styles.sessionText, fontSize: 12 }}>
+                      {param.label}{param.required ? ' *' : ''}:
+                    </span>
+                    <TerminalTextInput
+                      placeholder={param.multiple ? `${param.type}，逗号分隔` : param.type}
+                      style={{ minWidth: '50px' }}
+                      value={paramValues[param.name] ?? (param.default != null ? String(param.default) : '')}
+                      onChange={(value) => setParamValues(prev => ({ ...prev, [param.name]: value }))}
+                    />
+                  </div>
+                ))}
+                <Button size="small" onClick={() => loadPage(1, pagination.pageSize)}>查询</Button>
+              </div>
+            </div>
+          )}
+          <div style={{ display: 'flex', alignItems: 'center', gap: 8, marginBottom: 16 }}>
+            {backgroundJob ? (
+              <>
+                <span style={{ color: styles.sessionText, fontSize: 12 }}>
+                  后台查询{backgroundJob.status === 'queued' ? '排队中' : '运行中'}...
+                </span>
+                <Button size="small" onClick={handleCancelBackgroundJob}>取消</Button>
+              </>
+            ) : (
+              <Button size="small" disabled={queryLoading} onClick={handleRunInBackground}>后台运行</Button>
+            )}
+            <Button size="small" disabled={queryLoading} onClick={handleLoadAll}>全部加载</Button>
+            {queryLoading && streamed && (
+              <span style={{ color: styles.sessionText, fontSize: 12 }}>
+                已接收 {queryResults.length} 行...
+              </span>
+            )}
+          </div>
           {queryError && (
             <TerminalAlert 
               message="Query Error" 
@@ -497,13 +658,30 @@ export default function SqlPage() {
               showIcon 
             />
           )}
-          {queryLoading ? (
+          {queryLoading && columnNames.length === 0 ? (
             <div style={{ padding: 16, background: styles.sessionBackground, borderRadius: 8, border: styles.sessionBorder, color: styles.sessionHighlightText }}>
               Executing query...
             </div>
-          ) : queryResults.length > 0 ? (
+          ) : columnNames.length > 0 ? (
             <div className={styles.dashboardPanel}>
-              <h3 className={styles.dashboardSubtitle}>Query Results</h3>
+              <div style={{ display: 'flex', alignItems: 'center', justifyContent: 'space-between' }}>
+                <h3 className={styles.dashboardSubtitle}>Query Results</h3>
+                <div style={{ display: 'flex', gap: 8 }}>
+                  {selectedRows.length > 0 && (
+                    <Button
+                      size="small"
+                      onClick={() => {
+                        setBatchError('');
+                        setBatchRow({});
+                      }}
+                    >
+                      批量修改 ({selectedRows.length})
+                    </Button>
+                  )}
+                  <Button size="small" onClick={() => handleExport('csv')}>导出 CSV</Button>
+                  <Button size="small" onClick={() => handleExport('xlsx')}>导出 XLSX</Button>
+                </div>
+              </div>
               {/* Terminal-style search area */}
               <div style={{ marginBottom: 16, padding: 16, background: styles.sessionBackground, borderRadius: 8, border: styles.sessionBorder }}>
                 <h4 style={{ color: styles.sessionHighlightText, margin: '0 0 12px 0', fontSize: 14 }}>Column Search</h4>
@@ -514,30 +692,30 @@ export default function SqlPage() {
                       <TerminalTextInput
                         placeholder="搜索"
                         style={{minWidth:"50px"}}
-                        onChange={(value) => {
-                          const newFilters = { ...filters };
-                          if (value) {
-                            newFilters[key] = value;
-                          } else {
-                            delete newFilters[key];
-                          }
-                          setFilters(newFilters);
-                        }}
+                        value={filters[key] || ''}
+                        onChange={(value) => handleSearchChange(key, value)}
                       />
                     </div>
                   ))}
                 </div>
               </div>
               <Table 
-                dataSource={filteredResults} 
+                dataSource={queryResults} 
+                loading={queryLoading && !streamed}
                 columns={columns} 
-                rowKey={(record) => {
-                  // Use a combination of record values to generate a unique key
-                  // This ensures we don't rely on the deprecated index parameter
-                  return Object.values(record).join('-');
+                rowKey={rowKeyOf}
+                rowSelection={{
+                  selectedRowKeys: selectedRows.map(rowKeyOf),
+                  onChange: (_, rows) => setSelectedRows(rows),
                 }}
                 className={styles.terminalTable}
                 size="middle"
+                pagination={{
+                  current: pagination.current,
+                  pageSize: pagination.pageSize,
+                  total: pagination.total,
+                  showSizeChanger: true,
+                }}
                 onChange={handleTableChange}
                 locale={{
                   triggerDesc: '点击降序',
@@ -567,11 +745,23 @@ export default function SqlPage() {
         open={editModalOpen}
         rowData={editingRow}
         columns={columns}
+        editableColumns={editTable?.editable}
         error={editError}
         onCancel={handleCloseEditModal}
         onSave={handleSaveEdit}
         saving={saving}
       />
+      <EditRowModal
+        open={!!batchRow}
+        title={`批量修改 ${selectedRows.length} 行`}
+        rowData={batchRow}
+        columns={columns}
+        editableColumns={editTable?.editable}
+        error={batchError}
+        onCancel={() => setBatchRow(null)}
+        onSave={handleSaveBatchEdit}
+        saving={saving}
+      />
       <SqlSubmitModal
         open={editSqlModalOpen}
         menuName={menuName}
@@ -47,6 +47,23 @@ export const ConfigService = {
     }
   },
 
+  /**
+   * 获取数据库配置对应库的表结构（表、列、主键、索引），服务器缓存
+   * @param {string} configId - 数据库配置ID
+   * @param {boolean} refresh - 是否强制重新加载
+   * @returns {Promise<Object|null>} 表结构
+   */
+  getDbSchema: async (configId, refresh = false) => {
+    try {
+      return await request(`/db/config/${configId}/schema`, {
+        params: refresh ? { refresh: 1 } : {},
+      });
+    } catch (error) {
+      console.error(`Error fetching schema of database config ${configId}:`, error);
+      return null;
+    }
+  },
+
   /**
    * 更新数据库配置
    * @param {Object} config - 数据库配置对象
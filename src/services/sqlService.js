@@ -1,5 +1,53 @@
 import { request } from 'umi';
 
+// 读取 NDJSON 响应：每行一个消息（columns / rows / end / error），按批回调
+const readNdjson = async (url, body, { onColumns, onRows } = {}, signal) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ...body, stream: true }),
+    signal,
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data?.error || `HTTP ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let rowCount = 0;
+  const handleLine = (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    const message = JSON.parse(line);
+    if (message.type === 'columns') {
+      onColumns?.(message.columns);
+    } else if (message.type === 'rows') {
+      onRows?.(message.rows);
+    } else if (message.type === 'end') {
+      rowCount = message.rowCount;
+    } else if (message.type === 'error') {
+      throw new Error(message.error);
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+  return rowCount;
+};
+
 /**
  * SQL 服务 - 用于执行 SQL 查询和更新操作
  */
@@ -26,6 +74,205 @@ export const SqlService = {
     }
   },
 
+  /**
+   * 按ID运行已保存的 SQL 配置，服务器端解析数据库连接，一次请求返回配置和结果
+   * 以 GET 请求发送，浏览器会用 ETag 重新验证，结果未变化时服务器返回 304 而不重发数据
+   * @param {string} configId - SQL配置ID
+   * @param {Object} options - 查询参数 { pageSize, page, cursor, withTotal, format, sort, filters, params }
+   * @param {Object} requestOptions - { signal: AbortSignal }，中止时放弃等待该请求
+   * @returns {Promise<Object>} 查询结果 { config, columns, rows, page }
+   */
+  runSavedQuery: async (configId, options = {}, { signal } = {}) => {
+    // sort、filters、params 与导出接口一样以 JSON 编码放在查询字符串中
+    const { sort = [], filters = [], params: queryParams = {}, ...rest } = options;
+    const params = { ...rest };
+    if (sort.length) {
+      params.sort = JSON.stringify(sort);
+    }
+    if (filters.length) {
+      params.filters = JSON.stringify(filters);
+    }
+    if (Object.keys(queryParams).length) {
+      params.params = JSON.stringify(queryParams);
+    }
+    try {
+      const response = await request(`/api/sql/config/${configId}/run`, {
+        params,
+        signal
+      });
+      return response;
+    } catch (error) {
+      console.error(`Error running SQL config ${configId}:`, error);
+      throw error;
+    }
+  },
+
+  /**
+   * 并行运行多个已保存的查询（仪表盘），一次请求返回所有结果
+   * @param {Array<string>} ids - SQL配置ID列表
+   * @param {Object} options - { pageSize, format, timeoutMs }
+   * @returns {Promise<Object>} { results: [{ id, menu_name, status, columns, rows, error }], elapsedMs }
+   */
+  runDashboard: async (ids, options = {}) => {
+    try {
+      return await request('/api/dashboard', {
+        method: 'POST',
+        data: { ids, ...options }
+      });
+    } catch (error) {
+      console.error('Error running dashboard:', error);
+      throw error;
+    }
+  },
+
+  /**
+   * 生成已保存查询的导出下载地址（服务器流式生成 CSV/XLSX）
+   * @param {string} configId - SQL配置ID
+   * @param {string} format - 'csv' 或 'xlsx'
+   * @param {Object} options - { sort, filters, params, gzip }，与表格查询相同的排序、过滤条件和查询参数
+   * @returns {string} 下载地址
+   */
+  exportUrl: (configId, format = 'csv', { sort = [], filters = [], params: queryParams = {}, gzip = false } = {}) => {
+    const params = new URLSearchParams({ format });
+    if (sort.length) {
+      params.set('sort', JSON.stringify(sort));
+    }
+    if (filters.length) {
+      params.set('filters', JSON.stringify(filters));
+    }
+    if (Object.keys(queryParams).length) {
+      params.set('params', JSON.stringify(queryParams));
+    }
+    if (gzip) {
+      params.set('gzip', '1');
+    }
+    return `/api/sql/config/${configId}/export?${params.toString()}`;
+  },
+
+  /**
+   * 以后台任务方式运行耗时较长的查询：提交任务后长轮询状态，完成后获取结果
+   * 传入的 signal 被中止、或页面关闭时，会取消任务并在 MySQL 上终止查询
+   * @param {Object} payload - { sqlConfigId } 或 { dbConfig, sql }，以及分页、排序、过滤、format、timeoutMs 参数
+   * @param {Object} options - { signal: AbortSignal, onStatus: 状态回调 }
+   * @returns {Promise<Object>} 查询结果，与 runSavedQuery 相同，另含 job 信息
+   */
+  runQueryJob: async (payload, { signal, onStatus } = {}) => {
+    const job = await request('/api/jobs', { method: 'POST', data: payload });
+    const jobId = job.jobId;
+    const cancel = () => {
+      navigator.sendBeacon?.(`/api/jobs/${jobId}/cancel`);
+    };
+    const onAbort = () => {
+      SqlService.cancelQueryJob(jobId).catch(() => {});
+    };
+    window.addEventListener('pagehide', cancel);
+    signal?.addEventListener('abort', onAbort);
+    try {
+      let status = job;
+      while (status.status === 'queued' || status.status === 'running') {
+        if (signal?.aborted) {
+          throw new DOMException('Query job aborted', 'AbortError');
+        }
+        onStatus?.(status);
+        status = await request(`/api/jobs/${jobId}`, { params: { wait: 20 } });
+      }
+      onStatus?.(status);
+      return await request(`/api/jobs/${jobId}/result`);
+    } finally {
+      window.removeEventListener('pagehide', cancel);
+      signal?.removeEventListener('abort', onAbort);
+    }
+  },
+
+  /**
+   * 取消后台查询任务
+   * @param {string} jobId - 任务ID
+   * @returns {Promise<Object>} 取消结果
+   */
+  cancelQueryJob: async (jobId) => {
+    try {
+      return await request(`/api/jobs/${jobId}/cancel`, { method: 'POST' });
+    } catch (error) {
+      console.error(`Error cancelling query job ${jobId}:`, error);
+      throw error;
+    }
+  },
+
+  /**
+   * 以 NDJSON 流的方式执行 SQL 查询，每收到一批数据就回调一次
+   * @param {Object} dbConfig - 数据库配置
+   * @param {string} sql - SQL 查询语句
+   * @param {Object} handlers - 回调 { onColumns, onRows }
+   * @param {number} batchSize - 每批行数
+   * @returns {Promise<number>} 总行数
+   */
+  streamSql: async (dbConfig, sql, handlers = {}, batchSize) => (
+    readNdjson('/api/execute-sql', { dbConfig, sql, batchSize }, handlers)
+  ),
+
+  /**
+   * 以 NDJSON 流的方式运行已保存的查询的完整结果（不分页），服务器端解析数据库连接
+   * @param {string} configId - SQL配置ID
+   * @param {Object} options - { format, params, batchSize }
+   * @param {Object} handlers - 回调 { onColumns, onRows }
+   * @param {Object} requestOptions - { signal: AbortSignal }，中止时停止读取并释放服务器连接
+   * @returns {Promise<number>} 总行数
+   */
+  streamSavedQuery: async (configId, options = {}, handlers = {}, { signal } = {}) => (
+    readNdjson(`/api/sql/config/${configId}/run`, options, handlers, signal)
+  ),
+
+  /**
+   * 获取已保存查询涉及的表结构，editTable 为行编辑写入的表
+   * @param {string} configId - SQL配置ID
+   * @returns {Promise<Object|null>} { editTable, tables }
+   */
+  getSavedQuerySchema: async (configId) => {
+    try {
+      return await request(`/api/sql/config/${configId}/schema`);
+    } catch (error) {
+      console.error(`Error fetching schema of SQL config ${configId}:`, error);
+      return null;
+    }
+  },
+
+  /**
+   * 更新已保存查询结果中的一行，由服务器按主键（或给定列）生成 UPDATE 语句
+   * @param {string} configId - SQL配置ID
+   * @param {Object} edit - { row: 原始行, changes: 修改的列, keyColumns: 无主键时用于 WHERE 的列, table }
+   * @returns {Promise<Object>} 更新结果
+   */
+  updateRow: async (configId, edit) => {
+    try {
+      return await request(`/api/sql/config/${configId}/row`, {
+        method: 'POST',
+        data: edit
+      });
+    } catch (error) {
+      console.error(`Error updating row of SQL config ${configId}:`, error);
+      throw error;
+    }
+  },
+
+  /**
+   * 批量更新已保存查询对应表中的多行（同一事务）
+   * @param {string} configId - SQL配置ID
+   * @param {Array<Object>} edits - 每项为 { row, changes, keyColumns, table }
+   * @param {string} mode - 'atomic' 任一行失败全部回滚；'partial' 保留成功的行
+   * @returns {Promise<Object>} 每行结果及提交/失败行数
+   */
+  updateRows: async (configId, edits, mode = 'atomic') => {
+    try {
+      return await request(`/api/sql/config/${configId}/rows`, {
+        method: 'POST',
+        data: { edits, mode }
+      });
+    } catch (error) {
+      console.error(`Error updating rows of SQL config ${configId}:`, error);
+      throw error;
+    }
+  },
+
   /**
    * 执行 SQL 更新操作
    * @param {Object} dbConfig - 数据库配置